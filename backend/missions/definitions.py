@@ -0,0 +1,104 @@
+"""
+ミッション定義のプロセス内インデックス。
+
+ミッションの定義は管理者が編集したときしか変わらないので、トリガーやミッション一覧のたびに
+Mission テーブルを読まず、プロセス内に (team, action_type, action_detail) をキーにした
+読み取り専用のインデックスを持つ。
+
+- Mission の保存・削除 (post_save / post_delete) で MissionDefinitionVersion (DB の1行) の version を
+  同じトランザクションで上げる。各プロセスは MISSION_INDEX_CHECK_SECONDS に1回だけ version を読み、
+  変わっていれば作り直す。キャッシュの設定に関係なく、別インスタンス・別ワーカーにも伝わる
+- ミッションのイベントを処理するワーカー (missions/events.py) は、バッチごとに必ず version を確かめる
+- queryset.update() / bulk_create() はシグナルが飛ばないので、使ったら invalidate_missions() を呼ぶ
+- インデックスの Mission インスタンスは全スレッドで共有するので、書き換えないこと
+"""
+import threading
+import time
+from types import MappingProxyType
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import Mission, MissionDefinitionVersion
+
+# このプロセスのインデックス（作り直すときは丸ごと差し替える）
+_index = {"version": None, "checked_at": 0.0, "by_action": MappingProxyType({}), "by_team": MappingProxyType({})}
+_lock = threading.Lock()
+
+
+def _check_interval():
+    return getattr(settings, "MISSION_INDEX_CHECK_SECONDS", 5)
+
+
+def _shared_version():
+    return MissionDefinitionVersion.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+
+def _build(version):
+    by_action = {}
+    by_team = {}
+    for mission in Mission.objects.order_by('mission_type', 'order', 'id'):
+        by_team.setdefault(mission.team, []).append(mission)
+        # action_detail なしのトリガーは、その action_type のミッションすべてに効く
+        by_action.setdefault((mission.team, mission.action_type, None), []).append(mission)
+        if mission.action_detail:
+            by_action.setdefault((mission.team, mission.action_type, mission.action_detail), []).append(mission)
+    return {
+        "version": version,
+        "checked_at": time.monotonic(),
+        "by_action": MappingProxyType({key: tuple(ms) for key, ms in by_action.items()}),
+        "by_team": MappingProxyType({team: tuple(ms) for team, ms in by_team.items()}),
+    }
+
+
+def _current(force_check=False):
+    global _index
+    index = _index
+    if (
+        not force_check and index["version"] is not None
+        and time.monotonic() - index["checked_at"] < _check_interval()
+    ):
+        return index
+
+    version = _shared_version()
+    with _lock:
+        if _index["version"] == version:
+            _index = dict(_index, checked_at=time.monotonic())
+        elif _index is index:
+            _index = _build(version)
+        return _index
+
+
+def refresh_missions():
+    """version をすぐに確かめ、変わっていればインデックスを作り直す（ワーカーのバッチの先頭で呼ぶ）"""
+    _current(force_check=True)
+
+
+def missions_for_action(team, action_type, action_detail=None):
+    """トリガーに該当するミッション（タプル）。action_detail を省略するとその action_type すべて"""
+    return _current()["by_action"].get((team, action_type, action_detail or None), ())
+
+
+def missions_for_team(team):
+    """チームのミッション（タプル、mission_type・order 順）"""
+    return _current()["by_team"].get(team, ())
+
+
+def invalidate_missions():
+    """全プロセスのインデックスを作り直させる（呼び出し元のトランザクションで version を上げる）"""
+    if not MissionDefinitionVersion.objects.filter(pk=1).update(version=F('version') + 1):
+        try:
+            with transaction.atomic():
+                MissionDefinitionVersion.objects.create(pk=1, version=1)
+        except IntegrityError:
+            MissionDefinitionVersion.objects.filter(pk=1).update(version=F('version') + 1)
+    # このプロセスはコミット後すぐに読み直す
+    transaction.on_commit(reset_local_index)
+
+
+def reset_local_index():
+    """このプロセスのインデックスを捨てる（ロールバックするトランザクション内でミッションを作ったときなど）"""
+    global _index
+    with _lock:
+        _index = dict(_index, version=None)
@@ -0,0 +1,150 @@
+"""
+ミッションのイベントキュー (MissionEvent) の書き込みと処理。
+
+- record_mission_event(): リクエスト内では、該当するミッションがあればイベントを1行追加するだけ。
+  どのミッションに効くかはワーカーが処理するときに最新の定義で決め直す
+- process_mission_events(): 未処理のイベントをバッチで取得し、ユーザー×ミッション×期間ごとに
+  増分をまとめてから進捗に反映する
+
+イベントに processed_at を書くのと進捗の反映は同じトランザクションで行う。
+途中で失敗すれば両方ロールバックされて次のバッチでやり直され、成功すれば二度と取得されないので、
+やり直しても二重に数えない。
+PostgreSQL では SELECT ... FOR UPDATE SKIP LOCKED で複数ワーカーが同じイベントを取り合わない。
+SQLite では processed_at を条件付き UPDATE で書き、全件書けなかったバッチは（別のワーカーが取ったので）捨てる。
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from pixelshop_backend.background import run_in_background
+from users.models import User
+from .definitions import missions_for_action, refresh_missions
+from .models import MissionEvent
+from .utils import (
+    apply_progress, claim_login_marker, get_period_start, login_already_counted, release_login_marker, target_user_ids,
+)
+
+logger = logging.getLogger(__name__)
+
+MISSION_EVENT_BATCH_SIZE = 500
+
+
+def record_mission_event(user, action_type, action_detail=None, amount=1):
+    """
+    ミッションのトリガーをイベントとして積む（進捗への反映はワーカーが行う）。
+    呼び出し元のトランザクション内で書かれ、コミット後に（設定により）その場でも処理を試みる。
+    該当するミッションが無ければ何も書かない（クエリなし）。
+    """
+    if not user or not getattr(user, 'team', None):
+        return None
+
+    # プロセスのインデックスは最大 MISSION_INDEX_CHECK_SECONDS 古いだけなので、該当なしならイベントは積まない。
+    # 積んだイベントがどのミッションに効くかは、ワーカーが最新の定義で決め直す
+    if not missions_for_action(user.team, action_type, action_detail):
+        return None
+    event = MissionEvent.objects.create(
+        user=user, action_type=action_type, action_detail=action_detail or '', amount=amount,
+    )
+    if getattr(settings, "MISSION_EVENTS_DRAIN_ON_COMMIT", True):
+        # ワーカーを待たずにこのプロセスでも反映する（取れなかった分はワーカーが拾う）
+        run_in_background(process_mission_events, max_batches=1)
+    return event
+
+
+def record_login_event(user):
+    """
+    ログインのイベントを積む。ミッション一覧を開いたときと合わせて、期間ごとに1回だけ。
+    イベントを書けなければ印を消す（印の延長はコミット時なので、外側のロールバックでも仮の印が切れればやり直せる）
+    """
+    if login_already_counted(user):
+        return None
+    key = None
+    try:
+        with transaction.atomic():
+            key = claim_login_marker(user)
+            if key is None:
+                return None
+            return record_mission_event(user, 'login')
+    except Exception:
+        if key is not None:
+            release_login_marker(key)
+        raise
+
+
+def coalesce_events(events, users):
+    """
+    イベントを (mission_id, period_start) → {user_id: 増分} にまとめる。
+    戻り値: (増分, {mission_id: Mission})
+    """
+    amounts = {}
+    missions = {}
+    shop_members = {}
+    for event in events:
+        user = users.get(event.user_id)
+        if user is None or not user.team:
+            continue
+        for mission in missions_for_action(user.team, event.action_type, event.action_detail or None):
+            missions[mission.id] = mission
+            period_start = get_period_start(mission.mission_type, event.occurred_at)
+            bucket = amounts.setdefault((mission.id, period_start), {})
+            for user_id in target_user_ids(user, mission, shop_members):
+                bucket[user_id] = bucket.get(user_id, 0) + event.amount
+    return amounts, missions
+
+
+def process_batch(batch_size=MISSION_EVENT_BATCH_SIZE):
+    """
+    未処理のイベントを最大 batch_size 件取得して反映する。
+    戻り値: 処理したイベント数（取得できなければ 0）
+    """
+    with transaction.atomic():
+        pending = MissionEvent.objects.filter(processed_at__isnull=True).order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            pending = pending.select_for_update(skip_locked=True)
+        events = list(pending[:batch_size])
+        if not events:
+            return 0
+
+        ids = [event.id for event in events]
+        marked = MissionEvent.objects.filter(id__in=ids, processed_at__isnull=True).update(processed_at=timezone.now())
+        if marked != len(ids):
+            # 同じイベントを別のワーカーが先に処理した (SQLite)。このバッチは反映せずに捨てる
+            transaction.set_rollback(True)
+            return 0
+
+        # 削除されたミッションに書いたり、新しいミッションを数え落としたりしないよう、定義は必ず最新にする
+        refresh_missions()
+        users = User.objects.in_bulk({event.user_id for event in events})
+        amounts, missions = coalesce_events(events, users)
+        # 複数ワーカーが同じ行をロックし合わないよう、ミッション・期間の順に反映する
+        for mission_id, period_start in sorted(amounts):
+            apply_progress(missions[mission_id], period_start, amounts[(mission_id, period_start)])
+
+    logger.info(f"Mission events: processed {len(events)} events into {len(amounts)} mission periods")
+    return len(events)
+
+
+def process_mission_events(batch_size=MISSION_EVENT_BATCH_SIZE, max_batches=None):
+    """
+    未処理のイベントが無くなるまで（または max_batches 回まで）取得と反映を繰り返す。
+    戻り値: 処理したイベント数
+    """
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        processed = process_batch(batch_size)
+        if not processed:
+            break
+        total += processed
+        batches += 1
+    return total
+
+
+def purge_mission_events(days=7):
+    """処理済みの古いイベントを消す"""
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = MissionEvent.objects.filter(processed_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,111 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from missions.definitions import reset_local_index
+from missions.models import Mission, UserMissionProgress
+from missions.utils import get_period_start, update_mission_progress
+
+User = get_user_model()
+
+
+def legacy_update_mission_progress(user, action_type, action_detail=None, amount=1):
+    """比較用: 以前の1ユーザーずつ get_or_create / save する実装"""
+    if not user or not hasattr(user, 'team') or not user.team:
+        return
+
+    missions = Mission.objects.filter(team=user.team, action_type=action_type)
+    if action_detail:
+        missions = missions.filter(action_detail=action_detail)
+
+    for mission in missions:
+        period_start = get_period_start(mission.mission_type)
+
+        target_users = [user]
+        if mission.is_shop_wide and user.shop_name:
+            target_users = User.objects.filter(shop_name=user.shop_name, team=user.team, is_active=True)
+
+        for t_user in target_users:
+            progress, _ = UserMissionProgress.objects.get_or_create(
+                user=t_user, mission=mission, period_start=period_start,
+            )
+            if not progress.is_completed:
+                progress.current_count += amount
+                if progress.current_count >= mission.target_count:
+                    progress.current_count = mission.target_count
+                    progress.is_completed = True
+                progress.save()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the per-user and the set-based mission progress update for a shop-wide mission "
+        "(runs inside a transaction that is rolled back)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[10, 100, 1000],
+            help="Shop sizes to benchmark (default: 10 100 1000)",
+        )
+        parser.add_argument("--repeat", type=int, default=3, help="Triggers per path and size (default: 3)")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'shop size':>9}  {'path':<10} {'queries/trigger':>15} {'ms/trigger':>10}")
+        for size in options["sizes"]:
+            with transaction.atomic():
+                self._run(size, options["repeat"])
+                # ベンチマーク用のデータは残さない
+                transaction.set_rollback(True)
+            reset_local_index()
+
+    def _run(self, size, repeat):
+        shop = f"benchmark-shop-{size}"
+        User.objects.bulk_create([
+            User(user_id=f"bench-{size}-{i}", email=f"bench-{size}-{i}@example.com",
+                 display_name=f"bench {i}", shop_name=shop, team="shop")
+            for i in range(size)
+        ])
+        actor = User.objects.filter(shop_name=shop).first()
+        for action_type in ("bench_legacy", "bench_set"):
+            Mission.objects.create(
+                title=action_type, mission_type="daily", team="shop",
+                action_type=action_type, target_count=repeat + 1, is_shop_wide=True,
+            )
+        # コミットしないので、バージョンの更新を待たずにこのプロセスのミッション定義を読み直す
+        reset_local_index()
+
+        for label, fn, action_type in (
+            ("per-user", legacy_update_mission_progress, "bench_legacy"),
+            ("set-based", update_mission_progress, "bench_set"),
+        ):
+            query_count = 0
+            elapsed = 0.0
+            for _ in range(repeat):
+                # クエリログは件数に上限 (9000) があるので、1回ごとに空にしてから数える
+                connection.queries_log.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    fn(actor, action_type)
+                    elapsed += time.perf_counter() - started
+                query_count += len(queries)
+            self.stdout.write(
+                f"{size:>9}  {label:<10} {query_count / repeat:>15.0f} {elapsed * 1000 / repeat:>10.1f}"
+            )
+
+        # 両方の実装で同じ結果になっていることを確かめる
+        counts = {
+            action_type: sorted(
+                UserMissionProgress.objects.filter(mission__action_type=action_type)
+                .values_list('user_id', 'current_count')
+            )
+            for action_type in ("bench_legacy", "bench_set")
+        }
+        if counts["bench_legacy"] != counts["bench_set"]:
+            self.stderr.write(self.style.ERROR(f"shop size {size}: results differ between the two paths"))
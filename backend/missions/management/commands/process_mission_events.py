@@ -0,0 +1,65 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from missions.events import MISSION_EVENT_BATCH_SIZE, process_mission_events, purge_mission_events
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Apply queued mission events to mission progress in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=MISSION_EVENT_BATCH_SIZE,
+            help=f"Events claimed per batch (default: {MISSION_EVENT_BATCH_SIZE})",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Process the queue once and exit (for cron / Cloud Scheduler)",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=2.0,
+            help="Seconds to sleep when the queue is empty (default: 2)",
+        )
+        parser.add_argument(
+            "--purge-days",
+            type=int,
+            default=7,
+            help="Delete processed events older than this many days (0 disables; default: 7)",
+        )
+
+    def handle(self, *args, **options):
+        if options["purge_days"]:
+            purged = purge_mission_events(options["purge_days"])
+            if purged:
+                self.stdout.write(f"Purged {purged} processed mission events.")
+
+        if options["once"]:
+            processed = process_mission_events(options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(f"Processed {processed} mission events."))
+            return
+
+        self.stdout.write("Mission event worker started (Ctrl+C to stop).")
+        try:
+            while True:
+                # 空になるまで処理し、空ならポーリング間隔だけ待つ
+                try:
+                    processed = process_mission_events(options["batch_size"])
+                except Exception:
+                    # バッチはロールバック済みなので、次の周回でそのままやり直す
+                    logger.exception("Mission event batch failed")
+                    processed = 0
+                if processed:
+                    self.stdout.write(f"Processed {processed} mission events.")
+                else:
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            self.stdout.write("Mission event worker stopped.")
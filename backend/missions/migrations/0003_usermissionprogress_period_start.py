@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:02
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def _period_start(mission_type, at):
+    """at を含む期間の開始日時（missions.utils.get_period_start と同じく 3:00 区切り）"""
+    at = timezone.localtime(at)
+    start = at.replace(hour=3, minute=0, second=0, microsecond=0)
+    if mission_type == 'weekly':
+        start -= timedelta(days=at.weekday())
+        return start - timedelta(weeks=1) if at < start else start
+    return start - timedelta(days=1) if at < start else start
+
+
+def backfill_period_start(apps, schema_editor):
+    """既存の行は最後に更新された期間の行とする"""
+    UserMissionProgress = apps.get_model('missions', 'UserMissionProgress')
+    rows = UserMissionProgress.objects.select_related('mission').filter(period_start__isnull=True)
+    batch = []
+    for progress in rows.iterator(chunk_size=1000):
+        progress.period_start = _period_start(progress.mission.mission_type, progress.last_updated)
+        batch.append(progress)
+        if len(batch) >= 1000:
+            UserMissionProgress.objects.bulk_update(batch, ['period_start'])
+            batch = []
+    if batch:
+        UserMissionProgress.objects.bulk_update(batch, ['period_start'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('missions', '0002_levelreward'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usermissionprogress',
+            name='period_start',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(backfill_period_start, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('missions', '0003_usermissionprogress_period_start'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='usermissionprogress',
+            name='period_start',
+            field=models.DateTimeField(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='usermissionprogress',
+            unique_together={('user', 'mission', 'period_start')},
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.conf import settings
+from django.utils import timezone
 import uuid
 
 class Mission(models.Model):
@@ -34,22 +37,55 @@ class Mission(models.Model):
     def __str__(self):
         return f"[{self.mission_type}] {self.title} ({self.team})"
 
+# --- ミッション定義のバージョン（1行だけ） ---
+# Mission が保存・削除されるたびに同じトランザクションで version を上げる。
+# 各プロセスはこれを見てミッション定義のインデックス (missions/definitions.py) を作り直す。
+class MissionDefinitionVersion(models.Model):
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"mission definitions v{self.version}"
+
 class UserMissionProgress(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="mission_progress")
     mission = models.ForeignKey(Mission, on_delete=models.CASCADE)
     current_count = models.IntegerField(default=0)
     is_completed = models.BooleanField(default=False)
     is_claimed = models.BooleanField(default=False)
-    
-    # Used to check period reset logic
+
+    # 集計期間の開始日時 (get_period_start)。期間ごとに別の行になり、過去の期間の行は履歴として残る
+    period_start = models.DateTimeField()
+
     last_updated = models.DateTimeField(auto_now=True)
 
     class Meta:
-        unique_together = ('user', 'mission')
+        unique_together = ('user', 'mission', 'period_start')
 
     def __str__(self):
         return f"{self.user.display_name} - {self.mission.title} ({self.current_count}/{self.mission.target_count})"
 
+# --- ミッションのイベントログ ---
+# リクエストでは1行追加するだけで、進捗への反映は missions/events.py のワーカーがまとめて行う。
+# 反映と processed_at の書き込みは同じトランザクションなので、やり直しても二重に数えない。
+class MissionEvent(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="mission_events")
+    action_type = models.CharField(max_length=50)
+    action_detail = models.CharField(max_length=255, blank=True, default='')
+    amount = models.PositiveIntegerField(default=1)
+    # この時刻を含む期間の進捗に数える（反映が遅れても期間はずれない）
+    occurred_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # ワーカーの取得クエリ (未処理を id 順)
+            models.Index(fields=['id'], condition=models.Q(processed_at__isnull=True), name='mission_event_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.action_type} by {self.user_id} ({'done' if self.processed_at else 'pending'})"
+
 class LevelReward(models.Model):
     level = models.IntegerField(unique=True)
     badge = models.ForeignKey('users.Badge', on_delete=models.CASCADE)
@@ -57,3 +93,12 @@ class LevelReward(models.Model):
 
     def __str__(self):
         return f"Lv.{self.level} Reward: {self.badge.name}"
+
+
+# --- ミッションが変わったら、各プロセスのミッション定義インデックス (missions/definitions.py) を作り直させる ---
+@receiver(post_save, sender=Mission)
+@receiver(post_delete, sender=Mission)
+def invalidate_mission_definitions(sender, **kwargs):
+    from .definitions import invalidate_missions
+
+    invalidate_missions()
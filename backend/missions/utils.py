@@ -1,15 +1,21 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Least
 from django.utils import timezone
 from datetime import timedelta
-from .models import Mission, UserMissionProgress
+from .definitions import missions_for_action, missions_for_team
+from .models import UserMissionProgress
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
-def get_period_start(mission_type='daily'):
+def get_period_start(mission_type='daily', now=None):
     """
     Returns the start time of the current mission period (3:00 AM reset).
+    now: その時刻を含む期間を返す（省略時は現在）
     """
-    now = timezone.localtime() # Assumes Asia/Tokyo based on settings.py
+    now = timezone.localtime(now) # Assumes Asia/Tokyo based on settings.py
     
     if mission_type == 'daily':
         # Reset at 3:00 AM daily
@@ -29,46 +35,181 @@ def get_period_start(mission_type='daily'):
     
     return now
 
+def target_user_ids(user, mission, shop_members):
+    """
+    進捗を進めるユーザーの id。店舗共通ミッションは同じ店舗・チームの有効なメンバー全員。
+    shop_members: (shop_name, team) → メンバー id のキャッシュ（呼び出し1回の中で使い回す）
+    """
+    if not (mission.is_shop_wide and user.shop_name):
+        return [user.id]
+    key = (user.shop_name, user.team)
+    if key not in shop_members:
+        shop_members[key] = list(
+            User.objects.filter(shop_name=user.shop_name, team=user.team, is_active=True)
+            .values_list('id', flat=True)
+        )
+    return shop_members[key]
+
+
+def apply_progress(mission, period_start, amounts):
+    """
+    1つのミッション・期間について、{user_id: 増分} をまとめて反映する。
+    呼び出し元のトランザクション内で使う。
+
+    まだ行の無いユーザーは先に 0 の行を作り (ON CONFLICT DO NOTHING)、
+    増分ごとに1回の UPDATE (current_count = LEAST(current_count + n, target_count)) で加算する。
+    読んだ値を書き戻すのではなく DB 上で足すので、並行して同じ行に書く他のバッチ・リクエストがあっても
+    どちらかの加算が消えることはない。
+    """
+    rows = UserMissionProgress.objects.filter(mission=mission, period_start=period_start)
+
+    missing = set(amounts) - set(rows.filter(user_id__in=amounts).values_list('user_id', flat=True))
+    if missing:
+        UserMissionProgress.objects.bulk_create(
+            [UserMissionProgress(user_id=user_id, mission=mission, period_start=period_start) for user_id in sorted(missing)],
+            ignore_conflicts=True,
+        )
+
+    # 店舗共通ミッションでは全員の増分が同じなので、ふつうは UPDATE 1回
+    by_amount = {}
+    for user_id, amount in amounts.items():
+        by_amount.setdefault(amount, []).append(user_id)
+
+    now = timezone.now()
+    target = mission.target_count
+    for amount, user_ids in sorted(by_amount.items()):
+        # Update if not already achieved
+        rows.filter(user_id__in=user_ids, is_completed=False).update(
+            current_count=Least(F('current_count') + amount, Value(target)),
+            is_completed=Case(When(current_count__gte=target - amount, then=Value(True)), default=Value(False)),
+            last_updated=now,
+        )
+
+
 def update_mission_progress(user, action_type, action_detail=None, amount=1):
     """
     Updates progress for users based on triggers.
     Handles shop-wide missions by updating all members in the same shop.
+
+    Set-based: for each matching mission the missing rows of the current period are
+    inserted in one query and all affected rows are incremented with one UPDATE,
+    all inside one transaction, so the cost does not grow with the shop size.
+    Progress rows are keyed by (user, mission, period_start): a new period simply has
+    no row yet, so nothing has to be reset.
+
+    リクエストの中ではなくワーカーで反映するときは missions.events.record_mission_event を使う。
     """
     if not user or not hasattr(user, 'team') or not user.team:
         return
 
-    # Find relevant missions
-    missions = Mission.objects.filter(
-        team=user.team,
-        action_type=action_type
-    )
-    
-    if action_detail:
-        missions = missions.filter(action_detail=action_detail)
-    
+    # Find relevant missions (プロセス内のインデックスから。該当が無ければクエリなしで終わる)
+    missions = missions_for_action(user.team, action_type, action_detail)
+    if not missions:
+        return
+
+    shop_members = {}
+    with transaction.atomic():
+        for mission in missions:
+            period_start = get_period_start(mission.mission_type)
+            user_ids = target_user_ids(user, mission, shop_members)
+            apply_progress(mission, period_start, {user_id: amount for user_id in user_ids})
+
+
+LOGIN_MARKER_KEY = "missions:login:{}:{}"
+# コミットされるまでの仮の印の有効期間（ロールバックされたら、これが切れた後のログインで数え直す）
+LOGIN_MARKER_PENDING_SECONDS = 60
+
+
+def _login_marker_key(user):
+    """この期間のログインの印のキー。ログインミッションが無ければ None"""
+    if not user.team or not missions_for_action(user.team, 'login'):
+        return None
+    return LOGIN_MARKER_KEY.format(user.id, get_period_start('daily').isoformat())
+
+
+def login_already_counted(user):
+    """この期間のログインを数えなくてよいか（ログインミッションが無い・既に印がある）。クエリなしで分かる"""
+    key = _login_marker_key(user)
+    return key is None or cache.get(key) is not None
+
+
+def claim_login_marker(user):
+    """
+    ログインをこの期間（日次 3:00 区切り）に初めて数えるなら印 (cache.add) を付けてそのキーを返す。
+    既に数えていれば None。
+    印は最初は仮 (LOGIN_MARKER_PENDING_SECONDS) で、呼び出し元のトランザクションがコミットされたときに
+    期間の終わりまで延ばす。呼び出し元は失敗したら release_login_marker() で印を消すこと。
+    ログインミッションが無ければ印は付けない（後からミッションが作られても、その日のログインを数えられるように）
+    """
+    key = _login_marker_key(user)
+    if key is None or not cache.add(key, 1, timeout=LOGIN_MARKER_PENDING_SECONDS):
+        return None
+    period_start = get_period_start('daily')
+    timeout = int((period_start + timedelta(days=1) - timezone.now()).total_seconds()) + 60
+    transaction.on_commit(lambda: cache.set(key, 1, timeout=timeout))
+    return key
+
+
+def release_login_marker(key):
+    """claim_login_marker() の印を消す（次のログインでやり直せるように）"""
+    cache.delete(key)
+
+
+def apply_login_once(user):
+    """
+    ログインミッションをこの期間に1回だけ、その場で進める（ミッション一覧を開いたとき）。
+    戻り値: 今回進めたか
+    """
+    # 2回目以降はトランザクションも開かずに終わる
+    if login_already_counted(user):
+        return False
+    key = None
+    try:
+        with transaction.atomic():
+            key = claim_login_marker(user)
+            if key is None:
+                return False
+            update_mission_progress(user, 'login')
+    except Exception:
+        # 次に開いたときにやり直せるよう印を消す
+        if key is not None:
+            release_login_marker(key)
+        raise
+    return True
+
+
+def mission_board(user):
+    """
+    ミッション一覧（今の期間の進捗付き）。クエリは進捗の1回だけで、行は作らない。
+    ミッション定義はプロセス内のインデックスから取り、進捗の行が無いミッションは進捗 0 とする。
+    """
+    missions = missions_for_team(user.team)
+    if not missions:
+        return []
+
+    periods = {
+        'daily': get_period_start('daily'),
+        'weekly': get_period_start('weekly')
+    }
+    rows = UserMissionProgress.objects.filter(
+        user=user, mission_id__in=[m.id for m in missions], period_start__in=set(periods.values()),
+    ).values_list('mission_id', 'period_start', 'current_count', 'is_completed', 'is_claimed')
+    progress_map = {(mission_id, period_start): rest for mission_id, period_start, *rest in rows}
+
+    data = []
     for mission in missions:
-        period_start = get_period_start(mission.mission_type)
-        
-        target_users = [user]
-        if mission.is_shop_wide and user.shop_name:
-            target_users = User.objects.filter(shop_name=user.shop_name, team=user.team, is_active=True)
-        
-        for t_user in target_users:
-            progress, _ = UserMissionProgress.objects.get_or_create(
-                user=t_user,
-                mission=mission
-            )
-            
-            # Reset if stale
-            if progress.last_updated < period_start:
-                progress.current_count = 0
-                progress.is_completed = False
-                progress.is_claimed = False
-            
-            # Update if not already achieved
-            if not progress.is_completed:
-                progress.current_count += amount
-                if progress.current_count >= mission.target_count:
-                    progress.current_count = mission.target_count
-                    progress.is_completed = True
-                progress.save()
+        current_count, is_completed, is_claimed = progress_map.get(
+            (mission.id, periods[mission.mission_type]), (0, False, False)
+        )
+        data.append({
+            "id": mission.id,
+            "title": mission.title,
+            "description": mission.description,
+            "exp_reward": mission.exp_reward,
+            "mission_type": mission.mission_type,
+            "current_count": current_count,
+            "target_count": mission.target_count,
+            "is_completed": is_completed,
+            "is_claimed": is_claimed
+        })
+    return data
@@ -1,8 +1,9 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from .models import Mission, UserMissionProgress, LevelReward
-from .utils import get_period_start, update_mission_progress
+from .events import record_mission_event
+from .models import UserMissionProgress, LevelReward
+from .utils import apply_login_once, get_period_start, mission_board
 from .serializers import LevelRewardSerializer
 
 @api_view(['GET'])
@@ -13,57 +14,30 @@ def mission_list_view(request):
         return Response([])
 
     # ログインミッションを自動実行（アプリを開いている状態で日を跨いでも、ここが呼ばれればログイン扱いにする）
-    update_mission_progress(user, 'login')
+    # 期間ごとに1回だけ。2回目以降はキャッシュの印を見るだけ
+    apply_login_once(user)
 
-    missions = Mission.objects.filter(team=user.team).order_by('mission_type', 'order')
-    
-    data = []
-    periods = {
-        'daily': get_period_start('daily'),
-        'weekly': get_period_start('weekly')
-    }
-
-    for mission in missions:
-        progress, _ = UserMissionProgress.objects.get_or_create(user=user, mission=mission)
-        
-        # Check for period reset
-        if progress.last_updated < periods[mission.mission_type]:
-            progress.current_count = 0
-            progress.is_completed = False
-            progress.is_claimed = False
-            progress.save()
-            
-        data.append({
-            "id": mission.id,
-            "title": mission.title,
-            "description": mission.description,
-            "exp_reward": mission.exp_reward,
-            "mission_type": mission.mission_type,
-            "current_count": progress.current_count,
-            "target_count": mission.target_count,
-            "is_completed": progress.is_completed,
-            "is_claimed": progress.is_claimed
-        })
-        
-    return Response(data)
+    # ミッション定義はプロセス内のインデックスから、進捗は今の期間の分を1回で読む（行は作らない）
+    return Response(mission_board(user))
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def claim_mission_view(request, pk):
     user = request.user
-    progress = UserMissionProgress.objects.filter(user=user, mission_id=pk).first()
+    progress = (
+        UserMissionProgress.objects
+        .filter(user=user, mission_id=pk)
+        .select_related('mission')
+        .order_by('-period_start')
+        .first()
+    )
     
     if not progress:
         return Response({"error": "Progress not found"}, status=404)
     
     # Check if the progress is still valid for the current period
-    period_start = get_period_start(progress.mission.mission_type)
-    if progress.last_updated < period_start:
-        # Auto-reset if the user tries to claim a stale mission
-        progress.current_count = 0
-        progress.is_completed = False
-        progress.is_claimed = False
-        progress.save()
+    # (前の期間の行は履歴として残すだけで、書き換えない)
+    if progress.period_start < get_period_start(progress.mission.mission_type):
         return Response({"error": "Mission period has reset"}, status=400)
         
     if not progress.is_completed:
@@ -72,8 +46,10 @@ def claim_mission_view(request, pk):
     if progress.is_claimed:
         return Response({"error": "Reward already claimed"}, status=400)
     
-    progress.is_claimed = True
-    progress.save()
+    # 同時に2回押されても報酬は1回だけ
+    claimed = UserMissionProgress.objects.filter(pk=progress.pk, is_claimed=False).update(is_claimed=True)
+    if not claimed:
+        return Response({"error": "Reward already claimed"}, status=400)
     
     # Update user EXP
     user.exp += progress.mission.exp_reward
@@ -139,5 +115,6 @@ def trigger_mission_view(request):
     if not action_type:
         return Response({"error": "action_type is required"}, status=400)
         
-    update_mission_progress(request.user, action_type, action_detail)
+    # 進捗への反映はワーカー (missions/events.py) が行う
+    record_mission_event(request.user, action_type, action_detail)
     return Response({"status": "success"})
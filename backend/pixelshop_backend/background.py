@@ -0,0 +1,71 @@
+"""
+リクエストの外で処理を走らせるための簡易バックグラウンド実行基盤。
+
+gunicorn の各ワーカープロセス内にスレッドプールを1つ持ち、
+トランザクション確定後 (on_commit) にジョブを投入する。
+settings.BACKGROUND_TASKS_ASYNC = False の場合はその場で同期実行する（テスト・管理コマンド用）。
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "BACKGROUND_TASKS_MAX_WORKERS", 2),
+            thread_name_prefix="background",
+        )
+    return _executor
+
+
+def _run(fn, args, kwargs):
+    try:
+        fn(*args, **kwargs)
+    except Exception:
+        logger.exception("Background task %s failed", getattr(fn, "__name__", fn))
+    finally:
+        # スレッドごとに開いた DB 接続を閉じる（接続リーク防止）
+        connections.close_all()
+
+
+def run_in_background(fn, *args, **kwargs):
+    """
+    fn(*args, **kwargs) をトランザクション確定後にバックグラウンドで実行する。
+    ロールバックされた場合は実行されない。
+    """
+    if not getattr(settings, "BACKGROUND_TASKS_ASYNC", True):
+        transaction.on_commit(lambda: fn(*args, **kwargs))
+        return
+
+    transaction.on_commit(lambda: _get_executor().submit(_run, fn, args, kwargs))
+
+
+def run_later(delay, fn, *args, **kwargs):
+    """
+    delay 秒後に fn(*args, **kwargs) をバックグラウンドで実行する（デバウンス用）。
+    同期モードでは待たずにその場で実行する。
+    """
+    if not getattr(settings, "BACKGROUND_TASKS_ASYNC", True):
+        fn(*args, **kwargs)
+        return
+
+    timer = threading.Timer(delay, lambda: _get_executor().submit(_run, fn, args, kwargs))
+    timer.daemon = True
+    timer.start()
+
+
+def shutdown(wait=True):
+    """実行中・待機中のジョブを終わらせてからスレッドプールを止める"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait)
+        _executor = None
@@ -117,6 +117,55 @@ REST_FRAMEWORK = {
     ],
 }
 
+# === バックグラウンド処理 (pixelshop_backend/background.py) ===
+# False にするとジョブをその場で同期実行する（テスト・デバッグ用）
+BACKGROUND_TASKS_ASYNC = os.environ.get('BACKGROUND_TASKS_ASYNC', 'True') == 'True'
+BACKGROUND_TASKS_MAX_WORKERS = int(os.environ.get('BACKGROUND_TASKS_MAX_WORKERS', '2'))
+
+# === 通知の送信キュー (users/outbox.py) ===
+# True: コミット直後にこのプロセスでも送信を試みる（取りこぼしは manage.py process_outbox が拾う）
+# False: 送信は process_outbox ワーカーだけが行う
+OUTBOX_DRAIN_ON_COMMIT = os.environ.get('OUTBOX_DRAIN_ON_COMMIT', 'True') == 'True'
+
+# === 投稿の Google Sheets 同期 (posts/sheets_sync.py) ===
+# 最初の依頼からこの秒数待ってまとめて1回同期する
+SHEETS_SYNC_DEBOUNCE_SECONDS = int(os.environ.get('SHEETS_SYNC_DEBOUNCE_SECONDS', '30'))
+# True にすると Google Sheets API の代わりにメモリ上の偽物 (posts/fake_sheets.py) を使う
+GOOGLE_SHEETS_FAKE = os.environ.get('GOOGLE_SHEETS_FAKE', 'False') == 'True'
+
+# === 動画カタログのキャッシュ (posts/video_catalog.py) ===
+# TTL を過ぎたら古いものを返しつつバックグラウンドで作り直す
+VIDEO_CATALOG_TTL_SECONDS = int(os.environ.get('VIDEO_CATALOG_TTL_SECONDS', '60'))
+# Firestore が取れない間も古いカタログを返し続ける上限
+VIDEO_CATALOG_MAX_STALE_SECONDS = int(os.environ.get('VIDEO_CATALOG_MAX_STALE_SECONDS', str(24 * 60 * 60)))
+
+# === 動画の再生回数・視聴時間 (posts/view_counters.py) ===
+# 増分 (VideoCountDelta) をこの秒数だけ溜めてから、動画ごとに1回の UPDATE で書き込む。0 ならコミット後すぐに書き込む
+VIDEO_VIEW_FLUSH_SECONDS = int(os.environ.get('VIDEO_VIEW_FLUSH_SECONDS', '5'))
+
+# === 視聴ログ (posts/watch_logs.py) ===
+# session_id なしのハートビートは、この秒数以内に更新された同じ動画の視聴に加算する
+VIEW_LOG_SESSION_GAP_SECONDS = int(os.environ.get('VIEW_LOG_SESSION_GAP_SECONDS', '300'))
+
+# === 管理画面の分析 (posts/analytics.py) ===
+# 店舗別・週報の集計結果をキャッシュする秒数
+SHOP_ANALYTICS_CACHE_SECONDS = int(os.environ.get('SHOP_ANALYTICS_CACHE_SECONDS', '300'))
+# 動画ごとのテスト・アンケート集計のキャッシュ (posts/video_feedback.py)。提出時は DB のバージョンが上がり、全インスタンスで作り直す
+VIDEO_FEEDBACK_CACHE_SECONDS = int(os.environ.get('VIDEO_FEEDBACK_CACHE_SECONDS', '3600'))
+
+# === 管理画面の CSV / XLSX 出力 (posts/exports.py) ===
+# XLSX は送る前に全行を一時ファイルに書くので、この行数を超えたら作らない（CSV は上限なしでストリーミング）
+EXPORT_XLSX_MAX_ROWS = int(os.environ.get('EXPORT_XLSX_MAX_ROWS', '100000'))
+
+# === ミッション定義のインデックス (missions/definitions.py) ===
+# Mission の変更は DB 上のバージョン (MissionDefinitionVersion) で各プロセスに伝わる。バージョンを確かめる間隔（秒）
+MISSION_INDEX_CHECK_SECONDS = int(os.environ.get('MISSION_INDEX_CHECK_SECONDS', '5'))
+
+# === ミッションのイベントキュー (missions/events.py) ===
+# True: コミット直後にこのプロセスでもイベントを反映する（取りこぼしは manage.py process_mission_events が拾う）
+# False: 反映は process_mission_events ワーカーだけが行う
+MISSION_EVENTS_DRAIN_ON_COMMIT = os.environ.get('MISSION_EVENTS_DRAIN_ON_COMMIT', 'True') == 'True'
+
 AUTHENTICATION_BACKENDS = [
     'users.backends.UserIdAuthBackend',  # ← これを追加！
     'django.contrib.auth.backends.ModelBackend',  # 既存も残す
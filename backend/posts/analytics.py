@@ -0,0 +1,178 @@
+"""
+管理画面の分析系の集計。
+
+- user_analytics: ユーザー別統計（投稿数・動画視聴・テスト・ノウハウ投稿）。
+  admin_user_analytics と scheduled_analytics_sync の「ユーザー別統計」で共通に使う。
+  ユーザーごとにクエリを投げず、指標ごとに GROUP BY した結果を1回ずつ取って突き合わせるので、
+  ユーザー数に関係なくクエリは5回。
+- shop_weekly_report: 店舗別・週ごとの個人報告／ノウハウ提出状況 (admin_shop_analytics)。
+  期間内の投稿を TruncWeek で週に振り分けて1回ずつ読むので、店舗数・週数に関係なくクエリは3回。
+  結果は SHOP_ANALYTICS_CACHE_SECONDS の間キャッシュする
+"""
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DateField, Q
+from django.db.models.functions import TruncWeek
+from django.utils import timezone
+
+from users.models import User
+from .models import Post, TreasurePost, UserTestResult
+from .watch_logs import user_watch_totals
+
+
+def parse_date_range(params):
+    """
+    ?start_date= / ?end_date= (YYYY-MM-DD、どちらも省略可) を date にする。
+    形式が不正なら ValueError
+    """
+    def parse(name):
+        value = params.get(name)
+        try:
+            return date.fromisoformat(value) if value else None
+        except ValueError:
+            raise ValueError(f'{name} must be YYYY-MM-DD')
+
+    start_date, end_date = parse('start_date'), parse('end_date')
+    if start_date and end_date and start_date > end_date:
+        raise ValueError('start_date must be on or before end_date')
+    return start_date, end_date
+
+
+def _in_range(queryset, field, start_date, end_date):
+    if start_date:
+        queryset = queryset.filter(**{f'{field}__date__gte': start_date})
+    if end_date:
+        queryset = queryset.filter(**{f'{field}__date__lte': end_date})
+    return queryset
+
+
+def _count_by(queryset, key):
+    return {row[key]: row['n'] for row in queryset.values(key).annotate(n=Count('id')).order_by()}
+
+
+def user_analytics(start_date=None, end_date=None, order_by=('-date_joined',)):
+    """
+    ユーザー別統計のリスト。start_date / end_date を指定するとその期間の活動だけを数える
+    （保有ポイントは期間に関係なく現在の値）。
+    """
+    posts = _count_by(_in_range(Post.objects.all(), 'created_at', start_date, end_date), 'user_uid')
+    know_how = _count_by(_in_range(TreasurePost.objects.all(), 'created_at', start_date, end_date), 'user_uid')
+    tests = {
+        row['user_id']: row
+        for row in _in_range(UserTestResult.objects.all(), 'created_at', start_date, end_date)
+        .values('user_id')
+        .annotate(taken=Count('id'), passed=Count('id', filter=Q(is_passed=True)))
+        .order_by()
+    }
+    watch = user_watch_totals(start_date, end_date)
+
+    data = []
+    for u in User.objects.order_by(*order_by):
+        u_tests = tests.get(u.id, {})
+        u_watch = watch.get(u.id, {})
+        data.append({
+            "user_id": u.user_id,
+            "display_name": u.display_name,
+            "shop_name": u.shop_name,
+            "post_count": posts.get(u.user_id, 0),
+            "video_views": u_watch.get("views", 0),
+            "watch_time": u_watch.get("time", 0),
+            "tests_taken": u_tests.get("taken", 0),
+            "tests_passed": u_tests.get("passed", 0),
+            "know_how_count": know_how.get(u.user_id, 0),
+            "points": u.points,
+        })
+    return data
+
+
+SHOP_REPORT_MAX_WEEKS = 52
+
+
+def _weeks(count, today=None):
+    """直近 count 週の (月曜, 日曜) を新しい順に"""
+    today = today or timezone.localdate()
+    start_of_week = today - timedelta(days=today.weekday())
+    weeks = []
+    for i in range(count):
+        start = start_of_week - timedelta(weeks=i)
+        weeks.append((start, start + timedelta(days=6)))
+    return weeks
+
+
+def _week_rows(queryset, since, fields):
+    """since 以降で店舗のある投稿者の行を、週の月曜 (week) 付きで返す"""
+    return (
+        queryset
+        .filter(created_at__gte=since)
+        .exclude(author__shop_name__isnull=True)
+        .exclude(author__shop_name='')
+        .annotate(week=TruncWeek('created_at', output_field=DateField()))
+        .order_by('created_at')
+        .values('week', 'author__shop_name', *fields)
+    )
+
+
+def build_shop_weekly_report(weeks=8):
+    """
+    [{"shop_name", "weeks": [{"start_date", "end_date", "label", "personal_reports", "know_hows",
+    "know_how_submitted"}, ...]}, ...]（週は新しい順）
+    """
+    week_ranges = _weeks(weeks)
+    since = timezone.make_aware(datetime.combine(week_ranges[-1][0], time.min))
+
+    shops = sorted({s for s in User.objects.values_list('shop_name', flat=True).distinct() if s})
+    buckets = {
+        shop: {start: {"personal_reports": [], "know_hows": []} for start, _ in week_ranges}
+        for shop in shops
+    }
+
+    # 1. 個人報告 (Post)
+    for row in _week_rows(Post.objects.filter(category='個人報告'), since, ('id', 'user_name', 'user_uid', 'created_at')):
+        week = buckets.get(row['author__shop_name'], {}).get(row['week'])
+        if week is not None:
+            week["personal_reports"].append({
+                "id": str(row['id']),
+                "user_name": row['user_name'] or row['user_uid'],  # user_nameが保存されていれば使う
+                "created_at": row['created_at'],
+            })
+
+    # 2. ノウハウ提出 (TreasurePost)。名前は author (FK) から JOIN で引く
+    for row in _week_rows(TreasurePost.objects.all(), since, ('id', 'title', 'author__display_name')):
+        week = buckets.get(row['author__shop_name'], {}).get(row['week'])
+        if week is not None:
+            week["know_hows"].append({
+                "id": str(row['id']),
+                "user_name": row['author__display_name'] or "Unknown",
+                "title": row['title'],
+            })
+
+    data = []
+    for shop in shops:
+        shop_weeks = []
+        for start, end in week_ranges:
+            week = buckets[shop][start]
+            shop_weeks.append({
+                "start_date": start,
+                "end_date": end,
+                "label": f"{start.month}/{start.day} 〜 {end.month}/{end.day}",
+                "personal_reports": week["personal_reports"],
+                "know_hows": week["know_hows"],
+                "know_how_submitted": len(week["know_hows"]) > 0,  # ノウハウ提出済みか
+            })
+        data.append({"shop_name": shop, "weeks": shop_weeks})
+    return data
+
+
+def shop_weekly_report(weeks=8, refresh=False):
+    """build_shop_weekly_report のキャッシュ付き版。キーは週数と今日の日付で、日付が変われば作り直す"""
+    weeks = max(1, min(int(weeks), SHOP_REPORT_MAX_WEEKS))
+    key = f"shop_weekly_report:{weeks}:{timezone.localdate().isoformat()}"
+    if not refresh:
+        data = cache.get(key)
+        if data is not None:
+            return data
+    data = build_shop_weekly_report(weeks)
+    cache.set(key, data, timeout=getattr(settings, "SHOP_ANALYTICS_CACHE_SECONDS", 300))
+    return data
@@ -0,0 +1,152 @@
+"""
+管理画面の一覧を CSV / XLSX でダウンロードさせるためのストリーミング出力。
+
+一覧 API と同じ絞り込みの QuerySet を iterator(chunk_size) で少しずつ読み、
+1行ずつ書き出して StreamingHttpResponse で返す。
+全件をメモリに載せないので、件数が増えてもメモリ使用量はほぼ一定。
+
+- CSV: 読んだ行からすぐに送り始める（Excel で文字化けしないよう BOM 付き UTF-8）
+- XLSX: ストリーミングではない。openpyxl (任意の依存) の write_only モードでレスポンスを返す前に
+  一時ファイルへ全行を書き（メモリは一定だが、全行を読み終えるまで1バイトも送れない）、
+  書き終えたファイルを FileResponse で分割して送る。待ち時間が延びすぎないよう
+  EXPORT_XLSX_MAX_ROWS 行を超えたら作らずにエラーにする（その件数は CSV を使う）。
+  件数は呼び出し元から count (QuerySet.count など) で受け取り、ブックを作る前に確かめる
+"""
+import csv
+import re
+import tempfile
+from itertools import islice
+
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .serializers import build_author_map
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FILE_TYPES = ("csv", "xlsx")
+
+CSV_CONTENT_TYPE = "text/csv; charset=utf-8"
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+class ExportTooLarge(Exception):
+    """XLSX の行数の上限を超えた"""
+
+
+def iter_chunks(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """QuerySet を chunk_size 件ずつのリストにして返す（サーバーサイドカーソルで読む）"""
+    chunk = []
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(obj)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_with_authors(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    (obj, 投稿者 User | None) を返す。
+    author FK が入っていない古い行は、チャンクごとに user_uid をまとめて1クエリで解決する。
+    """
+    for chunk in iter_chunks(queryset, chunk_size):
+        by_uid = build_author_map(chunk)["uid"]
+        for obj in chunk:
+            yield obj, obj.author or by_uid.get(obj.user_uid)
+
+
+def format_datetime(value):
+    return timezone.localtime(value).strftime("%Y/%m/%d %H:%M") if value else ""
+
+
+def strip_tags(html):
+    return re.sub('<[^>]*>', '', html or "")
+
+
+class _Echo:
+    """csv.writer の書き込み先。書いた文字列をそのまま返す"""
+
+    def write(self, value):
+        return value
+
+
+def _content_disposition(filename, extension):
+    stamp = timezone.localtime().strftime("%Y%m%d_%H%M")
+    return f'attachment; filename="{filename}_{stamp}.{extension}"'
+
+
+def csv_response(filename, headers, rows):
+    writer = csv.writer(_Echo())
+
+    def stream():
+        yield "\ufeff" + writer.writerow(headers)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(stream(), content_type=CSV_CONTENT_TYPE)
+    response["Content-Disposition"] = _content_disposition(filename, "csv")
+    return response
+
+
+def _xlsx_max_rows():
+    return getattr(settings, "EXPORT_XLSX_MAX_ROWS", 100000)
+
+
+def xlsx_response(filename, headers, rows, sheet_title="export", count=None):
+    """
+    全行を一時ファイルに書き終えてから、そのファイルを送るレスポンスを返す（openpyxl が無ければ None）。
+    count() (データ行数) が EXPORT_XLSX_MAX_ROWS を超えたら、ブックを作る前に ExportTooLarge。
+    数えた後に増えた行は上限で打ち切る。
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        return None
+
+    max_rows = _xlsx_max_rows()
+    if count is not None and count() > max_rows:
+        raise ExportTooLarge(max_rows)
+
+    # write_only モードは行をすぐ一時ファイルへ書き出すので、行数に関係なくメモリは一定
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=sheet_title[:31])
+    sheet.append(headers)
+    for row in islice(rows, max_rows):
+        sheet.append(row)
+
+    f = tempfile.TemporaryFile()
+    try:
+        workbook.save(f)
+        f.seek(0)
+    except Exception:
+        f.close()
+        raise
+    # FileResponse は送り終えたらファイルを閉じる（一時ファイルはそこで消える）
+    response = FileResponse(f, content_type=XLSX_CONTENT_TYPE)
+    response["Content-Disposition"] = _content_disposition(filename, "xlsx")
+    return response
+
+
+def export_response(request, filename, headers, rows, sheet_title="export", count=None):
+    """
+    ?file_type=csv（既定）/ xlsx に応じたレスポンスを返す。
+    rows は行（リスト）を返すイテレータ。CSV はレスポンスを送りながら、XLSX は送る前にすべて読まれる。
+    count は行数を返す関数（XLSX の上限の確認にだけ使う。CSV では呼ばない）。
+    """
+    file_type = (request.GET.get("file_type") or "csv").lower()
+    if file_type not in EXPORT_FILE_TYPES:
+        return Response({"error": f"file_type must be one of: {', '.join(EXPORT_FILE_TYPES)}"}, status=400)
+
+    if file_type == "xlsx":
+        try:
+            response = xlsx_response(filename, headers, rows, sheet_title, count=count)
+        except ExportTooLarge as e:
+            return Response({"error": f"XLSX export is limited to {e.args[0]} rows. Narrow the filters or use file_type=csv."}, status=400)
+        if response is None:
+            return Response({"error": "XLSX export is not available on this server (openpyxl is not installed). Use file_type=csv."}, status=501)
+        return response
+
+    return csv_response(filename, headers, rows)
@@ -0,0 +1,117 @@
+"""
+Firestore REST API (documents.list) のローカル用の偽サーバー。
+
+sync_firestore_videos を本物の Firestore なしで動かすためのもの。
+GET <base_url>?pageSize=N&pageToken=T に、本物と同じ形
+{"documents": [{"name": ".../pixtubePosts/<id>", "fields": {...}}], "nextPageToken": "..."}
+を返す。requests にページ数が溜まるので、全ページ読んだかの確認に使える。
+
+    with FakeFirestoreServer(make_video_documents(1000)) as server:
+        sync_firestore_videos(base_url=server.base_url)
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from .video_catalog import FIRESTORE_COLLECTION
+
+DEFAULT_PAGE_SIZE = 20
+
+
+def make_video_document(vid, title="", category="未分類", views=0, created_at="2025-01-01T00:00:00Z"):
+    return {
+        "name": f"projects/fake/databases/(default)/documents/{FIRESTORE_COLLECTION}/{vid}",
+        "fields": {
+            "title": {"stringValue": title or f"動画 {vid}"},
+            "author": {"stringValue": "事務局"},
+            "views": {"integerValue": str(views)},
+            "duration": {"stringValue": "3:00"},
+            "thumbnail": {"stringValue": f"https://example.com/{vid}.jpg"},
+            "src": {"stringValue": f"https://example.com/{vid}.mp4"},
+            "userAvatar": {"stringValue": ""},
+            "createdAt": {"stringValue": created_at},
+            "category": {"stringValue": category},
+        },
+    }
+
+
+def make_video_documents(count):
+    return [
+        make_video_document(f"fake{i:05d}", created_at=f"2025-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}Z")
+        for i in range(count)
+    ]
+
+
+class FakeFirestoreServer:
+    """別スレッドで動く HTTP サーバー。latency 秒だけ各ページの応答を遅らせられる"""
+
+    def __init__(self, documents, latency=0.0, host="127.0.0.1", port=0):
+        self.documents = list(documents)
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/projects/fake/databases/(default)/documents/{FIRESTORE_COLLECTION}"
+
+    def page(self, page_size, page_token):
+        """pageToken は次に返す先頭の位置"""
+        start = int(page_token or 0)
+        end = start + page_size
+        body = {"documents": self.documents[start:end]}
+        if end < len(self.documents):
+            body["nextPageToken"] = str(end)
+        return body
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if not url.path.endswith(f"/{FIRESTORE_COLLECTION}"):
+                    self.send_error(404)
+                    return
+                params = parse_qs(url.query)
+                try:
+                    page_size = int(params.get("pageSize", [DEFAULT_PAGE_SIZE])[0])
+                    body = fake.page(page_size, params.get("pageToken", [None])[0])
+                except ValueError:
+                    self.send_error(400)
+                    return
+                with fake._lock:
+                    fake.requests += 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,231 @@
+"""
+Google Sheets API (sheets v4) のローカル用の偽物。
+
+googleapiclient の service と同じ呼び出し方
+（service.spreadsheets().values().append(...).execute() など）で、
+同期処理が使う API だけをメモリ上のシートに対して実行する。
+settings.GOOGLE_SHEETS_FAKE = True で get_sheets_service() がこれを返す。
+
+calls に API 呼び出し回数が溜まるので、同期1回あたりのリクエスト数の確認に使える。
+"""
+import re
+import threading
+from collections import Counter
+
+_CELL = re.compile(r"^([A-Z]+)(\d+)?$")
+
+
+def _col_index(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + (ord(ch) - ord("A") + 1)
+    return n - 1
+
+
+def _col_letters(index):
+    letters = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+
+def parse_range(a1):
+    """
+    "'シート'!A2:H10" → ("シート", 1, 0, 9, 7)  (0始まり、終端を含む。省略時は None)
+    """
+    if "!" in a1:
+        sheet, cells = a1.rsplit("!", 1)
+    else:
+        sheet, cells = a1, ""
+    sheet = sheet.strip("'").replace("''", "'")
+    if not cells:
+        return sheet, 0, 0, None, None
+
+    start, _, end = cells.partition(":")
+    m = _CELL.match(start)
+    start_col = _col_index(m.group(1))
+    start_row = int(m.group(2)) - 1 if m.group(2) else 0
+    end_row = end_col = None
+    if end:
+        m = _CELL.match(end)
+        end_col = _col_index(m.group(1))
+        end_row = int(m.group(2)) - 1 if m.group(2) else None
+    return sheet, start_row, start_col, end_row, end_col
+
+
+class _Request:
+    def __init__(self, fn):
+        self._fn = fn
+
+    def execute(self, num_retries=0):
+        return self._fn()
+
+
+class FakeSheetsService:
+    """メモリ上のスプレッドシート群（spreadsheetId → {シート名: 行のリスト}）"""
+
+    def __init__(self):
+        self.books = {}
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._next_sheet_id = 1
+
+    # --- googleapiclient 互換の入口 ---
+    def spreadsheets(self):
+        return _Spreadsheets(self)
+
+    # --- テスト・確認用 ---
+    def rows(self, spreadsheet_id, sheet_name):
+        """シートの中身（末尾の空行は除く）"""
+        rows = [list(r) for r in self.books.get(spreadsheet_id, {}).get(sheet_name, {}).get("rows", [])]
+        while rows and not any(rows[-1]):
+            rows.pop()
+        return rows
+
+    def reset_calls(self):
+        self.calls.clear()
+
+    def _book(self, spreadsheet_id):
+        return self.books.setdefault(spreadsheet_id, {})
+
+    def _sheet(self, spreadsheet_id, name):
+        sheet = self._book(spreadsheet_id).get(name)
+        if sheet is None:
+            raise ValueError(f"Unable to parse range: {name}")
+        return sheet
+
+    def _add_sheet(self, spreadsheet_id, title):
+        book = self._book(spreadsheet_id)
+        if title in book:
+            raise ValueError(f'A sheet with the name "{title}" already exists.')
+        book[title] = {"sheetId": self._next_sheet_id, "rows": []}
+        self._next_sheet_id += 1
+        return book[title]["sheetId"]
+
+    def _write(self, spreadsheet_id, a1, values):
+        name, row, col, _, _ = parse_range(a1)
+        rows = self._sheet(spreadsheet_id, name)["rows"]
+        for offset, values_row in enumerate(values):
+            r = row + offset
+            while len(rows) <= r:
+                rows.append([])
+            target = rows[r]
+            while len(target) < col + len(values_row):
+                target.append("")
+            for c, value in enumerate(values_row):
+                target[col + c] = value
+        return len(values)
+
+    def _clear(self, spreadsheet_id, a1):
+        name, row, col, end_row, end_col = parse_range(a1)
+        rows = self._sheet(spreadsheet_id, name)["rows"]
+        last_row = len(rows) - 1 if end_row is None else min(end_row, len(rows) - 1)
+        for r in range(row, last_row + 1):
+            target = rows[r]
+            last_col = len(target) - 1 if end_col is None else min(end_col, len(target) - 1)
+            for c in range(col, last_col + 1):
+                target[c] = ""
+
+
+class _Spreadsheets:
+    def __init__(self, fake):
+        self.fake = fake
+
+    def get(self, spreadsheetId, fields=None, **kwargs):
+        def run():
+            with self.fake._lock:
+                self.fake.calls["get"] += 1
+                book = self.fake._book(spreadsheetId)
+                return {"sheets": [
+                    {"properties": {"title": title, "sheetId": sheet["sheetId"]}}
+                    for title, sheet in book.items()
+                ]}
+        return _Request(run)
+
+    def batchUpdate(self, spreadsheetId, body):
+        def run():
+            with self.fake._lock:
+                self.fake.calls["batchUpdate"] += 1
+                replies = []
+                for req in body.get("requests", []):
+                    if "addSheet" in req:
+                        title = req["addSheet"]["properties"]["title"]
+                        sheet_id = self.fake._add_sheet(spreadsheetId, title)
+                        replies.append({"addSheet": {"properties": {"title": title, "sheetId": sheet_id}}})
+                    else:
+                        raise NotImplementedError(f"FakeSheetsService does not support {list(req)}")
+                return {"spreadsheetId": spreadsheetId, "replies": replies}
+        return _Request(run)
+
+    def values(self):
+        return _Values(self.fake)
+
+
+class _Values:
+    def __init__(self, fake):
+        self.fake = fake
+
+    def get(self, spreadsheetId, range, **kwargs):
+        def run():
+            with self.fake._lock:
+                self.fake.calls["values.get"] += 1
+                name, row, col, end_row, end_col = parse_range(range)
+                rows = self.fake._sheet(spreadsheetId, name)["rows"]
+                stop = None if end_row is None else end_row + 1
+                values = [r[col:None if end_col is None else end_col + 1] for r in rows[row:stop]]
+                return {"range": range, "values": values}
+        return _Request(run)
+
+    def update(self, spreadsheetId, range, valueInputOption, body):
+        def run():
+            with self.fake._lock:
+                self.fake.calls["values.update"] += 1
+                n = self.fake._write(spreadsheetId, range, body.get("values", []))
+                return {"updatedRange": range, "updatedRows": n}
+        return _Request(run)
+
+    def append(self, spreadsheetId, range, valueInputOption, body, insertDataOption=None):
+        def run():
+            with self.fake._lock:
+                self.fake.calls["values.append"] += 1
+                name = parse_range(range)[0]
+                rows = self.fake._sheet(spreadsheetId, name)["rows"]
+                # 最後の「空でない行」の次から書く（本物の append と同じ）
+                start = len(rows)
+                while start and not any(rows[start - 1]):
+                    start -= 1
+                values = body.get("values", [])
+                self.fake._write(spreadsheetId, f"'{name}'!A{start + 1}", values)
+                width = max((len(v) for v in values), default=1)
+                updated = f"'{name}'!A{start + 1}:{_col_letters(width - 1)}{start + len(values)}"
+                return {"updates": {"updatedRange": updated, "updatedRows": len(values)}}
+        return _Request(run)
+
+    def clear(self, spreadsheetId, range, body=None):
+        def run():
+            with self.fake._lock:
+                self.fake.calls["values.clear"] += 1
+                self.fake._clear(spreadsheetId, range)
+                return {"clearedRange": range}
+        return _Request(run)
+
+    def batchUpdate(self, spreadsheetId, body):
+        def run():
+            with self.fake._lock:
+                self.fake.calls["values.batchUpdate"] += 1
+                total = 0
+                for item in body.get("data", []):
+                    total += self.fake._write(spreadsheetId, item["range"], item.get("values", []))
+                return {"totalUpdatedRows": total}
+        return _Request(run)
+
+    def batchClear(self, spreadsheetId, body):
+        def run():
+            with self.fake._lock:
+                self.fake.calls["values.batchClear"] += 1
+                for a1 in body.get("ranges", []):
+                    self.fake._clear(spreadsheetId, a1)
+                return {"clearedRanges": body.get("ranges", [])}
+        return _Request(run)
@@ -0,0 +1,185 @@
+"""
+Firestore (pixtubePosts) → Django Video の取り込み (manage.py sync_firestore_videos)。
+
+- nextPageToken をたどって全ページを読む（1ページ目だけで終わらない）
+- ページの取得と DB への書き込みを並行させる: 次のページを取りに行く間に、
+  取得済みのページをスレッドプールで upsert する
+  （ページはトークンでつながっているので、取得そのものは順番に行う）
+- upsert は bulk_create(update_conflicts=True) で1ページ1回。
+  管理画面で編集された項目（タイトル・カテゴリー・表示順など）は上書きしない
+- 全ページ取り込めたら FirestoreSyncState.last_synced_at を記録し、
+  以降 video_list は DB だけで一覧を作る
+- 途中で失敗したら、まだ取り込めていない最初のページの pageToken を
+  FirestoreSyncState.resume_page_token に残し、次回はそのページから続ける
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Video, FirestoreSyncState
+from .video_catalog import FIRESTORE_COLLECTION, FIRESTORE_VIDEOS_URL, parse_video_document
+
+logger = logging.getLogger(__name__)
+
+FIRESTORE_PAGE_SIZE = 300
+FIRESTORE_TIMEOUT_SECONDS = 10
+FIRESTORE_MAX_RETRIES = 3
+
+# 既存の行では空のときだけ Firestore の値で埋める項目（管理画面の編集を優先）
+FILL_IF_EMPTY_FIELDS = ("title", "user", "thumb", "video_url")
+# 既存の行でも Firestore の値で更新する項目（Firestore 側が正）
+FIRESTORE_OWNED_FIELDS = ("duration", "userAvatar")
+
+
+def iter_firestore_pages(base_url=FIRESTORE_VIDEOS_URL, page_size=FIRESTORE_PAGE_SIZE, session=None, page_token=None):
+    """
+    Firestore の documents.list を page_token のページから nextPageToken がなくなるまで読む。
+    (ページの document のリスト, 次のページの pageToken | None) を返す
+    """
+    session = session or requests.Session()
+    while True:
+        params = {"pageSize": page_size}
+        if page_token:
+            params["pageToken"] = page_token
+        data = _get_with_retry(session, base_url, params)
+        page_token = data.get("nextPageToken")
+        yield data.get("documents", []), page_token
+        if not page_token:
+            return
+
+
+def _get_with_retry(session, url, params):
+    for attempt in range(FIRESTORE_MAX_RETRIES + 1):
+        try:
+            resp = session.get(url, params=params, timeout=FIRESTORE_TIMEOUT_SECONDS)
+            if resp.status_code < 500 and resp.status_code != 429:
+                resp.raise_for_status()
+                return resp.json()
+            error = requests.HTTPError(f"HTTP {resp.status_code}", response=resp)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+        if attempt == FIRESTORE_MAX_RETRIES:
+            raise error
+        time.sleep(0.5 * (2 ** attempt))
+
+
+def _parse_created_at(value):
+    try:
+        return parse_datetime(value) if value else None
+    except ValueError:
+        return None
+
+
+def upsert_videos(documents):
+    """
+    1ページ分の document を Video に upsert する。
+    戻り値: 新しく作った件数
+    """
+    parsed = {}
+    for doc in documents:
+        video = parse_video_document(doc)
+        if video["id"]:
+            parsed[video["id"]] = video
+    if not parsed:
+        return 0
+
+    existing = {
+        v.id: v for v in Video.objects.filter(id__in=parsed).only("id", *FILL_IF_EMPTY_FIELDS)
+    }
+
+    objs = []
+    new_ids = []
+    for vid, fv in parsed.items():
+        current = existing.get(vid)
+        values = {
+            "duration": fv["duration"],
+            "userAvatar": fv["userAvatar"],
+        }
+        for field in FILL_IF_EMPTY_FIELDS:
+            values[field] = (getattr(current, field) if current else "") or fv[field]
+        if current is None:
+            new_ids.append(vid)
+            values.update({
+                "views": fv["views"],
+                "category": fv["category"],
+                "parent_category": fv["parent_category"],
+            })
+        objs.append(Video(id=vid, **values))
+
+    with transaction.atomic():
+        Video.objects.bulk_create(
+            objs,
+            update_conflicts=True,
+            unique_fields=["id"],
+            update_fields=[*FILL_IF_EMPTY_FIELDS, *FIRESTORE_OWNED_FIELDS],
+        )
+        # created_at は auto_now_add で取り込み時刻になるので、新規分だけ Firestore の作成日時に直す
+        fixed = []
+        for vid in new_ids:
+            created_at = _parse_created_at(parsed[vid]["created_at"])
+            if created_at:
+                fixed.append(Video(id=vid, created_at=created_at))
+        if fixed:
+            Video.objects.bulk_update(fixed, ["created_at"])
+
+    return len(new_ids)
+
+
+def _upsert_page(documents):
+    try:
+        return upsert_videos(documents)
+    finally:
+        # ワーカースレッドの DB 接続を閉じる
+        connections.close_all()
+
+
+def _resume_token(page_tokens, futures, failed_token):
+    """取り込めていない最初のページの pageToken（全ページ取り込めていれば、取得に失敗したページ）"""
+    for token, future in zip(page_tokens, futures):
+        if future.exception() is not None:
+            return token
+    return failed_token
+
+
+def sync_firestore_videos(base_url=FIRESTORE_VIDEOS_URL, page_size=FIRESTORE_PAGE_SIZE, workers=4, restart=False):
+    """
+    全ページを取り込み、同期の記録を残す。前回が途中で失敗していればそのページから続ける（restart=True なら先頭から）。
+    戻り値: {"pages", "documents", "created"}（今回読んだ分）
+    """
+    state, _ = FirestoreSyncState.objects.get_or_create(collection=FIRESTORE_COLLECTION)
+    state.last_started_at = timezone.now()
+    state.save(update_fields=["last_started_at"])
+
+    token = None if restart else (state.resume_page_token or None)
+    page_tokens = []
+    futures = []
+    documents = 0
+    try:
+        # 取得に失敗しても、with を抜けるときに取得済みのページの書き込みは終わっている
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="firestore-sync") as executor:
+            for page, next_token in iter_firestore_pages(base_url, page_size, page_token=token):
+                page_tokens.append(token or "")
+                documents += len(page)
+                futures.append(executor.submit(_upsert_page, page))
+                token = next_token
+        created = sum(f.result() for f in futures)
+    except Exception as e:
+        logger.exception("Firestore video sync failed")
+        state.last_error = str(e)[:1000]
+        state.resume_page_token = _resume_token(page_tokens, futures, token or "")
+        state.save(update_fields=["last_error", "resume_page_token"])
+        raise
+
+    # 全ページを取り込めたときだけウォーターマークを進める
+    state.last_synced_at = timezone.now()
+    state.documents_seen = documents
+    state.created_count = created
+    state.last_error = ""
+    state.resume_page_token = ""
+    state.save(update_fields=["last_synced_at", "documents_seen", "created_count", "last_error", "resume_page_token"])
+    return {"pages": len(futures), "documents": documents, "created": created}
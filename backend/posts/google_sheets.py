@@ -1,12 +1,23 @@
 import os
+import re
 import json
+import threading
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from django.conf import settings
 
-def get_sheets_service():
+SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+
+_fake_service = None
+_credentials = None
+_credentials_lock = threading.Lock()
+# googleapiclient の service (httplib2) はスレッドセーフではないので、スレッドごとに1つ持つ
+_local = threading.local()
+
+
+def _load_credentials():
     key_path = os.path.join(settings.BASE_DIR, 'service-account-key.json')
-    
+
     if not os.path.exists(key_path):
         # Local development placeholder or environment variable fallback
         key_json = os.environ.get('GOOGLE_SERVICE_ACCOUNT_KEY')
@@ -17,102 +28,136 @@ def get_sheets_service():
     else:
         with open(key_path, 'r') as f:
             info = json.load(f)
-            
-    credentials = service_account.Credentials.from_service_account_info(
-        info, scopes=['https://www.googleapis.com/auth/spreadsheets']
-    )
-    return build('sheets', 'v4', credentials=credentials)
 
-def ensure_sheet_exists(service, spreadsheet_id, sheet_name):
+    return service_account.Credentials.from_service_account_info(info, scopes=SCOPES)
+
+
+def get_sheets_service():
     """
-    Check if a sheet exists in the spreadsheet, and create it if it doesn't.
+    Return a cached Sheets API client.
+    The key file is read once per process; the discovery client is built once per thread.
     """
-    spreadsheet = service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
-    sheets = spreadsheet.get('sheets', [])
-    sheet_titles = [s['properties']['title'] for s in sheets]
-    
-    if sheet_name not in sheet_titles:
-        body = {
-            'requests': [{
-                'addSheet': {
-                    'properties': {
-                        'title': sheet_name
-                    }
-                }
-            }]
-        }
+    if getattr(settings, 'GOOGLE_SHEETS_FAKE', False):
+        # ローカル開発・動作確認用: メモリ上の偽スプレッドシート
+        global _fake_service
+        if _fake_service is None:
+            from .fake_sheets import FakeSheetsService
+            _fake_service = FakeSheetsService()
+        return _fake_service
+
+    service = getattr(_local, 'service', None)
+    if service is None:
+        global _credentials
+        with _credentials_lock:
+            if _credentials is None:
+                _credentials = _load_credentials()
+        service = build('sheets', 'v4', credentials=_credentials, cache_discovery=False)
+        _local.service = service
+    return service
+
+
+def reset_sheets_service():
+    """Drop cached credentials/clients (e.g. after rotating the service-account key)."""
+    global _credentials, _fake_service
+    with _credentials_lock:
+        _credentials = None
+    _fake_service = None
+    _local.__dict__.pop('service', None)
+
+
+def ensure_sheets_exist(service, spreadsheet_id, sheet_names):
+    """
+    Make sure every sheet in sheet_names exists (one metadata read, one batchUpdate at most).
+    """
+    spreadsheet = service.spreadsheets().get(
+        spreadsheetId=spreadsheet_id, fields='sheets.properties.title'
+    ).execute()
+    existing = {s['properties']['title'] for s in spreadsheet.get('sheets', [])}
+    missing = [name for name in sheet_names if name not in existing]
+    if missing:
         service.spreadsheets().batchUpdate(
             spreadsheetId=spreadsheet_id,
-            body=body
+            body={'requests': [{'addSheet': {'properties': {'title': name}}} for name in missing]}
         ).execute()
 
-def export_to_sheet(spreadsheet_id, sheet_name, headers, data):
+
+def ensure_sheet_exists(service, spreadsheet_id, sheet_name):
     """
-    Export data to a specific sheet. 
-    It ensures the sheet exists, clears it, and writes headers + data.
+    Check if a sheet exists in the spreadsheet, and create it if it doesn't.
     """
-    service = get_sheets_service()
-    sheet = service.spreadsheets()
+    ensure_sheets_exist(service, spreadsheet_id, [sheet_name])
+
+
+def export_sheets(spreadsheet_id, tabs, service=None):
+    """
+    Replace the contents of several sheets at once.
+    tabs: {sheet_name: (headers, rows)}
+    Round trips are constant regardless of the number of tabs:
+    metadata get (+ addSheet if needed), one values.batchClear, one values.batchUpdate.
+    """
+    service = service or get_sheets_service()
+    values = service.spreadsheets().values()
 
     # 0. シートが存在することを確認
-    ensure_sheet_exists(service, spreadsheet_id, sheet_name)
+    ensure_sheets_exist(service, spreadsheet_id, list(tabs))
 
-    # 1. 既存のデータをクリア (ヘッダー含め)
-    sheet.values().clear(
+    # 1. 既存のデータをクリア（シート全体。行数で打ち切らない）
+    values.batchClear(
         spreadsheetId=spreadsheet_id,
-        range=f"'{sheet_name}'!A1:Z5000"
+        body={'ranges': [f"'{name}'" for name in tabs]}
     ).execute()
 
-    # 2. ヘッダーとデータを準備
-    values = [headers] + data
-
-    # 3. 書き込み
-    if data:
-        body = {
-            'values': values
-        }
-        sheet.values().update(
-            spreadsheetId=spreadsheet_id,
-            range=f"'{sheet_name}'!A1",
-            valueInputOption='RAW',
-            body=body
-        ).execute()
-    else:
-        # データがない場合でもヘッダーだけ書き込む
-        body = {
-            'values': [headers]
+    # 2. ヘッダーとデータを書き込み（データがない場合でもヘッダーだけ書く）
+    values.batchUpdate(
+        spreadsheetId=spreadsheet_id,
+        body={
+            'valueInputOption': 'RAW',
+            'data': [
+                {'range': f"'{name}'!A1", 'values': [headers] + list(rows)}
+                for name, (headers, rows) in tabs.items()
+            ],
         }
-        sheet.values().update(
-            spreadsheetId=spreadsheet_id,
-            range=f"'{sheet_name}'!A1",
-            valueInputOption='RAW',
-            body=body
-        ).execute()
+    ).execute()
 
     return True
 
+
+def export_to_sheet(spreadsheet_id, sheet_name, headers, data):
+    """
+    Export data to a specific sheet.
+    It ensures the sheet exists, clears it, and writes headers + data.
+    """
+    return export_sheets(spreadsheet_id, {sheet_name: (headers, data)})
+
+
+def append_rows(service, spreadsheet_id, sheet_name, rows):
+    """
+    Append rows after the last non-empty row (the sheet grows as needed).
+    Returns the 1-based row number of the first appended row.
+    """
+    response = service.spreadsheets().values().append(
+        spreadsheetId=spreadsheet_id,
+        range=f"'{sheet_name}'!A1",
+        valueInputOption='RAW',
+        insertDataOption='OVERWRITE',
+        body={'values': rows}
+    ).execute()
+    # updatedRange は "'シート名'!A12:H15" の形
+    updated_range = response['updates']['updatedRange']
+    return int(re.search(r"![A-Z]+(\d+)", updated_range).group(1))
+
+
 def append_row_to_sheet(spreadsheet_id, sheet_name, row_data):
     """
-    Append a single row to a specific sheet. 
+    Append a single row to a specific sheet.
     It ensures the sheet exists and then appends the row.
     """
     service = get_sheets_service()
-    sheet = service.spreadsheets()
 
     # 0. シートが存在することを確認
     ensure_sheet_exists(service, spreadsheet_id, sheet_name)
 
-    # 1. データの準備
-    body = {
-        'values': [row_data]
-    }
-
-    # 2. 末尾への追記 (APPEND)
-    sheet.values().append(
-        spreadsheetId=spreadsheet_id,
-        range=f"'{sheet_name}'!A1",
-        valueInputOption='RAW',
-        body=body
-    ).execute()
+    # 1. 末尾への追記 (APPEND)
+    append_rows(service, spreadsheet_id, sheet_name, [row_data])
 
     return True
@@ -0,0 +1,92 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import Post, Comment, TreasurePost, TreasureComment
+from users.models import User
+
+MODELS = {
+    "post": Post,
+    "comment": Comment,
+    "treasure_post": TreasurePost,
+    "treasure_comment": TreasureComment,
+}
+
+
+class Command(BaseCommand):
+    help = "Backfill the author FK from user_uid in batches (migration 0037 already does this on deploy; safe to re-run)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Rows resolved per batch (default: 1000)",
+        )
+        parser.add_argument(
+            "--model",
+            choices=sorted(MODELS),
+            action="append",
+            help="Only backfill the given model (repeatable; default: all)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Resolve authors but do not write anything",
+        )
+
+    def handle(self, *args, **options):
+        names = options["model"] or list(MODELS)
+        for name in names:
+            updated, unresolved = self.backfill(
+                MODELS[name], options["batch_size"], options["dry_run"]
+            )
+            self.stdout.write(
+                f"{name}: {updated} rows linked, {unresolved} rows with unknown user_uid"
+            )
+
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING("Dry run: nothing was written."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Successfully backfilled authors."))
+
+    def backfill(self, model, batch_size, dry_run):
+        """
+        author 未設定かつ user_uid ありの行を pk 順に batch_size 件ずつ処理する。
+        1バッチあたり「対象行の取得」「User の一括取得」「bulk_update」の3クエリ。
+        解決できない行は残るが、pk で進むので無限ループにはならない。
+        """
+        pending = (
+            model.objects.filter(author__isnull=True, user_uid__isnull=False)
+            .exclude(user_uid="")
+            .order_by("pk")
+        )
+
+        updated = unresolved = 0
+        last_pk = None
+        while True:
+            batch_qs = pending if last_pk is None else pending.filter(pk__gt=last_pk)
+            batch = list(batch_qs.only("pk", "user_uid")[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            uids = {obj.user_uid for obj in batch}
+            user_ids = dict(
+                User.objects.filter(user_id__in=uids).values_list("user_id", "id")
+            )
+
+            resolved = []
+            for obj in batch:
+                author_pk = user_ids.get(obj.user_uid)
+                if author_pk is None:
+                    unresolved += 1
+                    continue
+                obj.author_id = author_pk
+                resolved.append(obj)
+
+            if resolved and not dry_run:
+                with transaction.atomic():
+                    model.objects.bulk_update(resolved, ["author"])
+            updated += len(resolved)
+
+        return updated, unresolved
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from posts.models import VideoViewLog
+from posts.watch_logs import compact_view_logs
+
+
+class Command(BaseCommand):
+    help = "Fold legacy per-heartbeat VideoViewLog rows into one row per viewing session (the watch rollups were filled by migration 0038)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--gap-seconds",
+            type=int,
+            help="Start a new session when heartbeats are further apart than this (default: VIEW_LOG_SESSION_GAP_SECONDS)",
+        )
+        parser.add_argument("--limit", type=int, help="Compact at most this many (user, video) pairs, then stop")
+
+    def handle(self, *args, **options):
+        gap = timedelta(seconds=options["gap_seconds"]) if options["gap_seconds"] else None
+        result = compact_view_logs(gap=gap, limit=options["limit"])
+        remaining = VideoViewLog.objects.filter(session_id='').count()
+        self.stdout.write(self.style.SUCCESS(
+            f"Compacted {result['pairs']} (user, video) pairs: "
+            f"{result['rows_before']} rows -> {result['rows_after']} sessions ({remaining} legacy rows left)"
+        ))
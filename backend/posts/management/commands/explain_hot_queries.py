@@ -0,0 +1,101 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from datetime import timedelta
+
+from posts.models import Post, TreasurePost, VideoViewLog, UserTestResult, UserInteractionLog
+from users.models import User, Notification
+
+
+class Command(BaseCommand):
+    help = "Print EXPLAIN for the queries behind the hot API views (index regression check)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            help="user_id to build per-user queries with (default: first active user)",
+        )
+        parser.add_argument(
+            "--analyze",
+            action="store_true",
+            help="Run EXPLAIN ANALYZE (PostgreSQL only; actually executes the queries)",
+        )
+        parser.add_argument(
+            "--only",
+            help="Comma-separated query names to explain (default: all)",
+        )
+
+    def handle(self, *args, **options):
+        if options["user"]:
+            user = User.objects.filter(user_id=options["user"]).first()
+            if not user:
+                raise CommandError(f"User not found: {options['user']}")
+        else:
+            user = User.objects.filter(is_active=True).order_by("id").first()
+            if not user:
+                raise CommandError("No users in the database. Pass --user or create one first.")
+
+        explain_options = {}
+        if options["analyze"]:
+            if connection.vendor != "postgresql":
+                raise CommandError("--analyze is only supported on PostgreSQL")
+            explain_options = {"analyze": True, "buffers": True}
+
+        only = set(filter(None, (options["only"] or "").split(",")))
+        queries = self.hot_queries(user)
+        if only:
+            unknown = only - set(queries)
+            if unknown:
+                raise CommandError(f"Unknown query names: {', '.join(sorted(unknown))}")
+
+        self.stdout.write(f"database: {connection.vendor} / user: {user.user_id}\n")
+        for name, queryset in queries.items():
+            if only and name not in only:
+                continue
+            self.stdout.write(self.style.MIGRATE_HEADING(f"=== {name} ==="))
+            self.stdout.write(queryset.explain(**explain_options))
+            self.stdout.write("")
+
+    def hot_queries(self, user):
+        """各 API ビューと同じ形のクエリを組み立てる（ビューを変えたらここも合わせる）"""
+        one_month_ago = timezone.now() - timedelta(days=30)
+        timeline = Post.objects.filter(is_deleted=False).filter(
+            Q(category='雑談') |
+            Q(category='') |
+            Q(category__isnull=True) |
+            Q(category='個人報告', user_uid=user.user_id)
+        )
+
+        return {
+            # posts_with_user (一般ユーザー / 先頭ページ)
+            "posts_with_user": timeline.with_feed_stats(user).order_by('-created_at', '-id')[:6],
+            # posts_with_user ?category= (事務局)
+            "posts_with_user_category": Post.objects.filter(is_deleted=False, category='個人報告')
+                .order_by('-created_at', '-id')[:6],
+            # posts_with_user ?shop_name=
+            "posts_with_user_shop": Post.objects.filter(is_deleted=False, shop_name=user.shop_name or '')
+                .order_by('-created_at', '-id')[:6],
+            # mypage_view / public_profile_view
+            "user_posts": Post.objects.filter(user_uid=user.user_id).order_by('-created_at'),
+            # treasure_post_list
+            "treasure_post_list": TreasurePost.objects.filter(is_deleted=False)
+                .with_feed_stats(user).order_by('-created_at', '-id')[:21],
+            # treasure_category_counts
+            "treasure_category_counts": TreasurePost.objects.filter(parent_category='Google-Pixel')
+                .values('category').order_by('category'),
+            # notification_list
+            "notification_list": Notification.objects.filter(recipient=user, created_at__gte=one_month_ago)
+                .order_by('-created_at')[:50],
+            # unread_notification_count / mark_notifications_read
+            "unread_notification_count": Notification.objects.filter(recipient=user, is_read=False),
+            # VideoSerializer.get_is_watched
+            "video_is_watched": VideoViewLog.objects.filter(user=user, video_id='dummy'),
+            # VideoSerializer.get_is_test_passed / video_list
+            "video_is_test_passed": UserTestResult.objects.filter(user=user, video_id='dummy', is_passed=True),
+            # video_view_logs
+            "video_view_logs": VideoViewLog.objects.order_by('-last_watched_at')[:100],
+            # admin_interaction_logs
+            "admin_interaction_logs": UserInteractionLog.objects.select_related('user')
+                .order_by('-created_at')[:100],
+        }
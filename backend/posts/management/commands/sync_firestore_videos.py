@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.firestore_sync import FIRESTORE_PAGE_SIZE, sync_firestore_videos
+from posts.video_catalog import FIRESTORE_VIDEOS_URL, refresh_video_catalog
+
+
+class Command(BaseCommand):
+    help = "Import every pixtubePosts document from Firestore into Video (all pages)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page-size", type=int, default=FIRESTORE_PAGE_SIZE)
+        parser.add_argument("--workers", type=int, default=4, help="Threads writing pages to the DB while the next page is fetched")
+        parser.add_argument("--base-url", default=FIRESTORE_VIDEOS_URL, help="Firestore documents URL of the collection")
+        parser.add_argument("--restart", action="store_true", help="Start from the first page even if the last run stopped midway")
+        parser.add_argument(
+            "--fake-documents",
+            type=int,
+            help="Start a local fake Firestore server with this many documents and import from it",
+        )
+        parser.add_argument("--fake-latency", type=float, default=0.0, help="Seconds the fake server waits per page")
+
+    def handle(self, *args, **options):
+        fake = None
+        base_url = options["base_url"]
+        if options["fake_documents"] is not None:
+            from posts.fake_firestore import FakeFirestoreServer, make_video_documents
+            fake = FakeFirestoreServer(make_video_documents(options["fake_documents"]), latency=options["fake_latency"]).start()
+            base_url = fake.base_url
+
+        started = time.monotonic()
+        try:
+            result = sync_firestore_videos(
+                base_url=base_url, page_size=options["page_size"], workers=options["workers"], restart=options["restart"],
+            )
+        except Exception as e:
+            raise CommandError(f"Firestore sync failed: {e}")
+        finally:
+            if fake:
+                fake.stop()
+
+        # 取り込んだ内容で一覧を作り直す（以降は DB だけを読む）
+        refresh_video_catalog()
+        self.stdout.write(self.style.SUCCESS(
+            f"Synced {result['documents']} documents in {result['pages']} pages "
+            f"({result['created']} new) in {time.monotonic() - started:.2f}s"
+        ))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.sheets_sync import SYNC_JOBS, run_pending_sheet_syncs, run_sheet_sync
+
+
+class Command(BaseCommand):
+    help = "Run the posts / treasures Google Sheets sync (pending jobs only by default)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--name",
+            choices=sorted(SYNC_JOBS),
+            action="append",
+            help="Force a sync of the given export even if nothing is pending (repeatable)",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="With --name: rebuild the sheets from scratch instead of writing only changes",
+        )
+
+    def handle(self, *args, **options):
+        if not options["name"]:
+            # タイマーが失われて同期待ちのまま残ったものを回収する（cron 用）
+            done = run_pending_sheet_syncs()
+            self.stdout.write(self.style.SUCCESS(f"Synced: {', '.join(done) or 'nothing pending'}"))
+            return
+
+        for name in options["name"]:
+            try:
+                ran = run_sheet_sync(name, force=True, full=options["full"])
+            except Exception as e:
+                raise CommandError(f"{name}: {e}")
+            if ran:
+                self.stdout.write(self.style.SUCCESS(f"{name}: synced"))
+            else:
+                self.stdout.write(self.style.WARNING(f"{name}: already running elsewhere, skipped"))
@@ -0,0 +1,83 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0029_comment_likes_treasurecomment_likes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', '-created_at'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['-created_at', '-id'], name='post_live_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['category', '-created_at', '-id'], name='post_live_cat_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['user_uid', '-created_at'], name='post_uid_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['shop_name', '-created_at', '-id'], name='post_shop_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='surveyresponse',
+            index=models.Index(fields=['test', 'user_id'], name='survey_resp_test_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='treasurecomment',
+            index=models.Index(fields=['post', '-created_at'], name='tcomment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='treasurepost',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['-created_at', '-id'], name='treasure_live_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='treasurepost',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['category', '-created_at', '-id'], name='treasure_live_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='treasurepost',
+            index=models.Index(fields=['user_uid', '-created_at'], name='treasure_uid_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='treasurepost',
+            index=models.Index(fields=['parent_category', 'category'], name='treasure_parent_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userinteractionlog',
+            index=models.Index(fields=['-created_at'], name='interaction_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userinteractionlog',
+            index=models.Index(fields=['user', '-created_at'], name='interaction_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usertestresult',
+            index=models.Index(fields=['user', 'video_id', 'is_passed'], name='testresult_user_video_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usertestresult',
+            index=models.Index(fields=['video_id', '-created_at'], name='testresult_video_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='videoviewlog',
+            index=models.Index(fields=['user', 'video'], name='viewlog_user_video_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='videoviewlog',
+            index=models.Index(fields=['-last_watched_at'], name='viewlog_watched_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0031_author_foreign_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SheetSyncJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('status', models.CharField(choices=[('IDLE', '待機中'), ('PENDING', '同期待ち'), ('RUNNING', '同期中'), ('FAILED', '失敗')], default='IDLE', max_length=20)),
+                ('requested_at', models.DateTimeField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('run_count', models.PositiveIntegerField(default=0)),
+                ('request_count', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+            ],
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0032_sheet_sync_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SheetExportState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('spreadsheet_id', models.CharField(max_length=100)),
+                ('sheet_name', models.CharField(max_length=100)),
+                ('high_water_mark', models.DateTimeField(blank=True, null=True)),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('rebuilt_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('spreadsheet_id', 'sheet_name'), name='sheet_export_state_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SheetRowIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.CharField(max_length=64)),
+                ('row_number', models.PositiveIntegerField()),
+                ('state', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='row_indexes', to='posts.sheetexportstate')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('state', 'object_id'), name='sheet_row_index_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0034_firestore_sync_state'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoWatchDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('watch_time', models.IntegerField(default=0)),
+                ('view_count', models.IntegerField(default=0)),
+                ('last_watched_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='videoviewlog',
+            name='session_id',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='videoviewlog',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='videoviewlog',
+            constraint=models.UniqueConstraint(condition=models.Q(('session_id', ''), _negated=True), fields=('user', 'video', 'session_id'), name='viewlog_user_video_session_uniq'),
+        ),
+        migrations.AddField(
+            model_name='videowatchdaily',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='video_watch_daily', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='videowatchdaily',
+            name='video',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='watch_daily', to='posts.video'),
+        ),
+        migrations.AddIndex(
+            model_name='videowatchdaily',
+            index=models.Index(fields=['date'], name='watchdaily_date_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='videowatchdaily',
+            unique_together={('user', 'video', 'date')},
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max, Sum
+
+
+def backfill_summary(apps, schema_editor):
+    """既存の日別集計 (VideoWatchDaily) から累計を作る"""
+    VideoWatchDaily = apps.get_model('posts', 'VideoWatchDaily')
+    VideoWatchSummary = apps.get_model('posts', 'VideoWatchSummary')
+    rows = (
+        VideoWatchDaily.objects.values('user_id', 'video_id')
+        .annotate(time=Sum('watch_time'), views=Sum('view_count'), last=Max('last_watched_at'))
+        .order_by()
+    )
+    VideoWatchSummary.objects.bulk_create(
+        [
+            VideoWatchSummary(
+                user_id=row['user_id'], video_id=row['video_id'],
+                watch_time=row['time'] or 0, view_count=row['views'] or 0, last_watched_at=row['last'],
+            )
+            for row in rows.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0035_view_log_sessions_daily'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoWatchSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('watch_time', models.IntegerField(default=0)),
+                ('view_count', models.IntegerField(default=0)),
+                ('last_watched_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='video_watch_summaries', to=settings.AUTH_USER_MODEL)),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='watch_summaries', to='posts.video')),
+            ],
+            options={
+                'unique_together': {('user', 'video')},
+            },
+        ),
+        migrations.RunPython(backfill_summary, migrations.RunPython.noop),
+    ]
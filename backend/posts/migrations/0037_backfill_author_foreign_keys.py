@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:12
+
+from django.conf import settings
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def backfill_authors(apps, schema_editor):
+    """
+    author (FK) が未設定の行を user_uid から埋める（manage.py backfill_authors と同じ処理）。
+    店舗での絞り込みや店舗別レポートは author__shop_name を見るので、デプロイ時点で埋めておく。
+    """
+    User = apps.get_model('users', 'User')
+    for name in ('Post', 'Comment', 'TreasurePost', 'TreasureComment'):
+        model = apps.get_model('posts', name)
+        pending = (
+            model.objects.filter(author__isnull=True, user_uid__isnull=False)
+            .exclude(user_uid='')
+            .order_by('pk')
+        )
+        last_pk = None
+        while True:
+            batch_qs = pending if last_pk is None else pending.filter(pk__gt=last_pk)
+            batch = list(batch_qs.only('pk', 'user_uid')[:BATCH_SIZE])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            user_ids = dict(
+                User.objects.filter(user_id__in={obj.user_uid for obj in batch}).values_list('user_id', 'id')
+            )
+            resolved = []
+            for obj in batch:
+                if obj.user_uid in user_ids:
+                    obj.author_id = user_ids[obj.user_uid]
+                    resolved.append(obj)
+            if resolved:
+                model.objects.bulk_update(resolved, ['author'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0036_video_watch_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_authors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:30
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, Max, Min, Sum
+from django.utils import timezone
+
+USER_CHUNK = 500
+
+
+def _rollup_legacy_rows(VideoViewLog, gap):
+    """
+    まとめる前の行 (session_id='') を posts.watch_logs._split_sessions と同じ規則でセッションに区切り、
+    (user, video, date) と (user, video) ごとの [視聴時間, 視聴回数, 最終視聴] を返す
+    """
+    daily = {}
+    summary = {}
+    rows = (
+        VideoViewLog.objects
+        .filter(session_id='', user__isnull=False)
+        .order_by('user_id', 'video_id', 'last_watched_at', 'id')
+        .values_list('user_id', 'video_id', 'watch_time', 'last_watched_at')
+    )
+    prev = None
+    for user_id, video_id, watch_time, watched_at in rows.iterator(chunk_size=5000):
+        new_session = (
+            prev is None or prev[:2] != (user_id, video_id)
+            or watch_time == 0 or watched_at - prev[2] > gap
+        )
+        prev = (user_id, video_id, watched_at)
+        for totals in (
+            daily.setdefault((user_id, video_id, timezone.localdate(watched_at)), [0, 0, None]),
+            summary.setdefault((user_id, video_id), [0, 0, None]),
+        ):
+            totals[0] += watch_time
+            totals[1] += 1 if new_session else 0
+            totals[2] = max(totals[2], watched_at) if totals[2] else watched_at
+    return daily, summary
+
+
+def _add_totals(model, key_fields, totals):
+    """totals {key: [watch_time, view_count, last_watched_at]} を既存の行に足す（無ければ作る）"""
+    user_ids = sorted({key[0] for key in totals})
+    for start in range(0, len(user_ids), USER_CHUNK):
+        chunk = set(user_ids[start:start + USER_CHUNK])
+        existing = {
+            tuple(getattr(row, f) for f in key_fields): row
+            for row in model.objects.filter(user_id__in=chunk)
+        }
+        to_update, to_create = [], []
+        for key, (watch_time, view_count, last_at) in totals.items():
+            if key[0] not in chunk:
+                continue
+            row = existing.get(key)
+            if row is None:
+                to_create.append(model(
+                    **dict(zip(key_fields, key)),
+                    watch_time=watch_time, view_count=view_count, last_watched_at=last_at,
+                ))
+            else:
+                row.watch_time += watch_time
+                row.view_count += view_count
+                row.last_watched_at = max(row.last_watched_at, last_at) if row.last_watched_at else last_at
+                to_update.append(row)
+        model.objects.bulk_create(to_create, batch_size=1000)
+        model.objects.bulk_update(to_update, ['watch_time', 'view_count', 'last_watched_at'], batch_size=1000)
+
+
+def backfill_watch_rollups(apps, schema_editor):
+    """
+    VideoWatchDaily / VideoWatchSummary に、集計テーブルができる前の視聴ログを足す。
+    以降の manage.py compact_view_logs は行をまとめるだけで、集計には足さない。
+    """
+    VideoViewLog = apps.get_model('posts', 'VideoViewLog')
+    gap = timedelta(seconds=getattr(settings, 'VIEW_LOG_SESSION_GAP_SECONDS', 300))
+    daily, summary = _rollup_legacy_rows(VideoViewLog, gap)
+    _add_totals(apps.get_model('posts', 'VideoWatchDaily'), ('user_id', 'video_id', 'date'), daily)
+    _add_totals(apps.get_model('posts', 'VideoWatchSummary'), ('user_id', 'video_id'), summary)
+
+
+def merge_anonymous_sessions(apps, schema_editor):
+    """匿名 (user=NULL) の同じセッションが重複して作られていたら1行にまとめる（次のマイグレーションの一意制約の前に）"""
+    VideoViewLog = apps.get_model('posts', 'VideoViewLog')
+    duplicates = (
+        VideoViewLog.objects
+        .filter(user__isnull=True).exclude(session_id='')
+        .values('video_id', 'session_id')
+        .annotate(n=Count('id'), keep=Min('id'), time=Sum('watch_time'), started=Min('started_at'), last=Max('last_watched_at'))
+        .filter(n__gt=1)
+        .order_by()
+    )
+    for dup in duplicates:
+        rows = VideoViewLog.objects.filter(user__isnull=True, video_id=dup['video_id'], session_id=dup['session_id'])
+        rows.filter(id=dup['keep']).update(
+            watch_time=dup['time'], started_at=dup['started'], last_watched_at=dup['last'],
+        )
+        rows.exclude(id=dup['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0037_backfill_author_foreign_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_watch_rollups, migrations.RunPython.noop),
+        migrations.RunPython(merge_anonymous_sessions, migrations.RunPython.noop),
+    ]
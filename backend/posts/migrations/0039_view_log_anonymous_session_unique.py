@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0038_backfill_watch_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='videoviewlog',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True), models.Q(('session_id', ''), _negated=True)), fields=('video', 'session_id'), name='viewlog_anon_video_session_uniq'),
+        ),
+    ]
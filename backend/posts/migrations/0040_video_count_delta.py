@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0039_view_log_anonymous_session_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoCountDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('video_id', models.CharField(db_index=True, max_length=200)),
+                ('views', models.IntegerField(default=0)),
+                ('watch_time', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
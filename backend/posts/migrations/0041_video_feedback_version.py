@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0040_video_count_delta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoFeedbackVersion',
+            fields=[
+                ('video_id', models.CharField(max_length=200, primary_key=True, serialize=False)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0041_video_feedback_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='firestoresyncstate',
+            name='resume_page_token',
+            field=models.CharField(blank=True, default='', max_length=500),
+        ),
+    ]
@@ -1,10 +1,63 @@
 from django.db import models
+from django.db.models import Count, Exists, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
 import uuid
 from users.models import User
 
-class Post(models.Model):
+
+def _count_subquery(queryset, group_field):
+    """OuterRef で絞った queryset の件数を返すサブクエリ（0件なら 0）"""
+    counted = (
+        queryset.order_by()
+        .values(group_field)
+        .annotate(c=Count('*'))
+        .values('c')
+    )
+    return Coalesce(Subquery(counted[:1]), 0)
+
+
+class FeedStatsQuerySet(models.QuerySet):
+    """
+    一覧表示用に likes_count / comments_count / liked を DB 側で計算して付与する。
+    （シリアライザは付与済みの値があればそれを使う）
+    """
+
+    def with_feed_stats(self, user=None):
+        likes = self.model.likes.through.objects.filter(**{self._through_fk: OuterRef('pk')})
+        comments = self.model.comments.rel.related_model.objects.filter(post=OuterRef('pk'))
+
+        qs = self.annotate(
+            likes_count=_count_subquery(likes, self._through_fk),
+            comments_count=_count_subquery(comments, 'post'),
+        )
+        if user is not None and user.is_authenticated:
+            qs = qs.annotate(liked=Exists(likes.filter(user_id=user.pk)))
+        else:
+            qs = qs.annotate(liked=Value(False))
+        return qs
+
+    @property
+    def _through_fk(self):
+        # likes の中間テーブルで自モデルを指すカラム (post_id / treasurepost_id)
+        return self.model.likes.field.m2m_field_name() + '_id'
+
+
+class AuthorSyncMixin:
+    """
+    author (FK) が未設定のまま保存されたときに user_uid から補完する。
+    ビューでは author=request.user を直接渡すので、ここは管理画面・シード等の保険。
+    """
+
+    def save(self, *args, **kwargs):
+        if self.author_id is None and self.user_uid:
+            self.author = User.objects.filter(user_id=self.user_uid).first()
+        super().save(*args, **kwargs)
+
+
+class Post(AuthorSyncMixin, models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)  # UUID型のIDを使用
-    author_id = models.CharField(max_length=200, blank=True, null=True)
+    legacy_author_id = models.CharField(max_length=200, blank=True, null=True)  # 旧フィールド (未使用)
+    author = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='authored_posts')
     user_name = models.CharField(max_length=100)
     profile_image = models.URLField(blank=True, null=True)
     title = models.CharField(max_length=255, blank=True)
@@ -24,19 +77,29 @@ class Post(models.Model):
     is_featured = models.BooleanField(default=False) # ← 事務局おすすめ
     is_deleted = models.BooleanField(default=False)
 
+    objects = FeedStatsQuerySet.as_manager()
 
     def __str__(self):
         return self.title or "(無題)"
 
     class Meta:
         db_table = 'posts_post'
+        indexes = [
+            # タイムライン (is_deleted=False を -created_at, -id で並べる)
+            models.Index(fields=['-created_at', '-id'], condition=Q(is_deleted=False), name='post_live_created_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], condition=Q(is_deleted=False), name='post_live_cat_created_idx'),
+            # 投稿者・店舗での絞り込み (マイページ / 管理画面 / 店舗別分析)
+            models.Index(fields=['user_uid', '-created_at'], name='post_uid_created_idx'),
+            models.Index(fields=['shop_name', '-created_at', '-id'], name='post_shop_created_idx'),
+        ]
 
 
-class Comment(models.Model):
+class Comment(AuthorSyncMixin, models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
     user_name = models.CharField(max_length=100)
     user_uid = models.CharField(max_length=200, blank=True, null=True)
+    author = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='authored_comments')
     content = models.TextField()
     image_url = models.URLField(max_length=1000, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -45,6 +108,9 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['post', '-created_at'], name='comment_post_created_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user_name}: {self.content[:20]}'
@@ -82,15 +148,70 @@ class Video(models.Model):
         return self.title
 
 class VideoViewLog(models.Model):
+    """1回の視聴（セッション）につき1行。視聴中のハートビートはこの行の watch_time に加算する"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name="logs")
+    # 空文字は compact_view_logs でまとめる前の古い行（ハートビート1回ごとの行）
+    session_id = models.CharField(max_length=64, blank=True, default='')
     watch_time = models.IntegerField(default=0)
+    started_at = models.DateTimeField(blank=True, null=True)
     last_watched_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'video'], name='viewlog_user_video_idx'),
+            models.Index(fields=['-last_watched_at'], name='viewlog_watched_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'video', 'session_id'],
+                condition=~models.Q(session_id=''),
+                name='viewlog_user_video_session_uniq',
+            ),
+            # user が NULL（匿名）の行は上の制約では重複を防げない (NULL 同士は別の値扱い) ので別に張る
+            models.UniqueConstraint(
+                fields=['video', 'session_id'],
+                condition=models.Q(user__isnull=True) & ~models.Q(session_id=''),
+                name='viewlog_anon_video_session_uniq',
+            ),
+        ]
+
     def __str__(self):
         user_name = getattr(self.user, "display_name", "Anonymous")
         return f"{self.video.title} - {user_name}"
 
+class VideoWatchDaily(models.Model):
+    """ユーザー×動画×日ごとの視聴の集計。視聴ログの書き込み時に加算していく"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="video_watch_daily")
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name="watch_daily")
+    date = models.DateField()
+    watch_time = models.IntegerField(default=0)
+    view_count = models.IntegerField(default=0)  # その日に始まった視聴（セッション）の数
+    last_watched_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        unique_together = ('user', 'video', 'date')
+        indexes = [
+            models.Index(fields=['date'], name='watchdaily_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.user_id} {self.video_id}"
+
+class VideoWatchSummary(models.Model):
+    """ユーザー×動画ごとの視聴の累計（視聴マトリクス用）。視聴ログの書き込み時に加算していく"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="video_watch_summaries")
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name="watch_summaries")
+    watch_time = models.IntegerField(default=0)
+    view_count = models.IntegerField(default=0)
+    last_watched_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        unique_together = ('user', 'video')
+
+    def __str__(self):
+        return f"{self.user_id} {self.video_id}"
+
 class Hashtag(models.Model):
     name = models.CharField(max_length=100, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -98,7 +219,7 @@ class Hashtag(models.Model):
     def __str__(self):
         return f"#{self.name}"
 
-class TreasurePost(models.Model):
+class TreasurePost(AuthorSyncMixin, models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     title = models.CharField(max_length=255, blank=True)
     content = models.TextField(blank=True)
@@ -107,6 +228,7 @@ class TreasurePost(models.Model):
     image_url = models.URLField(max_length=1000, blank=True, null=True)
     image_urls = models.JSONField(blank=True, null=True)  # ← 複数画像対応
     user_uid = models.CharField(max_length=200, blank=True, null=True)
+    author = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='authored_treasure_posts')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     likes = models.ManyToManyField(User, related_name='liked_treasure_posts', blank=True)
@@ -120,6 +242,8 @@ class TreasurePost(models.Model):
     appeal_points = models.TextField(blank=True, null=True)
     read_by = models.ManyToManyField(User, related_name='read_treasure_posts', blank=True)
 
+    objects = FeedStatsQuerySet.as_manager()
+
     def __str__(self):
         return self.title or "(無題)"
 
@@ -127,12 +251,19 @@ class TreasurePost(models.Model):
         db_table = 'treasure_posts'
         verbose_name = 'Treasure Post'
         verbose_name_plural = 'Treasure Posts'
-
-class TreasureComment(models.Model):
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], condition=Q(is_deleted=False), name='treasure_live_created_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], condition=Q(is_deleted=False), name='treasure_live_cat_idx'),
+            models.Index(fields=['user_uid', '-created_at'], name='treasure_uid_created_idx'),
+            models.Index(fields=['parent_category', 'category'], name='treasure_parent_cat_idx'),
+        ]
+
+class TreasureComment(AuthorSyncMixin, models.Model):
     post = models.ForeignKey(TreasurePost, on_delete=models.CASCADE, related_name='comments')
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
     user_name = models.CharField(max_length=100)
     user_uid = models.CharField(max_length=200, blank=True, null=True)
+    author = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='authored_treasure_comments')
     content = models.TextField()
     image_url = models.URLField(max_length=1000, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -141,6 +272,9 @@ class TreasureComment(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['post', '-created_at'], name='tcomment_post_created_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user_name}: {self.content[:20]}'
@@ -240,6 +374,12 @@ class UserTestResult(models.Model):
     is_passed = models.BooleanField(default=False)  # ✅ 合否判定を追加
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'video_id', 'is_passed'], name='testresult_user_video_idx'),
+            models.Index(fields=['video_id', '-created_at'], name='testresult_video_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.display_name} - {self.video_id}: {self.score}/{self.max_score} ({'合格' if self.is_passed else '不合格'})"
 
@@ -278,6 +418,11 @@ class SurveyResponse(models.Model):
     user_id = models.CharField(max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['test', 'user_id'], name='survey_resp_test_user_idx'),
+        ]
+
 class SurveyAnswer(models.Model):
     response = models.ForeignKey(SurveyResponse, on_delete=models.CASCADE)
     question = models.ForeignKey(SurveyQuestion, on_delete=models.CASCADE)
@@ -332,6 +477,10 @@ class UserInteractionLog(models.Model):
     class Meta:
         db_table = 'user_interaction_logs'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='interaction_created_idx'),
+            models.Index(fields=['user', '-created_at'], name='interaction_user_created_idx'),
+        ]
 
 class LoginPopupSetting(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -341,3 +490,102 @@ class LoginPopupSetting(models.Model):
 
     def __str__(self):
         return f"Popup: {self.notice.title} ({'Active' if self.is_active else 'Inactive'})"
+
+
+# --- Google Sheets 同期ジョブの状態 (posts/sheets_sync.py) ---
+# 同期対象ごとに1行。複数プロセスから「同期して」が来ても1回の同期にまとめるために使う。
+class SheetSyncJob(models.Model):
+    STATUS_CHOICES = [
+        ('IDLE', '待機中'),
+        ('PENDING', '同期待ち'),
+        ('RUNNING', '同期中'),
+        ('FAILED', '失敗'),
+    ]
+
+    name = models.CharField(max_length=50, unique=True)  # posts / treasures
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='IDLE')
+    requested_at = models.DateTimeField(blank=True, null=True)  # 最後に同期を依頼された時刻
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    run_count = models.PositiveIntegerField(default=0)
+    request_count = models.PositiveIntegerField(default=0)  # 依頼の累計（run_count との差がまとめられた回数）
+    last_error = models.TextField(blank=True, default='')
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+
+# --- Google Sheets 差分同期の状態 (posts/sheets_sync.py) ---
+# シート（タブ）ごとに「どこまで書いたか」と「どの投稿が何行目か」を覚えておき、
+# 新しい投稿は追記、変更された投稿はその行だけ上書きする。
+class SheetExportState(models.Model):
+    spreadsheet_id = models.CharField(max_length=100)
+    sheet_name = models.CharField(max_length=100)
+    high_water_mark = models.DateTimeField(blank=True, null=True)  # 書き込み済みの updated_at の最大値
+    row_count = models.PositiveIntegerField(default=0)  # ヘッダーを除いたデータ行数
+    rebuilt_at = models.DateTimeField(blank=True, null=True)  # 最後に全件書き直した時刻
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['spreadsheet_id', 'sheet_name'], name='sheet_export_state_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.sheet_name} ({self.row_count} rows)"
+
+
+class SheetRowIndex(models.Model):
+    state = models.ForeignKey(SheetExportState, on_delete=models.CASCADE, related_name='row_indexes')
+    object_id = models.CharField(max_length=64)  # Post / TreasurePost の id
+    row_number = models.PositiveIntegerField()  # シート上の行番号（1始まり、1行目はヘッダー）
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['state', 'object_id'], name='sheet_row_index_unique'),
+        ]
+
+
+# --- Firestore → Video 取り込みの状態 (manage.py sync_firestore_videos) ---
+# last_synced_at が入っていれば Video テーブルは Firestore の全件を取り込み済みで、
+# video_list は Firestore を読まずに DB だけで一覧を作る。
+class FirestoreSyncState(models.Model):
+    collection = models.CharField(max_length=100, unique=True)  # pixtubePosts
+    last_synced_at = models.DateTimeField(blank=True, null=True)  # 最後に全ページを取り込み終えた時刻
+    last_started_at = models.DateTimeField(blank=True, null=True)
+    documents_seen = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    # 途中で失敗したときの、まだ取り込めていない最初のページの pageToken（次回はここから読む。空なら先頭から）
+    resume_page_token = models.CharField(max_length=500, blank=True, default='')
+
+    def __str__(self):
+        return f"{self.collection} (synced at {self.last_synced_at})"
+
+
+# --- 動画の再生回数・視聴時間の増分 (posts/view_counters.py) ---
+# 再生のたびに Video の行を UPDATE せず、ここに1行追加する（追記だけなので行の取り合いが起きない）。
+# flush_video_counts が動画ごとに合計して Video に F() で足し、足した行を消す。
+# プロセスが落ちても増分は DB に残り、次にどこかのプロセスが flush したときに反映される。
+class VideoCountDelta(models.Model):
+    # Video の行がまだ無い動画（Firestore にしか無いもの）もあるので FK にしない
+    video_id = models.CharField(max_length=200, db_index=True)
+    views = models.IntegerField(default=0)
+    watch_time = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.video_id}: +{self.views} views, +{self.watch_time}s"
+
+
+# --- 動画ごとのテスト・アンケート集計のバージョン (posts/video_feedback.py) ---
+# テスト・アンケートが提出されるたびに同じトランザクションで version を上げ、キャッシュのキーに含める。
+# キャッシュがプロセスごと (LocMem) でも、別インスタンスは次のレポートで新しいキーを引くので古い集計を返さない。
+class VideoFeedbackVersion(models.Model):
+    # Video の行がまだ無い動画もあるので FK にしない
+    video_id = models.CharField(primary_key=True, max_length=200)
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.video_id} feedback v{self.version}"
@@ -0,0 +1,102 @@
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+
+# === キーセット（カーソル）ページネーション ===
+# (created_at, id) の降順で並べ、「最後に返した行より前」を WHERE で絞る。
+# OFFSET を使わないので深くスクロールしても遅くならず、COUNT も不要。
+
+KEYSET_ORDERING = ('-created_at', '-id')
+
+
+def encode_cursor(obj):
+    """最後に返した行から次ページ用の不透明なカーソル文字列を作る"""
+    payload = json.dumps({"c": obj.created_at.isoformat(), "i": str(obj.pk)})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """カーソル文字列を (created_at, id) に戻す。不正な値は ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        created_at = parse_datetime(payload["c"])
+        pk = payload["i"]
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {cursor}") from e
+    if created_at is None or not pk:
+        raise ValueError(f"invalid cursor: {cursor}")
+    return created_at, pk
+
+
+def keyset_paginate(queryset, cursor, limit):
+    """
+    cursor（空なら先頭）から limit 件を返す。
+    limit+1 件取得して次ページの有無を判定する。
+    戻り値: (items, next_cursor)  ※次ページがなければ next_cursor は None
+    """
+    queryset = queryset.order_by(*KEYSET_ORDERING)
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+        )
+
+    items = list(queryset[:limit + 1])
+    has_next = len(items) > limit
+    items = items[:limit]
+    next_cursor = encode_cursor(items[-1]) if has_next and items else None
+    return items, next_cursor
+
+
+class KeysetPaginationMixin:
+    """
+    PageNumberPagination に ?cursor= モードを追加する。
+    ?cursor=（空文字で先頭ページ）が付いている場合はキーセット方式で返し、
+    付いていなければ従来どおりページ番号方式で返す。
+    """
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = self.cursor_query_param in request.query_params
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        limit = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param) or None
+        try:
+            items, self.next_cursor = keyset_paginate(queryset, cursor, limit)
+        except ValueError as e:
+            raise ValidationError({"cursor": str(e)})
+        return items
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+
+        next_url = None
+        if self.next_cursor:
+            url = self.request.build_absolute_uri()
+            url = remove_query_param(url, self.page_query_param)
+            next_url = replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+        return Response({
+            "next": next_url,
+            "next_cursor": self.next_cursor,
+            "has_next": self.next_cursor is not None,
+            "results": data,
+        })
+
+
+class TreasurePostPagination(KeysetPaginationMixin, PageNumberPagination):
+    page_size = 20  # 1回で取得する件数（必要なら10〜30でもOK）
+    page_size_query_param = 'limit'
+    max_page_size = 100
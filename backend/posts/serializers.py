@@ -3,6 +3,99 @@ from users.models import User
 from .models import Post, Comment, Video, TreasurePost, TreasureComment, Notice, VideoTest, Question, Choice, Survey, SurveyQuestion, SurveyChoice, OfficeNews, TaskButton
 
 
+# === 投稿者プロフィールの一括解決 ===
+
+def _loaded_author(obj):
+    """select_related('author') 等で author が読み込み済みならそれを返す（クエリなし）"""
+    descriptor = getattr(type(obj), 'author', None)
+    if descriptor is not None and descriptor.is_cached(obj):
+        return obj.author
+    return None
+
+
+def build_author_map(objs, fallback_to_user_name=False):
+    """
+    objs の user_uid をまとめて 1 クエリで User に解決する。
+    fallback_to_user_name=True の場合、uid で見つからなかったものは
+    user_name (= display_name) でもう 1 クエリだけ引き直す（コメント用）。
+    author が読み込み済みの行は問い合わせ対象から外す。
+    戻り値: {"uid": {user_uid: User | None}, "name": {user_name: User | None}}
+    """
+    objs = [o for o in objs if _loaded_author(o) is None]
+    uids = {o.user_uid for o in objs if o.user_uid}
+    by_uid = {uid: None for uid in uids}
+    if uids:
+        for u in User.objects.filter(user_id__in=uids):
+            by_uid[u.user_id] = u
+
+    by_name = {}
+    if fallback_to_user_name:
+        names = {
+            o.user_name for o in objs
+            if o.user_name and by_uid.get(o.user_uid) is None
+        }
+        by_name = {name: None for name in names}
+        if names:
+            for u in User.objects.filter(display_name__in=names).order_by('id'):
+                # .first() と同じく、同名が複数いる場合は先に作られた方を採用
+                if by_name.get(u.display_name) is None:
+                    by_name[u.display_name] = u
+
+    return {"uid": by_uid, "name": by_name}
+
+
+class AuthorListSerializer(serializers.ListSerializer):
+    """
+    many=True のときにページ内の投稿者をまとめて解決し、子シリアライザに渡す。
+    （投稿1件ごとに User を引き直す N+1 を防ぐ）
+    """
+
+    def to_representation(self, data):
+        items = data.all() if hasattr(data, 'all') else data
+        items = list(items)
+        self.child.author_map = build_author_map(
+            items, fallback_to_user_name=self.child.author_fallback_to_user_name
+        )
+        return super().to_representation(items)
+
+
+class AuthorLookupMixin:
+    """
+    get_author(obj) で投稿者 User を返す。
+    AuthorListSerializer から author_map が渡されていればそれを使い、
+    単体シリアライズ時は初回だけ問い合わせてキャッシュする。
+    """
+    author_map = None
+    author_fallback_to_user_name = False
+
+    def get_author(self, obj):
+        author = _loaded_author(obj)
+        if author is not None:
+            return author
+
+        if not self._author_map_covers(obj):
+            self.author_map = build_author_map(
+                [obj], fallback_to_user_name=self.author_fallback_to_user_name
+            )
+
+        user = self.author_map["uid"].get(obj.user_uid) if obj.user_uid else None
+        if user is None and self.author_fallback_to_user_name and obj.user_name:
+            user = self.author_map["name"].get(obj.user_name)
+        return user
+
+    def _author_map_covers(self, obj):
+        if self.author_map is None:
+            return False
+        if obj.user_uid and obj.user_uid not in self.author_map["uid"]:
+            return False
+        if (
+            self.author_fallback_to_user_name
+            and obj.user_name
+            and self.author_map["uid"].get(obj.user_uid) is None
+            and obj.user_name not in self.author_map["name"]
+        ):
+            return False
+        return True
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -11,7 +104,7 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ('id', 'display_name', 'profile_image')
 
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(AuthorLookupMixin, serializers.ModelSerializer):
     display_name = serializers.SerializerMethodField()
     profile_image = serializers.SerializerMethodField()
     likes_count = serializers.SerializerMethodField()
@@ -42,6 +135,7 @@ class PostSerializer(serializers.ModelSerializer):
             'liked',
             'is_deleted',
         ]
+        list_serializer_class = AuthorListSerializer
     
     hashtags = serializers.SlugRelatedField(
         many=True,
@@ -56,11 +150,11 @@ class PostSerializer(serializers.ModelSerializer):
     )
 
     def get_display_name(self, obj):
-        user = User.objects.filter(user_id=obj.user_uid).first()
+        user = self.get_author(obj)
         return user.display_name if user else "匿名"
 
     def get_profile_image(self, obj):
-        user = User.objects.filter(user_id=obj.user_uid).first()
+        user = self.get_author(obj)
         return user.profile_image if user else None
 
     def get_image_url(self, obj):
@@ -80,12 +174,19 @@ class PostSerializer(serializers.ModelSerializer):
         return None
 
     def get_likes_count(self, obj):  # ✅ ← このメソッド名が大事！
+        # with_feed_stats() で付与済みならクエリ不要
+        if hasattr(obj, 'likes_count'):
+            return obj.likes_count
         return obj.likes.count()
 
     def get_comments_count(self, obj):
+        if hasattr(obj, 'comments_count'):
+            return obj.comments_count
         return obj.comments.count()
 
     def get_liked(self, obj):
+        if hasattr(obj, 'liked'):
+            return obj.liked
         request = self.context.get('request')
         user = getattr(request, 'user', None)
         if user and user.is_authenticated:
@@ -93,7 +194,7 @@ class PostSerializer(serializers.ModelSerializer):
         return False
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(AuthorLookupMixin, serializers.ModelSerializer):
     # user_uid から User モデルを検索してプロフィール画像などを取得
     display_name = serializers.SerializerMethodField()
     profile_image = serializers.SerializerMethodField()
@@ -103,6 +204,9 @@ class CommentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Comment
         fields = ['id', 'post', 'parent', 'user_name', 'user_uid', 'content', 'image_url', 'created_at', 'display_name', 'profile_image', 'likes_count', 'liked']
+        list_serializer_class = AuthorListSerializer
+
+    author_fallback_to_user_name = True
 
     def get_likes_count(self, obj):
         return obj.likes.count()
@@ -115,19 +219,13 @@ class CommentSerializer(serializers.ModelSerializer):
         return False
 
     def get_display_name(self, obj):
-        user = None
-        if obj.user_uid:
-            user = User.objects.filter(user_id=obj.user_uid).first()
-        if user:
+        user = self.get_author(obj) if obj.user_uid else None
+        if user and user.user_id == obj.user_uid:
             return user.display_name or obj.user_name or "匿名"
         return obj.user_name or "匿名"
 
     def get_profile_image(self, obj):
-        user = None
-        if obj.user_uid:
-            user = User.objects.filter(user_id=obj.user_uid).first()
-        if not user and obj.user_name:
-            user = User.objects.filter(display_name=obj.user_name).first()
+        user = self.get_author(obj)
         if user:
             return user.profile_image
         return None
@@ -187,7 +285,7 @@ class VideoSerializer(serializers.ModelSerializer):
         from .models import VideoTest
         return VideoTest.objects.filter(video=obj).exists()
 
-class TreasurePostSerializer(serializers.ModelSerializer):
+class TreasurePostSerializer(AuthorLookupMixin, serializers.ModelSerializer):
     display_name = serializers.SerializerMethodField()
     profile_image = serializers.SerializerMethodField()
     likes_count = serializers.SerializerMethodField()
@@ -223,9 +321,10 @@ class TreasurePostSerializer(serializers.ModelSerializer):
             'shop_name',
             'is_read',
         ]
+        list_serializer_class = AuthorListSerializer
 
     def get_shop_name(self, obj):
-        user = User.objects.filter(user_id=obj.user_uid).first()
+        user = self.get_author(obj)
         return user.shop_name if user else ""
 
     def get_image_url(self, obj):
@@ -234,20 +333,26 @@ class TreasurePostSerializer(serializers.ModelSerializer):
         return None
 
     def get_display_name(self, obj):
-        user = User.objects.filter(user_id=obj.user_uid).first()
+        user = self.get_author(obj)
         return user.display_name if user else "匿名"
 
     def get_profile_image(self, obj):
-        user = User.objects.filter(user_id=obj.user_uid).first()
+        user = self.get_author(obj)
         return user.profile_image if user else None
 
     def get_likes_count(self, obj):
+        if hasattr(obj, 'likes_count'):
+            return obj.likes_count
         return obj.likes.count()
 
     def get_comments_count(self, obj):
+        if hasattr(obj, 'comments_count'):
+            return obj.comments_count
         return obj.comments.count()
 
     def get_liked(self, obj):
+        if hasattr(obj, 'liked'):
+            return obj.liked
         request = self.context.get('request')
         user = getattr(request, 'user', None)
         if user and user.is_authenticated:
@@ -317,7 +422,7 @@ class TaskButtonSerializer(serializers.ModelSerializer):
         model = TaskButton
         fields = '__all__'
 
-class TreasureCommentSerializer(serializers.ModelSerializer):
+class TreasureCommentSerializer(AuthorLookupMixin, serializers.ModelSerializer):
     display_name = serializers.SerializerMethodField()
     profile_image = serializers.SerializerMethodField()
     likes_count = serializers.SerializerMethodField()
@@ -326,6 +431,9 @@ class TreasureCommentSerializer(serializers.ModelSerializer):
     class Meta:
         model = TreasureComment
         fields = ['id', 'post', 'parent', 'user_name', 'user_uid', 'content', 'image_url', 'created_at', 'display_name', 'profile_image', 'likes_count', 'liked']
+        list_serializer_class = AuthorListSerializer
+
+    author_fallback_to_user_name = True
 
     def get_likes_count(self, obj):
         return obj.likes.count()
@@ -338,19 +446,13 @@ class TreasureCommentSerializer(serializers.ModelSerializer):
         return False
 
     def get_display_name(self, obj):
-        user = None
-        if obj.user_uid:
-            user = User.objects.filter(user_id=obj.user_uid).first()
-        if user:
+        user = self.get_author(obj) if obj.user_uid else None
+        if user and user.user_id == obj.user_uid:
             return user.display_name or obj.user_name or "匿名"
         return obj.user_name or "匿名"
 
     def get_profile_image(self, obj):
-        user = None
-        if obj.user_uid:
-            user = User.objects.filter(user_id=obj.user_uid).first()
-        if not user and obj.user_name:
-            user = User.objects.filter(display_name=obj.user_name).first()
+        user = self.get_author(obj)
         if user:
             return user.profile_image
         return None
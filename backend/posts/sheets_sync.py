@@ -0,0 +1,376 @@
+"""
+投稿・ノウハウ投稿の Google Sheets 同期。
+
+投稿の作成・編集・削除のたびにリクエスト内で全件エクスポートしていたのをやめ、
+request_sheet_sync() で「同期待ち」にしておき、SHEETS_SYNC_DEBOUNCE_SECONDS 後に
+バックグラウンドで1回だけエクスポートする（その間の依頼はまとめて1回になる）。
+
+同期の状態は SheetSyncJob に保存するので、複数の gunicorn ワーカーがいても
+同時に実行されるのは1つだけ。状態は /api/admin/gsheet_sync/status/ で確認できる。
+
+エクスポートは差分方式:
+- シートごとに updated_at の最大値 (SheetExportState.high_water_mark) と
+  投稿ごとの行番号 (SheetRowIndex) を覚えておく
+- 前回以降に更新された投稿だけを読み、既にある行は上書き、新しい投稿は末尾に追記
+- 追記する行の行番号はシートに書く前に記録するので、書いた後で失敗してやり直しても同じ行を上書きする
+- 初回と full=True のときだけ全件を書き直す（行は古い順）
+"""
+import logging
+import re
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+from pixelshop_backend.background import run_later
+from .google_sheets import get_sheets_service, export_sheets
+from .models import Post, TreasurePost, SheetSyncJob, SheetExportState, SheetRowIndex
+
+logger = logging.getLogger(__name__)
+
+# 同期中のままこれ以上経った行はプロセスが落ちたとみなして取り直す
+SHEETS_SYNC_LEASE_SECONDS = 15 * 60
+
+# 差分を読むときに high_water_mark から遡る秒数。
+# 同期中にまだコミットされていなかった更新を取りこぼさないため（上書きは何度やっても同じ結果）
+SHEETS_SYNC_OVERLAP_SECONDS = 60
+
+POSTS_SPREADSHEET_ID = "1SC0mHuk_U45I5cF65EZYQJOzcjyYEzxoAmILcO7gr7M"
+
+
+def _strip_tags(html):
+    return re.sub('<[^>]*>', '', html or "")
+
+
+class SheetExport:
+    """
+    1つの同期対象（投稿 / ノウハウ投稿）の定義。
+    build_row(obj) で1行を作り、sheets_for(obj) でその行を載せるシート名を返す。
+    """
+
+    def __init__(self, spreadsheet_id, headers, sheet_names, queryset, build_row, sheets_for):
+        self.spreadsheet_id = spreadsheet_id
+        self.headers = headers
+        self.sheet_names = sheet_names
+        self.queryset = queryset
+        self.build_row = build_row
+        self.sheets_for = sheets_for
+
+
+# --- 投稿 ---
+POST_CATEGORY_SHEETS = {"雑談": "雑談", "個人報告": "個人報告"}
+
+
+def _post_row(post):
+    u = post.author
+    return [
+        post.created_at.strftime("%Y/%m/%d %H:%M"),
+        str(post.user_uid),
+        u.display_name if u else "Unknown",
+        post.category or "未分類",
+        post.shop_name or "",
+        post.title or "",
+        _strip_tags(post.content),
+        "削除済み" if post.is_deleted else "公開中"
+    ]
+
+
+POST_EXPORT = SheetExport(
+    spreadsheet_id=POSTS_SPREADSHEET_ID,
+    headers=["日時", "ユーザーID", "ユーザー名", "カテゴリー", "店舗", "タイトル", "内容", "ステータス"],
+    sheet_names=["投稿一覧(全体)", *POST_CATEGORY_SHEETS.values(), "その他"],
+    queryset=lambda: Post.objects.select_related('author'),
+    build_row=_post_row,
+    sheets_for=lambda post: ["投稿一覧(全体)", POST_CATEGORY_SHEETS.get(post.category, "その他")],
+)
+
+
+# --- ノウハウ投稿 ---
+TREASURE_CATEGORY_SHEETS = [
+    "Google-Pixel", "iOS-Switch", "Gemini", "Google-AI", "Design-talk", "Portfolio"
+]
+
+
+def _treasure_row(t):
+    u = t.author
+    return [
+        t.created_at.strftime("%Y/%m/%d %H:%M"),
+        t.category or "未分類",
+        u.display_name if u else "Unknown",
+        u.shop_name if u else "",
+        t.title or "",
+        t.age or "",
+        t.gender or "",
+        t.device_used or "",
+        t.anxiety_needs or "",
+        t.appeal_points or "",
+        _strip_tags(t.content),
+        "削除済み" if t.is_deleted else "公開中"
+    ]
+
+
+TREASURE_EXPORT = SheetExport(
+    spreadsheet_id=POSTS_SPREADSHEET_ID,
+    headers=["日付", "カテゴリー", "投稿者", "店舗", "タイトル", "年齢", "性別", "端末", "不安要素・ニーズ", "訴求ポイント", "トークの流れ", "ステータス"],
+    sheet_names=["知恵袋(全体)", *TREASURE_CATEGORY_SHEETS, "その他"],
+    queryset=lambda: TreasurePost.objects.select_related('author'),
+    build_row=_treasure_row,
+    sheets_for=lambda t: ["知恵袋(全体)", t.category if t.category in TREASURE_CATEGORY_SHEETS else "その他"],
+)
+
+
+def sync_export(export, full=False, service=None):
+    """
+    export をスプレッドシートに反映する。
+    状態が無い（初回）か full=True なら全件書き直し、それ以外は差分だけ書く。
+    戻り値: {"mode": "full" | "incremental", "appended": n, "patched": n}
+    """
+    service = service or get_sheets_service()
+    states = {
+        state.sheet_name: state
+        for state in SheetExportState.objects.filter(
+            spreadsheet_id=export.spreadsheet_id, sheet_name__in=export.sheet_names
+        )
+    }
+    if full or len(states) < len(export.sheet_names) or any(s.high_water_mark is None for s in states.values()):
+        return _rebuild(export, service)
+    return _apply_changes(export, service, states)
+
+
+def _rebuild(export, service):
+    """全件を古い順に書き直し、行番号を記録し直す"""
+    rows = {name: [] for name in export.sheet_names}
+    ids = {name: [] for name in export.sheet_names}
+    high_water_mark = None
+    for obj in export.queryset().order_by('created_at', 'pk').iterator(chunk_size=2000):
+        row = export.build_row(obj)
+        for name in export.sheets_for(obj):
+            rows[name].append(row)
+            ids[name].append(str(obj.pk))
+        if high_water_mark is None or obj.updated_at > high_water_mark:
+            high_water_mark = obj.updated_at
+
+    export_sheets(
+        export.spreadsheet_id,
+        {name: (export.headers, rows[name]) for name in export.sheet_names},
+        service=service,
+    )
+
+    now = timezone.now()
+    with transaction.atomic():
+        for name in export.sheet_names:
+            state, _ = SheetExportState.objects.update_or_create(
+                spreadsheet_id=export.spreadsheet_id,
+                sheet_name=name,
+                defaults={
+                    "high_water_mark": high_water_mark or now,
+                    "row_count": len(rows[name]),
+                    "rebuilt_at": now,
+                },
+            )
+            state.row_indexes.all().delete()
+            SheetRowIndex.objects.bulk_create(
+                [SheetRowIndex(state=state, object_id=pk, row_number=i + 2) for i, pk in enumerate(ids[name])],
+                batch_size=1000,
+            )
+
+    return {"mode": "full", "appended": sum(len(r) for r in rows.values()), "patched": 0}
+
+
+def _apply_changes(export, service, states):
+    """high_water_mark 以降に更新された行だけを上書き・追記する"""
+    since = min(s.high_water_mark for s in states.values()) - timedelta(seconds=SHEETS_SYNC_OVERLAP_SECONDS)
+    changed = list(export.queryset().filter(updated_at__gte=since).order_by('created_at', 'pk'))
+    if not changed:
+        return {"mode": "incremental", "appended": 0, "patched": 0}
+
+    state_by_id = {state.id: state for state in states.values()}
+    row_numbers = {
+        (state_by_id[state_id].sheet_name, object_id): row_number
+        for state_id, object_id, row_number in SheetRowIndex.objects.filter(
+            state__in=states.values(), object_id__in=[str(obj.pk) for obj in changed]
+        ).values_list('state_id', 'object_id', 'row_number')
+    }
+
+    # 上書きも追記も行番号が分かっているので、全シート分を1回の values.batchUpdate で書く
+    data = []  # values.batchUpdate 用 {"range", "values"}
+    new_indexes = []
+    appended = patched = 0
+    removed = []  # (state, object_id)
+    for obj in changed:
+        row = export.build_row(obj)
+        pk = str(obj.pk)
+        targets = set(export.sheets_for(obj))
+        for name in export.sheet_names:
+            row_number = row_numbers.get((name, pk))
+            if name in targets:
+                if row_number:
+                    data.append({"range": f"'{name}'!A{row_number}", "values": [row]})
+                    patched += 1
+                else:
+                    # 追記: ヘッダー1行 + 既存のデータ行の次
+                    state = states[name]
+                    state.row_count += 1
+                    row_number = state.row_count + 1
+                    data.append({"range": f"'{name}'!A{row_number}", "values": [row]})
+                    new_indexes.append(SheetRowIndex(state=state, object_id=pk, row_number=row_number))
+                    appended += 1
+            elif row_number:
+                # カテゴリー変更で対象外になった行は印を付けて残す（詰めるのは全件書き直し時）
+                data.append({"range": f"'{name}'!A{row_number}", "values": [row[:-1] + ["別カテゴリーへ移動"]]})
+                patched += 1
+                removed.append((states[name], pk))
+
+    # 追記する行番号は書き込みの前にコミットしておく。
+    # 書き込み後の状態の保存に失敗しても、やり直しでは同じ行を上書きするので二重に追記されない
+    if new_indexes:
+        with transaction.atomic():
+            SheetRowIndex.objects.bulk_create(new_indexes, batch_size=1000)
+            for state in {index.state_id: index.state for index in new_indexes}.values():
+                state.save(update_fields=["row_count", "updated_at"])
+
+    service.spreadsheets().values().batchUpdate(
+        spreadsheetId=export.spreadsheet_id,
+        body={"valueInputOption": "RAW", "data": data},
+    ).execute()
+
+    high_water_mark = max(obj.updated_at for obj in changed)
+    with transaction.atomic():
+        for state, pk in removed:
+            SheetRowIndex.objects.filter(state=state, object_id=pk).delete()
+        for state in states.values():
+            state.high_water_mark = max(state.high_water_mark, high_water_mark)
+            state.save(update_fields=["high_water_mark", "updated_at"])
+
+    return {"mode": "incremental", "appended": appended, "patched": patched}
+
+
+def perform_post_sync_to_gsheet(full=False):
+    return sync_export(POST_EXPORT, full=full)
+
+
+def perform_treasure_sync_to_gsheet(full=False):
+    return sync_export(TREASURE_EXPORT, full=full)
+
+
+# 同期対象の名前 → エクスポート関数
+SYNC_JOBS = {
+    "posts": perform_post_sync_to_gsheet,
+    "treasures": perform_treasure_sync_to_gsheet,
+}
+
+# このプロセスでタイマーを仕掛け済みの同期対象
+_scheduled = set()
+_scheduled_lock = threading.Lock()
+
+
+def _debounce_seconds():
+    return getattr(settings, "SHEETS_SYNC_DEBOUNCE_SECONDS", 30)
+
+
+def request_sheet_sync(name):
+    """
+    name の同期を依頼する（すぐには実行しない）。
+    同期中なら終わった後にもう1回、そうでなければデバウンス時間後に1回実行される。
+    """
+    SheetSyncJob.objects.get_or_create(name=name)
+    SheetSyncJob.objects.filter(name=name).update(
+        requested_at=timezone.now(),
+        request_count=F('request_count') + 1,
+        # 同期中の行は RUNNING のまま（終了時に requested_at を見て再実行する）
+        status=Case(When(status='RUNNING', then=Value('RUNNING')), default=Value('PENDING')),
+    )
+    transaction.on_commit(lambda: _schedule(name))
+
+
+def _schedule(name):
+    with _scheduled_lock:
+        if name in _scheduled:
+            return
+        _scheduled.add(name)
+    run_later(_debounce_seconds(), _fire, name)
+
+
+def _fire(name):
+    with _scheduled_lock:
+        _scheduled.discard(name)
+    run_sheet_sync(name)
+
+
+def run_sheet_sync(name, force=False, full=False):
+    """
+    name の同期を実行する。
+    force=False: 同期待ち (PENDING) の場合だけ実行
+    force=True:  同期中でなければ必ず実行（管理画面の手動エクスポート）
+    full=True:   差分ではなく全件を書き直す
+    戻り値: 実行したら True、別のプロセスが同期中などで実行しなかったら False
+    """
+    export = SYNC_JOBS[name]
+    now = timezone.now()
+    stale = Q(status='RUNNING', started_at__lt=now - timedelta(seconds=SHEETS_SYNC_LEASE_SECONDS))
+    claimable = ~Q(status='RUNNING') if force else Q(status__in=['PENDING', 'FAILED'])
+
+    SheetSyncJob.objects.get_or_create(name=name)
+    claimed = SheetSyncJob.objects.filter(Q(name=name) & (claimable | stale)).update(
+        status='RUNNING',
+        started_at=now,
+    )
+    if not claimed:
+        return False
+
+    try:
+        export(full=full)
+    except Exception as e:
+        logger.exception(f"Sheets sync failed: {name}")
+        SheetSyncJob.objects.filter(name=name).update(
+            status='FAILED',
+            finished_at=timezone.now(),
+            last_error=str(e)[:1000],
+        )
+        raise
+
+    # 同期中に新しい依頼が来ていたらもう1回
+    SheetSyncJob.objects.filter(name=name).update(
+        status=Case(When(requested_at__gt=now, then=Value('PENDING')), default=Value('IDLE')),
+        finished_at=timezone.now(),
+        run_count=F('run_count') + 1,
+        last_error='',
+    )
+    if SheetSyncJob.objects.filter(name=name, status='PENDING').exists():
+        _schedule(name)
+    return True
+
+
+def run_pending_sheet_syncs():
+    """同期待ち・失敗のままの同期をすべて実行する（タイマーが失われた場合の回収用）"""
+    done = []
+    for name in SYNC_JOBS:
+        try:
+            if run_sheet_sync(name):
+                done.append(name)
+        except Exception:
+            # ログと FAILED の記録は run_sheet_sync 側で済んでいる
+            continue
+    return done
+
+
+def sheet_sync_status():
+    """同期対象ごとの状態（まだ一度も依頼されていないものは IDLE）"""
+    jobs = {job.name: job for job in SheetSyncJob.objects.filter(name__in=SYNC_JOBS)}
+    result = []
+    for name in SYNC_JOBS:
+        job = jobs.get(name) or SheetSyncJob(name=name)
+        result.append({
+            "name": name,
+            "status": job.status,
+            "requested_at": job.requested_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at,
+            "run_count": job.run_count,
+            "request_count": job.request_count,
+            "last_error": job.last_error,
+        })
+    return result
@@ -0,0 +1,517 @@
+import io
+from datetime import datetime, timedelta
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from openpyxl import load_workbook
+from rest_framework.test import APIClient
+
+from missions.definitions import reset_local_index
+from missions.models import Mission, MissionEvent
+from posts.analytics import build_shop_weekly_report, user_analytics
+from posts.exports import export_response
+from posts.fake_firestore import FakeFirestoreServer, make_video_documents
+from posts.fake_sheets import FakeSheetsService
+from posts.firestore_sync import iter_firestore_pages, sync_firestore_videos, upsert_videos
+from posts.models import (
+    Choice, FirestoreSyncState, Post, Question, SheetExportState, TreasurePost, UserTestResult, Video, VideoCountDelta, VideoTest,
+    VideoViewLog, VideoWatchDaily, VideoWatchSummary,
+)
+from posts.pagination import KEYSET_ORDERING, decode_cursor, encode_cursor, keyset_paginate
+from posts.sheets_sync import POST_EXPORT, sync_export
+from posts.video_feedback import video_feedback_report
+from posts.watch_logs import _split_sessions, compact_pair, compact_view_logs, record_watch
+from posts.view_counters import add_video_counts, flush_video_counts, pending_video_counts
+from users.models import User
+
+
+@override_settings(BACKGROUND_TASKS_ASYNC=True, VIDEO_VIEW_FLUSH_SECONDS=60)
+class VideoViewCounterTests(TestCase):
+    def setUp(self):
+        Video.objects.create(id="v1", title="v1", user="u")
+        # タイマーは張らない（flush はテストから呼ぶ）
+        patcher = mock.patch("posts.view_counters.run_later")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_counts_are_kept_in_the_database_until_flushed(self):
+        add_video_counts("v1", views=1)
+        add_video_counts("v1", views=1, watch_time=30)
+
+        self.assertEqual(Video.objects.get(id="v1").views, 0)
+        # 別のプロセスが落ちても増分は残っていて、どのプロセスからも見える
+        self.assertEqual(pending_video_counts("v1"), (2, 30))
+
+        self.assertEqual(flush_video_counts(), 1)
+        video = Video.objects.get(id="v1")
+        self.assertEqual((video.views, video.watch_time), (2, 30))
+        self.assertEqual(pending_video_counts("v1"), (0, 0))
+        self.assertEqual(flush_video_counts(), 0)
+
+    def test_failed_flush_keeps_the_deltas(self):
+        add_video_counts("v1", views=3)
+        with mock.patch("posts.view_counters.Video.objects.filter", side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                flush_video_counts()
+
+        self.assertEqual(VideoCountDelta.objects.count(), 1)
+        flush_video_counts()
+        self.assertEqual(Video.objects.get(id="v1").views, 3)
+
+    def test_unknown_video_is_created(self):
+        add_video_counts("firestore-only", views=1)
+        flush_video_counts(batch_size=1)
+        self.assertEqual(Video.objects.get(id="firestore-only").views, 1)
+
+
+class SheetExportTests(TestCase):
+    def setUp(self):
+        self.service = FakeSheetsService()
+
+    def _post(self, title, category="雑談"):
+        return Post.objects.create(user_name="alice", title=title, content="c", category=category)
+
+    def _titles(self, sheet):
+        return [row[5] for row in self.service.rows(POST_EXPORT.spreadsheet_id, sheet)[1:]]
+
+    def test_incremental_export_patches_and_appends(self):
+        first = self._post("first")
+        self.assertEqual(sync_export(POST_EXPORT, service=self.service)["mode"], "full")
+
+        first.title = "first (edited)"
+        first.save()
+        self._post("second")
+        result = sync_export(POST_EXPORT, service=self.service)
+
+        self.assertEqual(result["mode"], "incremental")
+        self.assertEqual(self._titles("投稿一覧(全体)"), ["first (edited)", "second"])
+        self.assertEqual(self._titles("雑談"), ["first (edited)", "second"])
+        self.assertEqual(self._titles("個人報告"), [])
+
+    def test_retry_after_failed_commit_does_not_append_twice(self):
+        self._post("first")
+        sync_export(POST_EXPORT, service=self.service)
+        self._post("second")
+
+        # シートへの書き込みは成功したが、その後の状態の保存に失敗した
+        real_save = SheetExportState.save
+
+        def fail_on_high_water_mark(state, *args, **kwargs):
+            if "high_water_mark" in kwargs.get("update_fields", ()):
+                raise RuntimeError("boom")
+            return real_save(state, *args, **kwargs)
+
+        with mock.patch.object(SheetExportState, "save", fail_on_high_water_mark):
+            with self.assertRaises(RuntimeError):
+                sync_export(POST_EXPORT, service=self.service)
+        self.assertEqual(self._titles("投稿一覧(全体)"), ["first", "second"])
+
+        result = sync_export(POST_EXPORT, service=self.service)
+        self.assertEqual(result["appended"], 0)
+        self.assertEqual(self._titles("投稿一覧(全体)"), ["first", "second"])
+        self.assertEqual(self._titles("雑談"), ["first", "second"])
+
+
+class ExportResponseTests(SimpleTestCase):
+    headers = ["日時", "タイトル"]
+
+    def _export(self, rows, file_type):
+        request = RequestFactory().get("/", {"file_type": file_type})
+        return export_response(
+            request, "posts", self.headers, iter(rows), sheet_title="投稿一覧", count=lambda: len(rows),
+        )
+
+    def test_xlsx_is_a_readable_workbook(self):
+        rows = [["2026/10/18 10:00", f"post {i}"] for i in range(3)]
+        response = self._export(rows, "xlsx")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(".xlsx", response["Content-Disposition"])
+        workbook = load_workbook(io.BytesIO(b"".join(response.streaming_content)))
+        sheet = workbook["投稿一覧"]
+        self.assertEqual([list(r) for r in sheet.iter_rows(values_only=True)], [self.headers, *rows])
+
+    @override_settings(EXPORT_XLSX_MAX_ROWS=2)
+    def test_xlsx_over_the_row_limit_is_refused(self):
+        # 件数で断るので、ブックは作らない
+        with mock.patch("openpyxl.Workbook") as workbook:
+            response = self._export([["a", "b"]] * 3, "xlsx")
+        self.assertEqual(response.status_code, 400)
+        workbook.assert_not_called()
+
+        self.assertEqual(self._export([["a", "b"]] * 2, "xlsx").status_code, 200)
+
+    def test_csv_is_streamed_with_bom(self):
+        response = self._export([["2026/10/18 10:00", "post"]], "csv")
+        body = b"".join(response.streaming_content).decode("utf-8")
+        self.assertEqual(body, "\ufeff日時,タイトル\r\n2026/10/18 10:00,post\r\n")
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        for i in range(7):
+            Post.objects.create(user_name="alice", title=f"post {i}", content="c")
+        # 同じ created_at の行が続いても、id で順序が決まって取りこぼさない
+        same_time = timezone.now().replace(microsecond=123456)
+        Post.objects.filter(title__in=["post 2", "post 3", "post 4"]).update(created_at=same_time)
+
+    def test_cursor_round_trips(self):
+        post = Post.objects.first()
+        self.assertEqual(decode_cursor(encode_cursor(post)), (post.created_at, str(post.pk)))
+
+    def test_pages_cover_every_row_once_in_order(self):
+        seen = []
+        cursor = None
+        while True:
+            items, cursor = keyset_paginate(Post.objects.all(), cursor, 3)
+            seen.extend(post.pk for post in items)
+            if cursor is None:
+                break
+        self.assertEqual(seen, list(Post.objects.order_by(*KEYSET_ORDERING).values_list("pk", flat=True)))
+
+    def test_invalid_cursor_is_rejected(self):
+        for cursor in ("not-a-cursor", encode_cursor(Post.objects.first())[:-4]):
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+
+class VideoFeedbackReportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        video = Video.objects.create(id="v1", title="v1", user="u")
+        self.question = Question.objects.create(test=VideoTest.objects.create(video=video), text="q1")
+        self.correct = Choice.objects.create(question=self.question, text="a", is_correct=True)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(user_id="alice", display_name="alice"))
+
+    def _submit(self):
+        response = self.client.post(
+            "/api/videos/v1/test/submit/", {"answers": {str(self.question.id): self.correct.id}}, format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_submit_invalidates_the_cached_report(self):
+        self._submit()
+        self.assertEqual(video_feedback_report()[0]["total_tests"], 1)
+
+        # 他のインスタンスのキャッシュは消せないので、キャッシュを消さずにバージョンで新しいキーに移る
+        with mock.patch.object(cache, "delete", side_effect=AssertionError("cache.delete is per process")):
+            self._submit()
+        report = video_feedback_report()[0]
+        self.assertEqual(report["total_tests"], 2)
+        self.assertEqual(report["logs"][0]["test_details"][0]["user_choice"], "a")
+
+    def test_cached_report_only_reads_videos_and_versions(self):
+        self._submit()
+        video_feedback_report()
+        with self.assertNumQueries(2):
+            self.assertEqual(len(video_feedback_report()), 1)
+
+
+@override_settings(MISSION_EVENTS_DRAIN_ON_COMMIT=False, BACKGROUND_TASKS_ASYNC=True, VIDEO_VIEW_FLUSH_SECONDS=60)
+class WatchMissionEventTests(TestCase):
+    def setUp(self):
+        reset_local_index()
+        self.addCleanup(reset_local_index)
+        patcher = mock.patch("posts.view_counters.run_later")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        Video.objects.create(id="v1", title="v1", user="u")
+        Mission.objects.create(title="watch", mission_type="daily", team="shop", action_type="video_watch")
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(user_id="alice", team="shop"))
+
+    def _heartbeat(self, watch_time, session_id=None):
+        data = {"video_id": "v1", "watch_time": watch_time}
+        if session_id:
+            data["session_id"] = session_id
+        response = self.client.post("/api/videos/save_log/", data, format="json")
+        self.assertEqual(response.status_code, 200)
+        return response.data["session_id"]
+
+    def test_video_watch_event_is_recorded_once_per_session(self):
+        session_id = self._heartbeat(0)
+        for _ in range(3):
+            self._heartbeat(10, session_id)
+        self.assertEqual(MissionEvent.objects.filter(action_type="video_watch").count(), 1)
+
+        # 再生し直すと新しいセッション
+        self._heartbeat(0)
+        self.assertEqual(MissionEvent.objects.filter(action_type="video_watch").count(), 2)
+
+
+@override_settings(VIEW_LOG_SESSION_GAP_SECONDS=300)
+class WatchLogTests(TestCase):
+    def setUp(self):
+        self.video = Video.objects.create(id="v1", title="v1", user="u")
+        self.alice = User.objects.create(user_id="alice")
+
+    def _totals(self, model):
+        row = model.objects.get(user=self.alice, video=self.video)
+        return row.watch_time, row.view_count
+
+    def test_heartbeats_are_added_to_one_session(self):
+        session_id, total, started = record_watch(self.alice, self.video, 0)
+        self.assertTrue(started)
+        for _ in range(3):
+            # session_id を送らないクライアントも、間隔以内なら同じセッションに足す
+            reused, _, started = record_watch(self.alice, self.video, 10)
+            self.assertEqual((reused, started), (session_id, False))
+        self.assertEqual(record_watch(self.alice, self.video, 10, session_id=session_id)[1], 40)
+
+        self.assertEqual(VideoViewLog.objects.count(), 1)
+        self.assertEqual(self._totals(VideoWatchDaily), (40, 1))
+        self.assertEqual(self._totals(VideoWatchSummary), (40, 1))
+
+    def test_restart_or_gap_starts_a_new_session(self):
+        first, _, _ = record_watch(self.alice, self.video, 10)
+        # 再生し直し (watch_time == 0) は新しいセッション
+        second, _, started = record_watch(self.alice, self.video, 0)
+        self.assertTrue(started)
+        self.assertNotEqual(first, second)
+
+        # 間隔より前に更新されたセッションには足さない
+        VideoViewLog.objects.update(last_watched_at=timezone.now() - timedelta(seconds=301))
+        third, total, started = record_watch(self.alice, self.video, 10)
+        self.assertTrue(started)
+        self.assertNotIn(third, (first, second))
+        self.assertEqual(total, 10)
+        self.assertEqual(self._totals(VideoWatchSummary), (20, 3))
+
+    def test_anonymous_views_are_logged_without_rollups(self):
+        session_id, _, _ = record_watch(AnonymousUser(), self.video, 0)
+        record_watch(AnonymousUser(), self.video, 10, session_id=session_id)
+
+        log = VideoViewLog.objects.get()
+        self.assertIsNone(log.user_id)
+        self.assertEqual(log.watch_time, 10)
+        self.assertFalse(VideoWatchDaily.objects.exists())
+        self.assertFalse(VideoWatchSummary.objects.exists())
+
+    def test_split_sessions(self):
+        now = timezone.now()
+        gap = timedelta(seconds=300)
+        rows = [
+            (1, 0, now), (2, 10, now + timedelta(seconds=10)),
+            (3, 10, now + timedelta(seconds=400)),  # 間隔が空いた
+            (4, 0, now + timedelta(seconds=410)),  # 再生し直し
+            (5, 10, now + timedelta(seconds=420)),
+        ]
+        self.assertEqual([[r[0] for r in session] for session in _split_sessions(rows, gap)], [[1, 2], [3], [4, 5]])
+
+    def test_compaction_merges_legacy_rows_once_without_touching_rollups(self):
+        now = timezone.now()
+        for offset, watch_time in ((0, 0), (10, 10), (20, 10), (1000, 10)):
+            log = VideoViewLog.objects.create(user=self.alice, video=self.video, watch_time=watch_time)
+            VideoViewLog.objects.filter(id=log.id).update(last_watched_at=now + timedelta(seconds=offset))
+
+        self.assertEqual(compact_pair(self.alice.id, self.video.id), (4, 2))
+        sessions = list(VideoViewLog.objects.order_by("last_watched_at").values_list("watch_time", flat=True))
+        self.assertEqual(sessions, [20, 10])
+        self.assertFalse(VideoViewLog.objects.filter(session_id="").exists())
+
+        # もう一度まとめても変わらない。集計はマイグレーション 0038 で反映済みなので足さない
+        self.assertEqual(compact_view_logs(), {"pairs": 0, "rows_before": 0, "rows_after": 0})
+        self.assertEqual(VideoViewLog.objects.count(), 2)
+        self.assertFalse(VideoWatchSummary.objects.exists())
+
+
+class WatchRollupMigrationTests(TransactionTestCase):
+    """0038: 集計テーブルができる前の視聴ログを、既存の日別・累計の行に足す"""
+    migrate_from = [("posts", "0037_backfill_author_foreign_keys")]
+    migrate_to = [("posts", "0039_view_log_anonymous_session_unique")]
+
+    def _migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_legacy_rows_are_added_to_existing_rollups(self):
+        apps = self._migrate(self.migrate_from)
+        VideoViewLog = apps.get_model("posts", "VideoViewLog")
+        Daily = apps.get_model("posts", "VideoWatchDaily")
+        Summary = apps.get_model("posts", "VideoWatchSummary")
+        video = apps.get_model("posts", "Video").objects.create(id="v1", title="v1", user="u")
+        # users のマイグレーションは最新のままなので、ユーザーは今のモデルで作る
+        user_id = User.objects.create(user_id="alice").id
+
+        day = timezone.make_aware(timezone.datetime(2026, 10, 14, 12, 0))
+        # 古いハートビート行: 2セッション（10分空いている）で合計 30 秒
+        for offset, watch_time in ((0, 0), (10, 10), (20, 10), (620, 10)):
+            log = VideoViewLog.objects.create(user_id=user_id, video=video, watch_time=watch_time)
+            VideoViewLog.objects.filter(id=log.id).update(last_watched_at=day + timedelta(seconds=offset))
+        # 集計テーブルができた後の視聴は既に入っている
+        Daily.objects.create(user_id=user_id, video=video, date=day.date(), watch_time=100, view_count=1, last_watched_at=day)
+        Summary.objects.create(user_id=user_id, video=video, watch_time=100, view_count=1, last_watched_at=day)
+        # 同じセッションの匿名の行が重複している
+        for watch_time in (10, 20):
+            VideoViewLog.objects.create(user=None, video=video, session_id="anon", watch_time=watch_time)
+
+        apps = self._migrate(self.migrate_to)
+        Daily = apps.get_model("posts", "VideoWatchDaily")
+        Summary = apps.get_model("posts", "VideoWatchSummary")
+        VideoViewLog = apps.get_model("posts", "VideoViewLog")
+
+        summary = Summary.objects.get()
+        self.assertEqual((summary.watch_time, summary.view_count), (130, 3))
+        daily = Daily.objects.get()
+        self.assertEqual((daily.watch_time, daily.view_count), (130, 3))
+        self.assertEqual(list(VideoViewLog.objects.filter(user=None).values_list("watch_time", flat=True)), [30])
+
+
+class UserAnalyticsTests(TestCase):
+    def setUp(self):
+        self.video = Video.objects.create(id="v1", title="v1", user="u")
+        self.old_day = timezone.make_aware(timezone.datetime(2026, 9, 1, 12, 0))
+        self.new_day = timezone.make_aware(timezone.datetime(2026, 10, 14, 12, 0))
+        for i in range(5):
+            user = User.objects.create(user_id=f"user{i}", display_name=f"user{i}")
+            for day in (self.old_day, self.new_day):
+                self._activity(user, day)
+
+    def _activity(self, user, day):
+        post = Post.objects.create(user_name=user.display_name, user_uid=user.user_id, content="c")
+        know_how = TreasurePost.objects.create(user_uid=user.user_id, content="c")
+        test = UserTestResult.objects.create(user=user, video_id="v1", score=1, max_score=1, is_passed=True)
+        for model, obj in ((Post, post), (TreasurePost, know_how), (UserTestResult, test)):
+            model.objects.filter(pk=obj.pk).update(created_at=day)
+        VideoWatchDaily.objects.create(user=user, video=self.video, date=timezone.localdate(day), watch_time=30, view_count=1)
+        summary, _ = VideoWatchSummary.objects.get_or_create(user=user, video=self.video)
+        VideoWatchSummary.objects.filter(pk=summary.pk).update(watch_time=summary.watch_time + 30, view_count=summary.view_count + 1)
+
+    def _row(self, data, user_id):
+        return next(row for row in data if row["user_id"] == user_id)
+
+    def test_query_count_does_not_grow_with_users(self):
+        with self.assertNumQueries(5):
+            data = user_analytics()
+        self.assertEqual(len(data), 5)
+        row = self._row(data, "user0")
+        self.assertEqual(
+            (row["post_count"], row["know_how_count"], row["tests_taken"], row["tests_passed"], row["video_views"], row["watch_time"]),
+            (2, 2, 2, 2, 2, 60),
+        )
+
+    def test_date_range_limits_the_totals(self):
+        start = end = timezone.localdate(self.new_day)
+        with self.assertNumQueries(5):
+            row = self._row(user_analytics(start, end), "user3")
+        self.assertEqual(
+            (row["post_count"], row["know_how_count"], row["tests_taken"], row["video_views"], row["watch_time"]),
+            (1, 1, 1, 1, 30),
+        )
+
+
+class ShopWeeklyReportTests(TestCase):
+    weeks = 3
+
+    def setUp(self):
+        self.shibuya = User.objects.create(user_id="s1", display_name="s1", shop_name="shibuya")
+        self.shinjuku = User.objects.create(user_id="j1", display_name="j1", shop_name="shinjuku")
+        today = timezone.localdate()
+        monday = today - timedelta(days=today.weekday())
+        oldest = monday - timedelta(weeks=self.weeks - 1)
+
+        def at(day, t):
+            return timezone.make_aware(datetime.combine(day, t))
+
+        # 週の境目（月曜 0:00 ちょうど・日曜 23:59:59.999999）と、期間の外
+        moments = [
+            at(monday, datetime.min.time()),
+            at(monday - timedelta(days=1), datetime.max.time()),
+            at(oldest, datetime.min.time()),
+            at(oldest - timedelta(days=1), datetime.max.time()),
+            timezone.now(),
+        ]
+        for i, moment in enumerate(moments):
+            for user in (self.shibuya, self.shinjuku):
+                post = Post.objects.create(
+                    author=user, user_uid=user.user_id, user_name=user.display_name, content="c", category="個人報告",
+                )
+                know_how = TreasurePost.objects.create(author=user, user_uid=user.user_id, title=f"t{i}")
+                Post.objects.filter(pk=post.pk).update(created_at=moment)
+                TreasurePost.objects.filter(pk=know_how.pk).update(created_at=moment)
+
+    def _per_week_ranges(self, shop, start_date, end_date):
+        """以前の実装: 店舗×週ごとに created_at__range で読む"""
+        start_dt = timezone.make_aware(datetime.combine(start_date, datetime.min.time()))
+        end_dt = timezone.make_aware(datetime.combine(end_date, datetime.max.time()))
+        posts = Post.objects.filter(author__shop_name=shop, category='個人報告', created_at__range=(start_dt, end_dt))
+        know_hows = TreasurePost.objects.filter(author__shop_name=shop, created_at__range=(start_dt, end_dt))
+        return sorted(str(p.id) for p in posts), sorted(str(k.id) for k in know_hows)
+
+    def test_buckets_match_per_week_range_queries(self):
+        with self.assertNumQueries(3):
+            report = build_shop_weekly_report(self.weeks)
+
+        self.assertEqual([shop["shop_name"] for shop in report], ["shibuya", "shinjuku"])
+        bucketed = 0
+        for shop in report:
+            self.assertEqual(len(shop["weeks"]), self.weeks)
+            for week in shop["weeks"]:
+                posts = sorted(r["id"] for r in week["personal_reports"])
+                know_hows = sorted(k["id"] for k in week["know_hows"])
+                self.assertEqual(
+                    (posts, know_hows),
+                    self._per_week_ranges(shop["shop_name"], week["start_date"], week["end_date"]),
+                )
+                self.assertEqual(week["know_how_submitted"], bool(know_hows))
+                bucketed += len(posts)
+        # 期間の外（最も古い週の前日）の1件を除いた4件ずつ
+        self.assertEqual(bucketed, 8)
+
+
+class FirestoreSyncTests(TransactionTestCase):
+    def setUp(self):
+        self.server = FakeFirestoreServer(make_video_documents(45)).start()
+        self.addCleanup(self.server.stop)
+
+    def test_pages_are_followed_and_existing_rows_are_upserted(self):
+        # 管理画面で編集したタイトルは残し、Firestore 側が正の項目は更新する
+        Video.objects.create(id="fake00001", title="編集済み", user="", duration="")
+
+        pages = list(iter_firestore_pages(self.server.base_url, page_size=20))
+        self.assertEqual([len(docs) for docs, _ in pages], [20, 20, 5])
+        self.assertEqual([token for _, token in pages], ["20", "40", None])
+        self.assertEqual(self.server.requests, 3)
+
+        self.assertEqual(sum(upsert_videos(docs) for docs, _ in pages), 44)
+        self.assertEqual(upsert_videos(pages[0][0]), 0)
+        self.assertEqual(Video.objects.count(), 45)
+        video = Video.objects.get(id="fake00001")
+        self.assertEqual((video.title, video.user, video.duration), ("編集済み", "事務局", "3:00"))
+
+    def test_failed_sync_resumes_from_the_first_page_not_written(self):
+        def fail_on_second_page(documents):
+            if documents[0]["name"].endswith("/fake00020"):
+                raise RuntimeError("boom")
+            return upsert_videos(documents)
+
+        with mock.patch("posts.firestore_sync.upsert_videos", side_effect=fail_on_second_page):
+            with self.assertRaises(RuntimeError), self.assertLogs("posts.firestore_sync", "ERROR"):
+                sync_firestore_videos(base_url=self.server.base_url, page_size=20, workers=1)
+
+        state = FirestoreSyncState.objects.get()
+        self.assertEqual(state.resume_page_token, "20")
+        self.assertIsNone(state.last_synced_at)
+
+        self.server.requests = 0
+        result = sync_firestore_videos(base_url=self.server.base_url, page_size=20, workers=1)
+        # 1ページ目は読み直さない
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(result["documents"], 25)
+        self.assertEqual(Video.objects.count(), 45)
+        state.refresh_from_db()
+        self.assertEqual(state.resume_page_token, "")
+        self.assertIsNotNone(state.last_synced_at)
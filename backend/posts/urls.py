@@ -16,6 +16,7 @@ urlpatterns = [
     path("comments/<int:pk>/like/", views.toggle_comment_like, name="toggle_comment_like"),
     path("hashtags/search/", views.search_hashtags, name="search_hashtags"),
     path("videos/view_logs/", views.video_view_logs),
+    path("videos/view_logs/export/", views.video_view_logs_export),
     path("videos/save_log/", save_view_log, name="save_view_log"),
      path("videos/add_view/", views.add_video_view),
      path("videos/record_view/", views.record_video_view, name="record_video_view"),
@@ -48,14 +49,18 @@ urlpatterns = [
     path("office_news/", views.office_news_list_create),
     path("office_news/<uuid:pk>/", views.office_news_detail),
     path("admin/posts/list/", views.admin_post_list),
+    path("admin/posts/list/export/", views.admin_post_list_export),
     path("admin/treasure_posts/list/", views.admin_treasure_post_list),
+    path("admin/treasure_posts/list/export/", views.admin_treasure_post_list_export),
     path("task_buttons/", views.task_button_list_create),
     path("task_buttons/<uuid:pk>/", views.task_button_detail),
     path("admin/videos/list/", views.admin_video_list),
     path("admin/videos/feedback/", views.admin_video_feedback),
     path("log/interaction/", views.log_interaction),
     path("admin/interaction-logs/", views.admin_interaction_logs),
+    path("admin/interaction-logs/export/", views.admin_interaction_logs_export),
     path("admin/posts/export_gsheet/", views.export_posts_to_gsheet),
     path("admin/treasure_posts/export_gsheet/", views.export_treasures_to_gsheet),
+    path("admin/gsheet_sync/status/", views.gsheet_sync_status),
     path("admin/analytics/sync_all/", views.scheduled_analytics_sync),
 ]
\ No newline at end of file
@@ -0,0 +1,250 @@
+"""
+動画一覧 (video_list) 用のカタログのキャッシュ。
+
+Firestore (pixtubePosts) と Django の Video をマージした一覧を「スナップショット」として
+プロセス内メモリと Django のキャッシュに持ち、リクエストは常にそこから返す。
+manage.py sync_firestore_videos で Firestore を Video に取り込み済みなら、Firestore は読まない。
+
+- VIDEO_CATALOG_TTL_SECONDS を過ぎたスナップショットは古いまま返しつつ、
+  バックグラウンドで作り直す (stale-while-revalidate)。作り直しは全プロセスで同時に1つだけ
+- Firestore が落ちている・遅いときは前回のスナップショットを返し続ける
+- 管理画面で動画を変更したら invalidate_video_catalog() で作り直しを依頼する
+- スナップショットには内容のハッシュ (version) が付き、クライアントに返す
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+
+from pixelshop_backend.background import run_in_background
+from .models import Video, FirestoreSyncState
+
+logger = logging.getLogger(__name__)
+
+FIREBASE_PROJECT_ID = "pixelshopsns"
+FIRESTORE_COLLECTION = "pixtubePosts"
+FIRESTORE_VIDEOS_URL = f"https://firestore.googleapis.com/v1/projects/{FIREBASE_PROJECT_ID}/databases/(default)/documents/{FIRESTORE_COLLECTION}"
+FIRESTORE_TIMEOUT_SECONDS = 5
+
+CATALOG_CACHE_KEY = "video_catalog:snapshot"
+REFRESH_LOCK_KEY = "video_catalog:refreshing"
+REFRESH_LOCK_SECONDS = 60
+
+# カテゴリの正規化マップ
+CATEGORY_MAP = {
+    "Pixel 基礎知識": ("Pixel 知識", "基礎知識"),
+    "Pixel 応用知識": ("Pixel 知識", "応用知識"),
+    "接客初級編": ("接客 知識", "初級編"),
+    "接客中級編": ("接客 知識", "中級編"),
+    "接客上級編": ("接客 知識", "上級編"),
+    "ポートフォリオ基礎知識": ("ポートフォリオ", "基礎知識"),
+    "ポーチフォリオ応用知識": ("ポートフォリオ", "応用知識"),
+    "コミュニケーション初級技術": ("コミュニケーション技術", "初級編"),
+    "コミュニケーション中級技術": ("コミュニケーション技術", "中級編"),
+    "コミュニケーション上級技術": ("コミュニケーション技術", "上級編"),
+}
+
+# このプロセスが持っている最新のスナップショット
+_memory = {"snapshot": None}
+_memory_lock = threading.Lock()
+
+
+def _ttl():
+    return getattr(settings, "VIDEO_CATALOG_TTL_SECONDS", 60)
+
+
+def _is_fresh(snapshot):
+    return time.time() - snapshot["built_at"] < _ttl()
+
+
+def fetch_firestore_videos():
+    """
+    Firestore から動画を取得する。
+    取得できなかった場合は None（空の一覧 [] とは区別する）
+    """
+    try:
+        resp = requests.get(FIRESTORE_VIDEOS_URL, timeout=FIRESTORE_TIMEOUT_SECONDS)
+    except requests.RequestException as e:
+        logger.warning(f"Firestore fetch error: {e}")
+        return None
+    if resp.status_code != 200:
+        logger.warning(f"Firestore fetch error: HTTP {resp.status_code}")
+        return None
+
+    return [parse_video_document(doc) for doc in resp.json().get("documents", [])]
+
+
+def parse_video_document(doc):
+    """Firestore REST の document (pixtubePosts) を一覧用の dict にする"""
+    fields = doc.get("fields", {})
+    vid = doc.get("name", "").split("/")[-1]
+
+    def get_str(f): return fields.get(f, {}).get("stringValue", "")
+    def get_int(f):
+        try: return int(fields.get(f, {}).get("integerValue", "0"))
+        except: return 0
+
+    return {
+        "id": vid,
+        "title": get_str("title"),
+        "user": get_str("author") or "事務局",
+        "views": get_int("views"),
+        "duration": get_str("duration") or "0:00",
+        "thumb": get_str("thumbnail"),
+        "video_url": get_str("src"),
+        "userAvatar": get_str("userAvatar"),
+        "created_at": get_str("createdAt"),
+        "is_featured": False,
+        "is_short": False,
+        "category": get_str("category") or "未分類",
+        "parent_category": get_str("parent_category") or ""
+    }
+
+
+def merge_catalog(firestore_videos, django_videos):
+    """
+    Firestore にあるものはベースにし、Django にデータがあれば上書き。
+    Django にしかないもの（アップロード直後など）も追加し、作成日時の降順で返す。
+    """
+    django_map = {v.id: v for v in django_videos}
+    final_videos_map = {}
+
+    for fv in firestore_videos:
+        fv = dict(fv)
+        vid = fv["id"]
+        if vid in django_map:
+            dv = django_map[vid]
+            fv.update({
+                "title": dv.title or fv["title"],
+                "user": dv.user or fv["user"],
+                "views": dv.views,
+                "thumb": dv.thumb or fv["thumb"],
+                "video_url": dv.video_url or fv["video_url"],
+                "is_featured": dv.is_featured,
+                "is_short": dv.is_short,
+                "category": dv.category,
+                "parent_category": dv.parent_category,
+                "order": dv.order,
+                "created_at": dv.created_at.isoformat() if dv.created_at else fv["created_at"]
+            })
+        final_videos_map[vid] = fv
+
+    for vid, dv in django_map.items():
+        if vid not in final_videos_map:
+            final_videos_map[vid] = {
+                "id": dv.id,
+                "title": dv.title,
+                "user": dv.user,
+                "views": dv.views,
+                "duration": dv.duration,
+                "thumb": dv.thumb,
+                "video_url": dv.video_url,
+                "userAvatar": dv.userAvatar,
+                "created_at": dv.created_at.isoformat() if dv.created_at else None,
+                "is_featured": dv.is_featured,
+                "is_short": dv.is_short,
+                "category": dv.category,
+                "parent_category": dv.parent_category,
+                "order": dv.order
+            }
+
+    results = []
+    for vdata in final_videos_map.values():
+        # カテゴリの正規化 (互換性のため)
+        cat = vdata.get("category", "未分類")
+        pcat = vdata.get("parent_category", "")
+        if cat in CATEGORY_MAP and not pcat:
+            vdata["parent_category"], vdata["category"] = CATEGORY_MAP[cat]
+        results.append(vdata)
+
+    # ソート (降順)
+    results.sort(key=lambda x: x.get("created_at") or "", reverse=True)
+    return results
+
+
+def build_snapshot(previous=None):
+    """
+    カタログを作り直す。
+    manage.py sync_firestore_videos で取り込み済みなら DB だけで作る。
+    未取り込みなら Firestore も読み、取れなければ前回の Firestore 分を使い回す。
+    """
+    if FirestoreSyncState.objects.filter(collection=FIRESTORE_COLLECTION, last_synced_at__isnull=False).exists():
+        firestore_videos = []
+    else:
+        firestore_videos = fetch_firestore_videos()
+        if firestore_videos is None:
+            firestore_videos = previous["firestore"] if previous else []
+
+    videos = merge_catalog(firestore_videos, Video.objects.all())
+    payload = json.dumps(videos, sort_keys=True, ensure_ascii=False, default=str)
+    return {
+        "version": hashlib.sha1(payload.encode()).hexdigest()[:16],
+        "built_at": time.time(),
+        "videos": videos,
+        "firestore": firestore_videos,
+    }
+
+
+def _store(snapshot):
+    with _memory_lock:
+        current = _memory["snapshot"]
+        if current is None or snapshot["built_at"] >= current["built_at"]:
+            _memory["snapshot"] = snapshot
+    # 古くなっても返せるよう、キャッシュの有効期限は TTL より長めにとる
+    cache.set(CATALOG_CACHE_KEY, snapshot, timeout=getattr(settings, "VIDEO_CATALOG_MAX_STALE_SECONDS", 24 * 60 * 60))
+
+
+def refresh_video_catalog():
+    """スナップショットを作り直して保存する"""
+    try:
+        previous = _memory["snapshot"] or cache.get(CATALOG_CACHE_KEY)
+        snapshot = build_snapshot(previous)
+        _store(snapshot)
+        return snapshot
+    finally:
+        cache.delete(REFRESH_LOCK_KEY)
+
+
+def _schedule_refresh():
+    # cache.add はキーが無いときだけ成功するので、作り直しは同時に1つだけ
+    if cache.add(REFRESH_LOCK_KEY, True, timeout=REFRESH_LOCK_SECONDS):
+        run_in_background(refresh_video_catalog)
+
+
+def get_video_catalog():
+    """
+    現在のスナップショット {"version", "built_at", "videos", ...} を返す。
+    古ければバックグラウンドで作り直しを依頼する（レスポンスは待たない）。
+    """
+    snapshot = _memory["snapshot"]
+    if snapshot is not None and _is_fresh(snapshot):
+        return snapshot
+
+    # 他のプロセスが作り直したものがあればそちらを使う
+    shared = cache.get(CATALOG_CACHE_KEY)
+    if shared is not None and (snapshot is None or shared["built_at"] > snapshot["built_at"]):
+        with _memory_lock:
+            _memory["snapshot"] = shared
+        snapshot = shared
+
+    if snapshot is None:
+        # 起動直後でどこにも無いときだけ、その場で作る
+        return refresh_video_catalog()
+
+    if not _is_fresh(snapshot):
+        _schedule_refresh()
+    return snapshot
+
+
+def invalidate_video_catalog():
+    """動画の追加・変更・削除後に呼ぶ。コミット後にカタログを作り直す"""
+    with _memory_lock:
+        if _memory["snapshot"] is not None:
+            _memory["snapshot"] = dict(_memory["snapshot"], built_at=0)
+    cache.delete(REFRESH_LOCK_KEY)
+    run_in_background(refresh_video_catalog)
@@ -0,0 +1,282 @@
+"""
+動画ごとのテスト結果・アンケート結果のレポート (admin_video_feedback / scheduled_analytics_sync)。
+
+テスト結果・解答・アンケート回答・ユーザーを select_related / prefetch_related で
+まとめて読み、メモリ上で動画ごと・ユーザーごとに振り分ける。
+動画や回答の件数に関係なく、クエリの回数は一定。
+
+動画ごとの集計はキャッシュする。キャッシュのキーには動画ごとのバージョン (VideoFeedbackVersion) を含め、
+テスト・アンケートが提出されたら invalidate_video_feedback(video_id) で同じトランザクションのうちに上げる。
+キャッシュはプロセスごと (LocMem) なので消して回ることはできないが、
+どのインスタンスも次のレポートで DB からバージョンを読むので、古いキーの集計は使われない
+（古いキーは VIDEO_FEEDBACK_CACHE_SECONDS で消える）。
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Prefetch
+from django.utils import timezone
+
+from users.models import User
+from .models import Video, VideoFeedbackVersion, UserTestResult, UserTestAnswer, SurveyResponse, SurveyAnswer
+
+CACHE_KEY = "video_feedback:{}:v{}"
+# テスト・アンケートが1件もない動画もキャッシュしておくための印
+_EMPTY = "empty"
+
+
+def _cache_timeout():
+    return getattr(settings, "VIDEO_FEEDBACK_CACHE_SECONDS", 60 * 60)
+
+
+def satisfaction_value(answer_text):
+    """満足度の回答 → 4 (とても満足) 〜 1 (不満)。該当しなければ 0"""
+    if not answer_text:
+        return 0
+    if "とても満足" in answer_text: return 4
+    if "満足" in answer_text: return 3
+    if "普通" in answer_text: return 2
+    if "不満" in answer_text: return 1
+    return 0
+
+
+def _answer_pair(ans):
+    q_text = ans.question.text if ans.question else "項目"
+    a_text = (ans.choice.text if ans.choice else ans.answer_text) or ""
+    return q_text, a_text
+
+
+def _survey_answers_prefetch():
+    return Prefetch(
+        'surveyanswer_set',
+        queryset=SurveyAnswer.objects.select_related('question', 'choice').order_by('id'),
+    )
+
+
+def build_video_feedback(video_ids):
+    """
+    video_ids の動画ごとの集計 {video_id: dict | None}（テストもアンケートもなければ None）。
+    クエリ回数は動画数によらず最大6回。
+    """
+    video_ids = list(video_ids)
+    videos = {v.id: v for v in Video.objects.filter(id__in=video_ids)}
+
+    results_by_video = {}
+    results = (
+        UserTestResult.objects
+        .filter(video_id__in=video_ids)
+        .select_related('user')
+        .prefetch_related(Prefetch(
+            'answers',
+            queryset=UserTestAnswer.objects.select_related('question', 'choice').order_by('id'),
+        ))
+        .order_by('created_at', 'id')
+    )
+    for tr in results:
+        results_by_video.setdefault(tr.video_id, []).append(tr)
+
+    responses_by_video = {}
+    responses = (
+        SurveyResponse.objects
+        .filter(test__video_id__in=video_ids)
+        .select_related('test')
+        .prefetch_related(_survey_answers_prefetch())
+        .order_by('id')
+    )
+    for resp in responses:
+        responses_by_video.setdefault(resp.test.video_id, []).append(resp)
+
+    # テストを受けていないアンケート回答者の名前は user_id (文字列) からまとめて引く
+    tested_uids = {tr.user.user_id for rs in results_by_video.values() for tr in rs}
+    survey_uids = {r.user_id for rs in responses_by_video.values() for r in rs if r.user_id}
+    users_by_uid = {u.user_id: u for u in User.objects.filter(user_id__in=survey_uids - tested_uids)}
+
+    return {
+        video_id: _summarize(
+            videos[video_id],
+            results_by_video.get(video_id, []),
+            responses_by_video.get(video_id, []),
+            users_by_uid,
+        ) if video_id in videos else None
+        for video_id in video_ids
+    }
+
+
+def _summarize(video, test_results, responses, users_by_uid):
+    if not test_results and not responses:
+        return None
+
+    user_map = {}  # user_id -> {user, test, survey, test_obj}
+
+    # 1. テスト結果（ユーザーごとに最初の1回）
+    for tr in test_results:
+        uid = tr.user.user_id
+        entry = user_map.setdefault(uid, {"user": tr.user, "test": None, "survey": None, "test_obj": None})
+        if entry["test"] is None:
+            entry["test"] = {
+                "score": tr.score,
+                "max_score": tr.max_score,
+                "is_passed": tr.is_passed,
+                "created_at": tr.created_at,
+            }
+            entry["test_obj"] = tr
+
+    # 2. アンケート結果（ユーザーごとに最後の回答）
+    satisfaction_scores = []
+    for resp in responses:
+        uid = resp.user_id
+        if not uid:
+            continue
+        entry = user_map.setdefault(uid, {"user": users_by_uid.get(uid), "test": None, "survey": None, "test_obj": None})
+
+        answers = []
+        satisfaction = None
+        for ans in resp.surveyanswer_set.all():
+            q_text, a_text = _answer_pair(ans)
+            answers.append({"question": q_text, "answer": a_text})
+            if "満足度" in q_text:
+                val = satisfaction_value(a_text)
+                if val > 0:
+                    satisfaction_scores.append(val)
+                    satisfaction = val
+
+        entry["survey"] = {
+            "satisfaction": satisfaction,
+            "answers": answers,
+            "created_at": resp.created_at,
+        }
+
+    logs = []
+    for uid, data in user_map.items():
+        test_details = []
+        if data["test_obj"]:
+            for ta in data["test_obj"].answers.all():
+                test_details.append({
+                    "question": ta.question.text if ta.question else "問題",
+                    "user_choice": ta.choice.text if ta.choice else "",
+                    "is_correct": ta.choice.is_correct if ta.choice else False,
+                })
+        logs.append({
+            "user_id": uid,
+            "display_name": data["user"].display_name if data["user"] else "匿名",
+            "test": data["test"],
+            "test_details": test_details,
+            "survey": data["survey"],
+        })
+
+    now = timezone.now()
+
+    def sort_key(log_item):
+        if log_item["test"]:
+            return log_item["test"]["created_at"]
+        if log_item["survey"]:
+            return log_item["survey"]["created_at"]
+        return now
+
+    logs.sort(key=sort_key, reverse=True)
+
+    scores = [tr.score for tr in test_results]
+    avg_score = sum(scores) / len(scores) if scores else 0
+    avg_sat = sum(satisfaction_scores) / len(satisfaction_scores) if satisfaction_scores else 0
+    return {
+        "video_id": video.id,
+        "video_title": video.title,
+        "thumb": video.thumb,
+        "avg_score": round(float(avg_score), 1),
+        "avg_satisfaction": round(float(avg_sat), 1),
+        "total_tests": len(test_results),
+        "total_surveys": len(responses),
+        "logs": logs,
+    }
+
+
+def video_feedback_report(refresh=False):
+    """
+    全動画のレポート（テスト・アンケートがある動画だけ）。
+    動画ごとの集計はキャッシュから取り、無いものだけまとめて作り直す。
+    """
+    video_ids = list(Video.objects.order_by('pk').values_list('id', flat=True))
+    versions = dict(VideoFeedbackVersion.objects.values_list('video_id', 'version'))
+    keys = {video_id: CACHE_KEY.format(video_id, versions.get(video_id, 0)) for video_id in video_ids}
+    cached = {} if refresh else cache.get_many(list(keys.values()))
+
+    summaries = {video_id: cached[key] for video_id, key in keys.items() if key in cached}
+    missing = [video_id for video_id in video_ids if video_id not in summaries]
+    if missing:
+        built = build_video_feedback(missing)
+        cache.set_many(
+            {keys[video_id]: summary or _EMPTY for video_id, summary in built.items()},
+            timeout=_cache_timeout(),
+        )
+        summaries.update(built)
+
+    return [
+        summaries[video_id] for video_id in video_ids
+        if summaries.get(video_id) and summaries[video_id] != _EMPTY
+    ]
+
+
+def invalidate_video_feedback(video_id):
+    """
+    テスト・アンケートの提出や作り直しの後に呼ぶ（解答などをすべて書いた後、同じトランザクションで）。
+    動画のバージョンを上げるので、全インスタンスが次のレポートでその動画を作り直す。
+    """
+    if VideoFeedbackVersion.objects.filter(video_id=video_id).update(version=F('version') + 1):
+        return
+    try:
+        with transaction.atomic():
+            VideoFeedbackVersion.objects.create(video_id=video_id, version=1)
+    except IntegrityError:
+        VideoFeedbackVersion.objects.filter(video_id=video_id).update(version=F('version') + 1)
+
+
+def feedback_export_rows(limit=2000):
+    """
+    Sheets の「動画テスト・アンケート」タブの行（新しいテスト結果から limit 件）。
+    動画・アンケート回答はまとめて引く。
+    """
+    results = list(
+        UserTestResult.objects.select_related('user').order_by('-created_at')[:limit]
+    )
+    video_ids = {r.video_id for r in results}
+    titles = dict(Video.objects.filter(id__in=video_ids).values_list('id', 'title'))
+
+    # (動画ID, user_id) → 最初のアンケート回答
+    responses = {}
+    survey_responses = (
+        SurveyResponse.objects
+        .filter(test__video_id__in=titles, user_id__in={r.user.user_id for r in results})
+        .select_related('test')
+        .prefetch_related(_survey_answers_prefetch())
+        .order_by('id')
+    )
+    for resp in survey_responses:
+        responses.setdefault((resp.test.video_id, resp.user_id), resp)
+
+    rows = []
+    for r in results:
+        if r.video_id not in titles:
+            continue
+        sat = ""
+        ans_text = ""
+        survey_resp = responses.get((r.video_id, r.user.user_id))
+        if survey_resp:
+            ans_list = []
+            for ans in survey_resp.surveyanswer_set.all():
+                q_text, a_text = _answer_pair(ans)
+                ans_list.append(f"{q_text}: {a_text}")
+                if "満足度" in q_text:
+                    sat = a_text
+            ans_text = " / ".join(ans_list)
+
+        rows.append([
+            r.created_at.strftime("%Y/%m/%d %H:%M"),
+            titles[r.video_id],
+            r.user.display_name,
+            r.score,
+            r.max_score,
+            "合格" if r.is_passed else "不合格",
+            sat,
+            ans_text,
+        ])
+    return rows
@@ -0,0 +1,112 @@
+"""
+動画の再生回数・視聴時間の書き込みをまとめる (write-behind)。
+
+再生のたびに Video の行を UPDATE すると、人気の動画では同じ行に更新が集中する。
+そこで増分を VideoCountDelta に1行追加するだけにしておき、VIDEO_VIEW_FLUSH_SECONDS ごとに
+溜まった増分を動画ごとに合計して、動画1本につき1回の UPDATE (views = views + n, watch_time = watch_time + t) で書き込む。
+
+- 増分は DB に書いてあるので、ワーカーが kill されても失われない。
+  どのプロセスの flush でも、まだ反映されていない増分をすべて反映する
+- 反映 (F() で加算) と増分の行の削除は同じトランザクションなので、二重に足したり数え落としたりしない
+- 複数プロセスが同時に flush しても、PostgreSQL では SKIP LOCKED で別々の行を取る
+- BACKGROUND_TASKS_ASYNC = False のとき、VIDEO_VIEW_FLUSH_SECONDS = 0 のときは溜めずにその場で反映する
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Sum
+
+from pixelshop_backend.background import run_in_background, run_later
+from .models import Video, VideoCountDelta
+
+logger = logging.getLogger(__name__)
+
+FLUSH_BATCH_SIZE = 5000
+
+_lock = threading.Lock()
+_state = {"scheduled": False}
+
+
+def _flush_interval():
+    return getattr(settings, "VIDEO_VIEW_FLUSH_SECONDS", 5)
+
+
+def add_video_counts(video_id, views=0, watch_time=0):
+    """再生回数・視聴時間の増分を VideoCountDelta に積む（Video の行はまだ更新しない）"""
+    if not video_id or (not views and not watch_time):
+        return
+    VideoCountDelta.objects.create(video_id=video_id, views=views, watch_time=watch_time)
+
+    if not _flush_interval():
+        run_in_background(flush_video_counts)
+        return
+    with _lock:
+        schedule = not _state["scheduled"]
+        _state["scheduled"] = True
+    if schedule:
+        run_later(_flush_interval(), _scheduled_flush)
+
+
+def _scheduled_flush():
+    with _lock:
+        _state["scheduled"] = False
+    flush_video_counts()
+
+
+def pending_video_counts(video_id):
+    """まだ Video に反映されていない (再生回数, 視聴時間)（全プロセス分）"""
+    totals = VideoCountDelta.objects.filter(video_id=video_id).aggregate(views=Sum("views"), watch_time=Sum("watch_time"))
+    return totals["views"] or 0, totals["watch_time"] or 0
+
+
+def _flush_batch(batch_size):
+    with transaction.atomic():
+        deltas = VideoCountDelta.objects.order_by("id")
+        if connection.features.has_select_for_update_skip_locked:
+            deltas = deltas.select_for_update(skip_locked=True)
+        rows = list(deltas.values_list("id", "video_id", "views", "watch_time")[:batch_size])
+        if not rows:
+            return 0, 0
+
+        ids = [row[0] for row in rows]
+        # 先に消す。消せた件数が足りなければ別のプロセスが先に反映した (SQLite) ので、このバッチはやめる
+        if VideoCountDelta.objects.filter(id__in=ids).delete()[0] != len(ids):
+            transaction.set_rollback(True)
+            return 0, 0
+
+        batch = {}
+        for _, video_id, views, watch_time in rows:
+            counts = batch.setdefault(video_id, [0, 0])
+            counts[0] += views
+            counts[1] += watch_time
+
+        # 複数プロセスが同時に flush してもデッドロックしないよう id 順に更新する
+        for video_id in sorted(batch):
+            views, watch_time = batch[video_id]
+            updated = Video.objects.filter(id=video_id).update(
+                views=F("views") + views,
+                watch_time=F("watch_time") + watch_time,
+            )
+            if not updated:
+                # タイトルなどは video_detail で補完される
+                Video.objects.get_or_create(id=video_id)
+                Video.objects.filter(id=video_id).update(
+                    views=F("views") + views,
+                    watch_time=F("watch_time") + watch_time,
+                )
+    return len(rows), len(batch)
+
+
+def flush_video_counts(batch_size=FLUSH_BATCH_SIZE):
+    """
+    溜まっている増分をすべて書き込む。戻り値: 更新した動画の数（バッチごとの合計）
+    失敗したバッチはロールバックされ、増分は次回の flush で書かれる。
+    """
+    videos = 0
+    while True:
+        rows, updated = _flush_batch(batch_size)
+        videos += updated
+        if rows < batch_size:
+            return videos
@@ -0,0 +1,261 @@
+"""
+動画の視聴ログ（ハートビート）の記録と日別集計。
+
+プレイヤーは視聴中に videos/save_log/ を10秒ごとに呼ぶ。
+以前は呼ばれるたびに VideoViewLog を1行追加していたが、
+1回の視聴（ユーザー×動画×セッション）を1行にまとめ、watch_time に加算する (upsert)。
+
+- session_id はクライアントが送ってくればそれを使う。送ってこなければ、
+  watch_time == 0（再生開始）で新しいセッション、それ以外は VIEW_LOG_SESSION_GAP_SECONDS 以内に
+  更新された同じユーザー×動画のセッションに加算する
+- 同時に VideoWatchDaily（ユーザー×動画×日）と VideoWatchSummary（ユーザー×動画の累計）に
+  視聴時間・視聴回数を加算する。分析系の画面はログ全体ではなくこちらを読む
+- 集計テーブルができる前の古い行 (session_id='') はマイグレーション 0038 で集計に反映済み。
+  manage.py compact_view_logs はそれらをセッションごとの1行にまとめるだけ（集計には足さない）
+"""
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from users.models import User
+from .models import Video, VideoViewLog, VideoWatchDaily, VideoWatchSummary
+
+
+def _session_gap():
+    return timedelta(seconds=getattr(settings, "VIEW_LOG_SESSION_GAP_SECONDS", 300))
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+def _add_to_session(user, video, session_id, watch_time, now):
+    """セッションの行に加算する。行が無ければ作る。戻り値: 新しく作ったか"""
+    sessions = VideoViewLog.objects.filter(user=user, video=video, session_id=session_id)
+    if sessions.update(watch_time=F("watch_time") + watch_time, last_watched_at=now):
+        return False
+    try:
+        with transaction.atomic():
+            VideoViewLog.objects.create(
+                user=user, video=video, session_id=session_id,
+                watch_time=watch_time, started_at=now,
+            )
+        return True
+    except IntegrityError:
+        # 同じセッションのハートビートが同時に来て、先に作られた
+        sessions.update(watch_time=F("watch_time") + watch_time, last_watched_at=now)
+        return False
+
+
+def _add_watch(model, keys, watch_time, view_count, last_watched_at):
+    """集計テーブルの keys の行に加算する（行が無ければ作る）"""
+    rows = model.objects.filter(**keys)
+    values = {
+        "watch_time": F("watch_time") + watch_time,
+        "view_count": F("view_count") + view_count,
+    }
+    if last_watched_at:
+        values["last_watched_at"] = last_watched_at
+    if rows.update(**values):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(
+                **keys, watch_time=watch_time, view_count=view_count, last_watched_at=last_watched_at,
+            )
+    except IntegrityError:
+        rows.update(**values)
+
+
+def add_daily_watch(user_id, video_id, date, watch_time=0, view_count=0, last_watched_at=None):
+    """VideoWatchDaily に加算する"""
+    _add_watch(VideoWatchDaily, {"user_id": user_id, "video_id": video_id, "date": date},
+               watch_time, view_count, last_watched_at)
+
+
+def add_summary_watch(user_id, video_id, watch_time=0, view_count=0, last_watched_at=None):
+    """VideoWatchSummary に加算する"""
+    _add_watch(VideoWatchSummary, {"user_id": user_id, "video_id": video_id},
+               watch_time, view_count, last_watched_at)
+
+
+def record_watch(user, video, watch_time, session_id=None):
+    """
+    ハートビート1回分を記録する。
+    戻り値: (session_id, このセッションの合計視聴時間, このハートビートで新しいセッションが始まったか)
+    """
+    now = timezone.now()
+    if user is not None and not user.is_authenticated:
+        user = None
+    watch_time = max(int(watch_time or 0), 0)
+
+    with transaction.atomic():
+        if not session_id:
+            recent = None
+            if watch_time:
+                recent = (
+                    VideoViewLog.objects
+                    .filter(user=user, video=video, last_watched_at__gte=now - _session_gap())
+                    .exclude(session_id='')
+                    .order_by('-last_watched_at')
+                    .values_list('session_id', flat=True)
+                    .first()
+                )
+            session_id = recent or new_session_id()
+
+        created = _add_to_session(user, video, session_id, watch_time, now)
+        if user is not None:
+            view_count = 1 if created else 0
+            add_daily_watch(
+                user.id, video.pk, timezone.localdate(now),
+                watch_time=watch_time, view_count=view_count, last_watched_at=now,
+            )
+            add_summary_watch(user.id, video.pk, watch_time=watch_time, view_count=view_count, last_watched_at=now)
+
+    total = (
+        VideoViewLog.objects
+        .filter(user=user, video=video, session_id=session_id)
+        .values_list('watch_time', flat=True)
+        .first()
+    )
+    return session_id, total or 0, created
+
+
+def user_watch_totals(start_date=None, end_date=None):
+    """
+    {user_id: {"views": 視聴回数, "time": 合計視聴時間}}
+    期間の指定がなければ累計 VideoWatchSummary から、あれば日別集計 VideoWatchDaily から
+    """
+    if start_date or end_date:
+        rows = VideoWatchDaily.objects.all()
+        if start_date:
+            rows = rows.filter(date__gte=start_date)
+        if end_date:
+            rows = rows.filter(date__lte=end_date)
+    else:
+        rows = VideoWatchSummary.objects.all()
+    rows = rows.values('user_id').annotate(views=Sum('view_count'), time=Sum('watch_time')).order_by()
+    return {row['user_id']: {"views": row['views'] or 0, "time": row['time'] or 0} for row in rows}
+
+
+def user_video_watch_totals():
+    """{(user_id, video_id): {"time", "views"}}（累計 VideoWatchSummary から）"""
+    rows = VideoWatchSummary.objects.values_list('user_id', 'video_id', 'watch_time', 'view_count')
+    return {(user_id, video_id): {"time": time, "views": views} for user_id, video_id, time, views in rows}
+
+
+def watch_matrix_data(shop=None, category=None):
+    """
+    視聴マトリクスを疎な形で返す（クエリ3回）。
+    users / videos の並び順のインデックスで、視聴のあるセルだけを並べる:
+    {"users": [...], "videos": [...], "cells": {"user": [i...], "video": [j...], "time": [...], "views": [...]}}
+    shop: 店舗名で絞り込む / category: 動画のカテゴリー（親カテゴリーでも可）で絞り込む
+    """
+    users = User.objects.order_by('display_name', 'id')
+    videos = Video.objects.order_by('title', 'id')
+    summaries = VideoWatchSummary.objects.all()
+    if shop:
+        users = users.filter(shop_name=shop)
+        summaries = summaries.filter(user__shop_name=shop)
+    if category:
+        videos = videos.filter(Q(category=category) | Q(parent_category=category))
+        summaries = summaries.filter(Q(video__category=category) | Q(video__parent_category=category))
+
+    users = list(users.values('id', 'display_name', 'shop_name'))
+    videos = list(videos.values('id', 'title', 'category', 'parent_category'))
+    user_index = {u['id']: i for i, u in enumerate(users)}
+    video_index = {v['id']: j for j, v in enumerate(videos)}
+
+    cells = {"user": [], "video": [], "time": [], "views": []}
+    rows = summaries.order_by().values_list('user_id', 'video_id', 'watch_time', 'view_count')
+    for user_id, video_id, time, views in rows.iterator(chunk_size=5000):
+        i = user_index.get(user_id)
+        j = video_index.get(video_id)
+        if i is None or j is None:
+            continue
+        cells["user"].append(i)
+        cells["video"].append(j)
+        cells["time"].append(time)
+        cells["views"].append(views)
+
+    return {
+        "users": [{"id": u['id'], "name": u['display_name'], "shop_name": u['shop_name']} for u in users],
+        "videos": [
+            {"id": v['id'], "title": v['title'], "category": v['category'], "parent_category": v['parent_category']}
+            for v in videos
+        ],
+        "cells": cells,
+    }
+
+
+def _split_sessions(rows, gap):
+    """(id, watch_time, last_watched_at) の時刻順リストを、間隔と再生開始 (watch_time == 0) で区切る"""
+    sessions = []
+    for row in rows:
+        _, watch_time, watched_at = row
+        if not sessions or watch_time == 0 or watched_at - sessions[-1][-1][2] > gap:
+            sessions.append([row])
+        else:
+            sessions[-1].append(row)
+    return sessions
+
+
+def compact_pair(user_id, video_id, gap=None):
+    """
+    1組（ユーザー×動画）の古いハートビート行をセッションごとの1行にまとめる。
+    日別・累計の集計にはマイグレーション 0038 で反映済みなので、ここでは足さない。
+    戻り値: (まとめる前の行数, まとめた後の行数)
+    """
+    gap = gap or _session_gap()
+    with transaction.atomic():
+        rows = list(
+            VideoViewLog.objects
+            .select_for_update()
+            .filter(user_id=user_id, video_id=video_id, session_id='')
+            .order_by('last_watched_at', 'id')
+            .values_list('id', 'watch_time', 'last_watched_at')
+        )
+        if not rows:
+            return 0, 0
+
+        delete_ids = []
+        sessions = _split_sessions(rows, gap)
+        for session in sessions:
+            keep_id, first_at, last_at = session[0][0], session[0][2], session[-1][2]
+            VideoViewLog.objects.filter(id=keep_id).update(
+                session_id=new_session_id(),
+                watch_time=sum(r[1] for r in session),
+                started_at=first_at,
+                last_watched_at=last_at,
+            )
+            delete_ids.extend(r[0] for r in session[1:])
+
+        if delete_ids:
+            VideoViewLog.objects.filter(id__in=delete_ids).delete()
+
+    return len(rows), len(sessions)
+
+
+def compact_view_logs(gap=None, limit=None):
+    """
+    まとめる前の行が残っている組をすべて compact_pair する。
+    戻り値: {"pairs", "rows_before", "rows_after"}
+    """
+    pairs = list(
+        VideoViewLog.objects.filter(session_id='')
+        .values_list('user_id', 'video_id')
+        .distinct()
+        .order_by()
+    )
+    if limit:
+        pairs = pairs[:limit]
+    before = after = 0
+    for user_id, video_id in pairs:
+        b, a = compact_pair(user_id, video_id, gap)
+        before += b
+        after += a
+    return {"pairs": len(pairs), "rows_before": before, "rows_after": after}
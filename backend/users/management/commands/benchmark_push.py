@@ -0,0 +1,78 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.push import PUSH_BATCH_SIZE, FakeFCMTransport, PushSender, build_message
+
+
+class Command(BaseCommand):
+    help = "Benchmark the batched FCM sender against a local fake transport (no network, no DB writes)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tokens", type=int, default=5000, help="Number of device tokens (default: 5000)")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=PUSH_BATCH_SIZE,
+            help=f"Messages per send_each call (default: {PUSH_BATCH_SIZE}; 1 = old one-by-one behaviour)",
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.05,
+            help="Simulated seconds per send_each round trip (default: 0.05)",
+        )
+        parser.add_argument(
+            "--transient-rate",
+            type=float,
+            default=0.0,
+            help="Probability that a message fails with UNAVAILABLE (default: 0)",
+        )
+        parser.add_argument(
+            "--unregistered-rate",
+            type=float,
+            default=0.0,
+            help="Fraction of tokens reported as unregistered (default: 0)",
+        )
+        parser.add_argument(
+            "--fail-batches",
+            type=int,
+            default=0,
+            help="Fail the first N send_each calls entirely (default: 0)",
+        )
+        parser.add_argument("--max-retries", type=int, default=3, help="Retries per batch (default: 3)")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed for the fake transport")
+
+    def handle(self, *args, **options):
+        tokens = [f"bench-token-{i}" for i in range(options["tokens"])]
+        dead_count = int(len(tokens) * options["unregistered_rate"])
+        transport = FakeFCMTransport(
+            latency=options["latency"],
+            transient_rate=options["transient_rate"],
+            unregistered=tokens[:dead_count],
+            fail_batches=options["fail_batches"],
+            seed=options["seed"],
+        )
+
+        # バックオフの待ち時間は実際には寝ずに合計だけ数える
+        slept = []
+        sender = PushSender(
+            transport=transport,
+            batch_size=options["batch_size"],
+            max_retries=options["max_retries"],
+            sleep=slept.append,
+            clear_dead_tokens=False,
+        )
+        messages = [build_message(token, "benchmark", "benchmark", {"type": "NEWS"}) for token in tokens]
+
+        started = time.perf_counter()
+        result = sender.send(messages)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(f"tokens:         {len(tokens)}")
+        self.stdout.write(f"send_each calls: {transport.calls}")
+        self.stdout.write(f"sent:           {result.sent}")
+        self.stdout.write(f"failed:         {result.failed}")
+        self.stdout.write(f"dead tokens:    {len(result.dead_tokens)}")
+        self.stdout.write(f"retries:        {result.retries} (backoff total {sum(slept):.2f}s, not slept)")
+        self.stdout.write(f"elapsed:        {elapsed:.2f}s ({len(tokens) / elapsed:.0f} msg/s)")
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.outbox import OUTBOX_BATCH_SIZE, drain_outbox, purge_outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver queued push notifications from the notification outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=OUTBOX_BATCH_SIZE,
+            help=f"Outbox rows claimed per batch (default: {OUTBOX_BATCH_SIZE})",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Drain the outbox once and exit (for cron / Cloud Scheduler)",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=2.0,
+            help="Seconds to sleep when the outbox is empty (default: 2)",
+        )
+        parser.add_argument(
+            "--purge-days",
+            type=int,
+            default=7,
+            help="Delete delivered rows older than this many days (0 disables; default: 7)",
+        )
+
+    def handle(self, *args, **options):
+        if options["purge_days"]:
+            purged = purge_outbox(options["purge_days"])
+            if purged:
+                self.stdout.write(f"Purged {purged} delivered outbox rows.")
+
+        if options["once"]:
+            processed = drain_outbox(options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(f"Processed {processed} outbox rows."))
+            return
+
+        self.stdout.write("Outbox worker started (Ctrl+C to stop).")
+        try:
+            while True:
+                # 空になるまで処理し、空ならポーリング間隔だけ待つ
+                processed = drain_outbox(options["batch_size"])
+                if processed:
+                    self.stdout.write(f"Processed {processed} outbox rows.")
+                else:
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            self.stdout.write("Outbox worker stopped.")
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 from django.db.models.signals import post_save
 from django.dispatch import receiver
@@ -159,43 +160,65 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # 未読数 / 一括既読
+            models.Index(fields=['recipient', 'is_read'], name='notif_recipient_read_idx'),
+            # 通知一覧 (直近1ヶ月を新しい順)
+            models.Index(fields=['recipient', '-created_at'], name='notif_recipient_created_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # 通知本体と送信キュー (NotificationOutbox) を同じトランザクションで書く
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.recipient.display_name}への通知 ({self.notification_type})"
 
 
-# --- 通知作成時にプッシュ通知を飛ばすシグナル ---
+# --- 通知の送信キュー (transactional outbox) ---
+# 通知と同じトランザクションで1行書き、実際のプッシュ送信は users/outbox.py のワーカーが行う。
+# 書き込みがコミットされていれば、送信前にプロセスが落ちても後で必ず再送される (at-least-once)。
+class NotificationOutbox(models.Model):
+    KIND_CHOICES = [
+        ('PUSH', 'プッシュ通知'),
+    ]
+    STATUS_CHOICES = [
+        ('PENDING', '未送信'),
+        ('PROCESSING', '送信中'),
+        ('DONE', '送信済み'),
+        ('FAILED', '失敗'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='PUSH')
+    # PUSH: {"recipient_ids": [...], "title": ..., "body": ..., "data": {...}}
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)  # これ以降に送信（再送時は後ろにずらす）
+    locked_until = models.DateTimeField(blank=True, null=True)  # 処理中のリース期限（過ぎたら再取得可能）
+    claimed_by = models.CharField(max_length=100, blank=True, default='')
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # ワーカーの取得クエリ (status, available_at)
+            models.Index(fields=['status', 'available_at'], name='outbox_status_available_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+
+# --- 通知作成時にプッシュ通知を送信キューへ積むシグナル ---
+# ※ bulk_create ではシグナルが飛ばないため、一斉通知 (users/notifications.py) は自前で積む
 @receiver(post_save, sender=Notification)
 def trigger_push_notification(sender, instance, created, **kwargs):
     if created:
-        from .utils import send_push_notification
-        
-        title = "Pikumaru"
-        # 通知タイプによってタイトルを変える
-        if instance.notification_type == 'LIKE':
-            title = "いいねされました！"
-        elif instance.notification_type == 'COMMENT':
-            title = "コメントが届きました！"
-        elif instance.notification_type == 'REPLY':
-            title = "返信がありました！"
-        elif instance.notification_type == 'MENTION':
-            title = "メンションされました！"
-        elif instance.notification_type == 'BADGE':
-            title = "バッジを獲得しました！"
-        elif instance.notification_type == 'POINT':
-            title = "ポイントを獲得しました！"
-        elif instance.notification_type == 'NEWS':
-            title = "新しいお知らせがあります"
-
-        body = instance.message or "新しい通知があります。"
-        
-        # 通知データをまとめる
-        data = {
-            "type": instance.notification_type,
-            "post_id": instance.post_id or "",
-            "comment_id": instance.comment_id or "",
-            "is_treasure": "true" if instance.is_treasure_post else "false",
-        }
-        
-        send_push_notification(instance.recipient, title, body, data=data)
+        from .outbox import enqueue_push
+        from .utils import build_push_payload
 
+        title, body, data = build_push_payload(instance)
+        enqueue_push([instance.recipient_id], title, body, data)
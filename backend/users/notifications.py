@@ -0,0 +1,80 @@
+"""
+@ALL メンション・お知らせ配信などの一斉通知 (fan-out)。
+
+リクエスト内では enqueue_broadcast() でジョブを積むだけにして、
+通知レコードの作成 (bulk_create) とプッシュ送信はバックグラウンドで行う。
+対象ユーザー数に関係なくリクエストは一定時間で返る。
+"""
+import logging
+
+from django.db import transaction
+
+from pixelshop_backend.background import run_in_background
+from .models import User, Notification
+from .outbox import enqueue_push
+from .utils import build_push_payload
+
+logger = logging.getLogger(__name__)
+
+FANOUT_CHUNK_SIZE = 500
+
+
+def enqueue_broadcast(sender, notification_type, message, exclude_user_ids=(), **fields):
+    """
+    有効な全ユーザー（exclude_user_ids の user_id を除く）への通知をバックグラウンドで作成・配信する。
+    fields には post_id / comment_id / is_treasure_post など Notification のフィールドを渡す。
+    """
+    run_in_background(
+        broadcast_notification,
+        sender_pk=sender.pk if sender else None,
+        notification_type=notification_type,
+        message=message,
+        exclude_user_ids=list(exclude_user_ids),
+        **fields,
+    )
+
+
+def broadcast_notification(sender_pk, notification_type, message, exclude_user_ids=(), chunk_size=FANOUT_CHUNK_SIZE, **fields):
+    """
+    対象ユーザーを chunk_size 件ずつ bulk_create し、チャンクごとにプッシュを送る。
+    戻り値: 作成した通知の件数
+    """
+    recipients = (
+        User.objects.filter(is_active=True)
+        .exclude(user_id__in=exclude_user_ids)
+        .order_by("id")
+    )
+
+    total = 0
+    last_id = 0
+    while True:
+        # id 順に chunk_size 件ずつ（書き込み中にカーソルを開きっぱなしにしない）
+        chunk = list(recipients.filter(id__gt=last_id).values_list("id", flat=True)[:chunk_size])
+        if not chunk:
+            break
+        last_id = chunk[-1]
+        total += _create_chunk(chunk, sender_pk, notification_type, message, fields)
+
+    logger.info(f"Broadcast {notification_type} notification to {total} users")
+    return total
+
+
+def _create_chunk(recipient_ids, sender_pk, notification_type, message, fields):
+    with transaction.atomic():
+        notifications = Notification.objects.bulk_create([
+            Notification(
+                recipient_id=recipient_id,
+                sender_id=sender_pk,
+                notification_type=notification_type,
+                message=message,
+                **fields,
+            )
+            for recipient_id in recipient_ids
+        ])
+
+        # bulk_create は post_save を飛ばさないので、チャンク分のプッシュを送信キューに1行で積む
+        if notifications:
+            title, body, data = build_push_payload(notifications[0])
+            enqueue_push(recipient_ids, title, body, data)
+
+    return len(notifications)
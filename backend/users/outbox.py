@@ -0,0 +1,181 @@
+"""
+通知の送信キュー (NotificationOutbox) の書き込みと処理。
+
+- enqueue_push(): 通知と同じトランザクションで送信キューに1行積む
+- drain_outbox(): 未送信の行をバッチで取得 → まとめてプッシュ送信 → 済みにする
+
+取得は「リース」方式で、取得時に status=PROCESSING と locked_until を書いてすぐコミットする。
+送信中にプロセスが落ちてもリース期限が過ぎれば別のワーカーが拾い直す（at-least-once）。
+PostgreSQL では SELECT ... FOR UPDATE SKIP LOCKED で複数ワーカーが同じ行を取り合わない。
+SQLite は SKIP LOCKED が無いので、claimed_by を条件付き UPDATE で書いて取れた行だけ処理する。
+"""
+import logging
+import os
+import socket
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from pixelshop_backend.background import run_in_background
+from .models import NotificationOutbox, User
+from .push import get_push_sender, build_message
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_LEASE_SECONDS = 300
+OUTBOX_MAX_ATTEMPTS = 5
+
+
+def enqueue_push(recipient_ids, title, body, data=None):
+    """
+    recipient_ids のユーザーへのプッシュを送信キューに積む。
+    呼び出し元のトランザクション内で書かれ、コミット後に（設定により）その場で送信を試みる。
+    """
+    row = NotificationOutbox.objects.create(
+        kind='PUSH',
+        payload={
+            "recipient_ids": list(recipient_ids),
+            "title": title,
+            "body": body,
+            "data": data or {},
+        },
+    )
+    if getattr(settings, "OUTBOX_DRAIN_ON_COMMIT", True):
+        # ワーカーを待たずにこのプロセスでも送る（取れなかった分はワーカーが拾う）
+        run_in_background(drain_outbox, max_batches=1)
+    return row
+
+
+def _worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def claim_batch(batch_size=OUTBOX_BATCH_SIZE, lease_seconds=OUTBOX_LEASE_SECONDS, max_attempts=OUTBOX_MAX_ATTEMPTS):
+    """
+    送信可能な行を最大 batch_size 件取得してリースを取る。
+    戻り値: 自分が取得できた NotificationOutbox のリスト
+    """
+    now = timezone.now()
+    ready = (
+        Q(status='PENDING', available_at__lte=now) |
+        # 処理中のままリースが切れた行（ワーカーが落ちた）も拾い直す
+        Q(status='PROCESSING', locked_until__lt=now, attempts__lt=max_attempts)
+    )
+    token = _worker_name()
+
+    # 処理するたびにワーカーが落ちる行を拾い続けないよう、試行回数を使い切ったものは失敗にする
+    NotificationOutbox.objects.filter(
+        status='PROCESSING', locked_until__lt=now, attempts__gte=max_attempts,
+    ).update(status='FAILED', locked_until=None, last_error='lease expired after the last attempt')
+
+    with transaction.atomic():
+        candidates = NotificationOutbox.objects.filter(ready).order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        ids = list(candidates.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return []
+
+        # SQLite では同じ候補を見た別ワーカーがいるかもしれないので、条件付きで書いて取れた行だけ使う
+        NotificationOutbox.objects.filter(ready, id__in=ids).update(
+            status='PROCESSING',
+            locked_until=now + timedelta(seconds=lease_seconds),
+            claimed_by=token,
+            attempts=F('attempts') + 1,
+        )
+
+    return list(NotificationOutbox.objects.filter(claimed_by=token, status='PROCESSING').order_by('id'))
+
+
+def process_batch(rows, max_attempts=OUTBOX_MAX_ATTEMPTS):
+    """取得済みの行をまとめて送信し、結果を書き戻す"""
+    if not rows:
+        return 0
+
+    # 全行の宛先を1クエリで解決し、1回の PushSender.send にまとめる（500件ずつ send_each）
+    recipient_ids = {pk for row in rows for pk in row.payload.get("recipient_ids", [])}
+    tokens = dict(
+        User.objects.filter(id__in=recipient_ids)
+        .exclude(fcm_token__isnull=True)
+        .exclude(fcm_token="")
+        .values_list("id", "fcm_token")
+    )
+
+    messages = []
+    for row in rows:
+        payload = row.payload
+        for pk in payload.get("recipient_ids", []):
+            if pk in tokens:
+                messages.append(build_message(tokens[pk], payload.get("title"), payload.get("body"), payload.get("data")))
+
+    try:
+        result = get_push_sender().send(messages)
+    except Exception as e:
+        logger.exception("Outbox batch failed")
+        _retry_later(rows, e, max_attempts)
+        return 0
+
+    # 再送しても一時エラーのままだった宛先は、その宛先だけに絞って後で再送する
+    # （届いた宛先に二重に送らない）
+    retry_rows = []
+    for row in rows:
+        still_failing = [pk for pk in row.payload.get("recipient_ids", []) if tokens.get(pk) in result.transient_tokens]
+        if still_failing:
+            row.payload = dict(row.payload, recipient_ids=still_failing)
+            retry_rows.append(row)
+    if retry_rows:
+        NotificationOutbox.objects.bulk_update(retry_rows, ['payload'])
+        _retry_later(retry_rows, f"FCM transient errors for {len(result.transient_tokens)} tokens", max_attempts)
+
+    retry_ids = {row.id for row in retry_rows}
+    done_ids = [row.id for row in rows if row.id not in retry_ids]
+    NotificationOutbox.objects.filter(id__in=done_ids).update(
+        status='DONE',
+        processed_at=timezone.now(),
+        locked_until=None,
+        last_error='' if not result.failed else repr(result),
+    )
+    logger.info(f"Outbox: processed {len(rows)} rows, {len(retry_rows)} to retry ({result})")
+    return len(done_ids)
+
+
+def _retry_later(rows, error, max_attempts):
+    now = timezone.now()
+    for row in rows:
+        if row.attempts >= max_attempts:
+            row.status = 'FAILED'
+        else:
+            row.status = 'PENDING'
+            # 30秒, 1分, 2分, ... と間隔をあける
+            row.available_at = now + timedelta(seconds=30 * (2 ** (row.attempts - 1)))
+        row.locked_until = None
+        row.last_error = str(error)[:1000]
+    NotificationOutbox.objects.bulk_update(rows, ['status', 'available_at', 'locked_until', 'last_error'])
+
+
+def drain_outbox(batch_size=OUTBOX_BATCH_SIZE, max_batches=None):
+    """
+    送信キューが空になるまで（または max_batches 回まで）取得と送信を繰り返す。
+    戻り値: 処理した行数
+    """
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        rows = claim_batch(batch_size)
+        if not rows:
+            break
+        total += process_batch(rows)
+        batches += 1
+    return total
+
+
+def purge_outbox(days=7):
+    """送信済みの古い行を消す"""
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = NotificationOutbox.objects.filter(status='DONE', processed_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,241 @@
+"""
+FCM プッシュ通知の一括送信。
+
+トークンを最大 500 件ずつ messaging.send_each() でまとめて送り、
+一時的なエラー (UNAVAILABLE / INTERNAL / QUOTA_EXCEEDED) は指数バックオフで再送する。
+FCM が「未登録」と返したトークンは User.fcm_token から消す。
+再送しても一時エラーのままだったトークンは PushResult.transient_tokens で返す（送信キューが後で再送する）。
+
+送信先 (transport) は差し替え可能で、FakeFCMTransport を使えば
+Firebase に接続せずにスループットや再送の挙動を確認できる（manage.py benchmark_push）。
+"""
+import logging
+import random
+import threading
+import time
+import uuid
+
+from firebase_admin import exceptions, messaging
+
+logger = logging.getLogger(__name__)
+
+# send_each 1回あたりの上限（FCM の仕様）
+PUSH_BATCH_SIZE = 500
+
+# 再送すれば通る可能性があるエラー
+TRANSIENT_ERRORS = (
+    exceptions.UnavailableError,
+    exceptions.InternalError,
+    exceptions.DeadlineExceededError,
+    messaging.QuotaExceededError,
+)
+
+# トークン自体が無効になっているエラー（アプリ削除・再インストールなど）
+DEAD_TOKEN_ERRORS = (
+    messaging.UnregisteredError,
+    messaging.SenderIdMismatchError,
+)
+
+
+def build_message(token, title, body, data=None):
+    """1トークン分の messaging.Message を作る"""
+    # 全てのデータ値を文字列にする必要がある (FCMの制約)
+    string_data = {k: str(v) for k, v in (data or {}).items()}
+
+    return messaging.Message(
+        notification=messaging.Notification(
+            title=title,
+            body=body,
+        ),
+        data=string_data,
+        token=token,
+        # iOSの設定 (バッジなど)
+        apns=messaging.APNSConfig(
+            payload=messaging.APNSPayload(
+                aps=messaging.Aps(badge=1, sound="default"),
+            ),
+        ),
+        # Androidの設定
+        android=messaging.AndroidConfig(
+            priority="high",
+            notification=messaging.AndroidNotification(
+                sound="default",
+            ),
+        ),
+    )
+
+
+class FirebaseTransport:
+    """本番用: firebase_admin.messaging.send_each をそのまま呼ぶ"""
+
+    def send_each(self, messages):
+        return messaging.send_each(messages)
+
+
+class FakeFCMTransport:
+    """
+    ローカル用の偽 FCM。ネットワークには出ない。
+
+    latency:           send_each 1回あたりの待ち時間（秒）
+    transient_rate:    各メッセージが一時エラーになる確率
+    unregistered:      未登録扱いにするトークンの集合
+    fail_batches:      最初の N 回の send_each を丸ごと UNAVAILABLE で失敗させる
+    """
+
+    def __init__(self, latency=0.0, transient_rate=0.0, unregistered=(), fail_batches=0, seed=None):
+        self.latency = latency
+        self.transient_rate = transient_rate
+        self.unregistered = set(unregistered)
+        self.fail_batches = fail_batches
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.delivered = []
+        self._lock = threading.Lock()
+
+    def send_each(self, messages):
+        with self._lock:
+            self.calls += 1
+            call_no = self.calls
+        if self.latency:
+            time.sleep(self.latency)
+        if call_no <= self.fail_batches:
+            raise exceptions.UnavailableError("fake FCM: service unavailable")
+
+        responses = []
+        for message in messages:
+            if message.token in self.unregistered:
+                error = messaging.UnregisteredError("fake FCM: registration token is not registered")
+                responses.append(messaging.SendResponse(None, error))
+            elif self.random.random() < self.transient_rate:
+                error = exceptions.UnavailableError("fake FCM: transient failure")
+                responses.append(messaging.SendResponse(None, error))
+            else:
+                with self._lock:
+                    self.delivered.append(message.token)
+                responses.append(messaging.SendResponse({"name": f"fake/{uuid.uuid4().hex}"}, None))
+        return messaging.BatchResponse(responses)
+
+
+class PushResult:
+    """send() の集計結果"""
+
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.batches = 0
+        self.dead_tokens = set()
+        # 再送しても一時エラーのままだったトークン（呼び出し元で後から再送する）
+        self.transient_tokens = set()
+
+    def __repr__(self):
+        return (
+            f"PushResult(sent={self.sent}, failed={self.failed}, retries={self.retries}, "
+            f"batches={self.batches}, dead_tokens={len(self.dead_tokens)}, "
+            f"transient_tokens={len(self.transient_tokens)})"
+        )
+
+
+class PushSender:
+    """
+    メッセージを PUSH_BATCH_SIZE 件ずつ送り、一時エラーだけを再送する。
+    sleep は差し替え可能（ベンチマークで待ち時間を数えるだけにする等）。
+    """
+
+    def __init__(self, transport=None, batch_size=PUSH_BATCH_SIZE, max_retries=3,
+                 backoff_base=0.5, backoff_max=8.0, sleep=time.sleep, clear_dead_tokens=True):
+        self.transport = transport or FirebaseTransport()
+        self.batch_size = min(batch_size, PUSH_BATCH_SIZE)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.sleep = sleep
+        self.clear_dead_tokens = clear_dead_tokens
+
+    def send(self, messages):
+        """messages (messaging.Message のリスト) を送信して PushResult を返す"""
+        result = PushResult()
+        messages = list(messages)
+        for start in range(0, len(messages), self.batch_size):
+            self._send_batch(messages[start:start + self.batch_size], result)
+
+        if result.dead_tokens and self.clear_dead_tokens:
+            clear_fcm_tokens(result.dead_tokens)
+        return result
+
+    def _send_batch(self, batch, result):
+        pending = batch
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                result.retries += 1
+                self.sleep(self._backoff(attempt))
+
+            result.batches += 1
+            try:
+                response = self.transport.send_each(pending)
+            except TRANSIENT_ERRORS as e:
+                # バッチ全体が一時エラー → 丸ごと再送
+                logger.warning(f"FCM batch of {len(pending)} failed (attempt {attempt + 1}): {e}")
+                continue
+            except Exception as e:
+                logger.error(f"FCM batch of {len(pending)} failed permanently: {e}")
+                result.failed += len(pending)
+                return
+
+            retry = []
+            for message, resp in zip(pending, response.responses):
+                if resp.success:
+                    result.sent += 1
+                elif isinstance(resp.exception, DEAD_TOKEN_ERRORS):
+                    result.dead_tokens.add(message.token)
+                    result.failed += 1
+                elif isinstance(resp.exception, TRANSIENT_ERRORS):
+                    retry.append(message)
+                else:
+                    logger.error(f"FCM rejected message to {message.token[:10]}...: {resp.exception}")
+                    result.failed += 1
+
+            if not retry:
+                return
+            pending = retry
+
+        logger.error(f"Giving up on {len(pending)} FCM messages after {self.max_retries} retries")
+        result.failed += len(pending)
+        result.transient_tokens.update(message.token for message in pending)
+
+    def _backoff(self, attempt):
+        # 指数バックオフ + ジッター（同時に再送が集中しないように）
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+        return delay * (0.5 + random.random() / 2)
+
+
+def clear_fcm_tokens(tokens):
+    """FCM が無効と返したトークンを持つユーザーのトークンを消す"""
+    from .models import User
+
+    cleared = User.objects.filter(fcm_token__in=list(tokens)).update(fcm_token=None)
+    logger.info(f"Cleared {cleared} unregistered FCM tokens")
+    return cleared
+
+
+_sender = None
+
+
+def get_push_sender():
+    """プロセス内で共有する PushSender"""
+    global _sender
+    if _sender is None:
+        _sender = PushSender()
+    return _sender
+
+
+def send_push_to_users(users, title, body, data=None):
+    """
+    同じ内容の通知を複数ユーザーへまとめて送る。
+    fcm_token を持たないユーザーは飛ばす。
+    """
+    tokens = {user.fcm_token for user in users if user.fcm_token}
+    if not tokens:
+        return PushResult()
+    messages = [build_message(token, title, body, data) for token in tokens]
+    return get_push_sender().send(messages)
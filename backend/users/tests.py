@@ -0,0 +1,143 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from firebase_admin import exceptions, messaging
+
+from users.models import NotificationOutbox, User
+from users.outbox import claim_batch, drain_outbox
+from users.push import FakeFCMTransport, PushSender, build_message
+
+
+def _sender(transport, sleeps=None):
+    # 待ち時間なしで再送する（待つはずだった秒数は sleeps に溜める）
+    sleep = sleeps.append if sleeps is not None else (lambda seconds: None)
+    return PushSender(transport=transport, max_retries=2, sleep=sleep)
+
+
+@override_settings(OUTBOX_DRAIN_ON_COMMIT=False)
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create(user_id="alice", display_name="alice", fcm_token="token-alice")
+        self.bob = User.objects.create(user_id="bob", display_name="bob", fcm_token="token-bob")
+
+    def _enqueue(self, recipients):
+        return NotificationOutbox.objects.create(
+            payload={"recipient_ids": [u.id for u in recipients], "title": "t", "body": "b", "data": {}},
+        )
+
+    def test_delivered_rows_are_done(self):
+        row = self._enqueue([self.alice, self.bob])
+        transport = FakeFCMTransport()
+        with mock.patch("users.outbox.get_push_sender", return_value=_sender(transport)):
+            self.assertEqual(drain_outbox(), 1)
+
+        row.refresh_from_db()
+        self.assertEqual(row.status, "DONE")
+        self.assertEqual(sorted(transport.delivered), ["token-alice", "token-bob"])
+
+    def test_sender_exception_schedules_retry(self):
+        row = self._enqueue([self.alice])
+        with mock.patch("users.outbox.get_push_sender") as get_sender:
+            get_sender.return_value.send.side_effect = RuntimeError("boom")
+            self.assertEqual(drain_outbox(), 0)
+
+        row.refresh_from_db()
+        self.assertEqual(row.status, "PENDING")
+        self.assertEqual(row.attempts, 1)
+        self.assertGreater(row.available_at, timezone.now())
+
+    def test_transient_failures_are_retried_for_failing_recipients_only(self):
+        row = self._enqueue([self.alice, self.bob])
+
+        class BobUnavailable(FakeFCMTransport):
+            def send_each(self, messages):
+                response = super().send_each([m for m in messages if m.token != "token-bob"])
+                responses = iter(response.responses)
+                return messaging.BatchResponse([
+                    messaging.SendResponse(None, exceptions.UnavailableError("down"))
+                    if m.token == "token-bob" else next(responses)
+                    for m in messages
+                ])
+
+        transport = BobUnavailable()
+        with mock.patch("users.outbox.get_push_sender", return_value=_sender(transport)):
+            self.assertEqual(drain_outbox(), 0)
+
+        row.refresh_from_db()
+        self.assertEqual(row.status, "PENDING")
+        self.assertEqual(row.payload["recipient_ids"], [self.bob.id])
+        self.assertEqual(transport.delivered, ["token-alice"])
+
+        # 再送時には bob にだけ送る
+        NotificationOutbox.objects.filter(id=row.id).update(available_at=timezone.now())
+        transport = FakeFCMTransport()
+        with mock.patch("users.outbox.get_push_sender", return_value=_sender(transport)):
+            self.assertEqual(drain_outbox(), 1)
+        row.refresh_from_db()
+        self.assertEqual(row.status, "DONE")
+        self.assertEqual(transport.delivered, ["token-bob"])
+
+    def test_expired_lease_is_reclaimed(self):
+        row = self._enqueue([self.alice])
+        NotificationOutbox.objects.filter(id=row.id).update(
+            status="PROCESSING", attempts=1, locked_until=timezone.now() - timedelta(seconds=1),
+        )
+        self.assertEqual([r.id for r in claim_batch()], [row.id])
+        row.refresh_from_db()
+        self.assertEqual(row.attempts, 2)
+
+    def test_expired_lease_after_last_attempt_fails(self):
+        row = self._enqueue([self.alice])
+        NotificationOutbox.objects.filter(id=row.id).update(
+            status="PROCESSING", attempts=5, locked_until=timezone.now() - timedelta(seconds=1),
+        )
+        self.assertEqual(claim_batch(max_attempts=5), [])
+        row.refresh_from_db()
+        self.assertEqual(row.status, "FAILED")
+
+
+class PushSenderTests(TestCase):
+    def test_messages_are_sent_in_batches_of_500(self):
+        transport = FakeFCMTransport()
+        messages = [build_message(f"token-{i}", "t", "b") for i in range(1201)]
+        result = _sender(transport).send(messages)
+
+        self.assertEqual(transport.calls, 3)
+        self.assertEqual(result.batches, 3)
+        self.assertEqual(result.sent, 1201)
+
+    def test_dead_tokens_are_cleared(self):
+        user = User.objects.create(user_id="gone", fcm_token="token-gone")
+        transport = FakeFCMTransport(unregistered={"token-gone"})
+        result = _sender(transport).send([build_message("token-gone", "t", "b"), build_message("token-ok", "t", "b")])
+
+        self.assertEqual(result.sent, 1)
+        self.assertEqual(result.dead_tokens, {"token-gone"})
+        self.assertEqual(result.transient_tokens, set())
+        user.refresh_from_db()
+        self.assertIsNone(user.fcm_token)
+
+    def test_transient_batch_failure_is_retried_with_backoff(self):
+        sleeps = []
+        transport = FakeFCMTransport(fail_batches=2)
+        result = _sender(transport, sleeps).send([build_message("token-a", "t", "b")])
+
+        self.assertEqual(result.sent, 1)
+        self.assertEqual(result.retries, 2)
+        self.assertEqual(result.transient_tokens, set())
+        self.assertEqual(transport.calls, 3)
+        # 指数バックオフ (0.5 秒から倍々、ジッターで半分まで短くなる)
+        self.assertEqual(len(sleeps), 2)
+        self.assertTrue(0.25 <= sleeps[0] <= 0.5)
+        self.assertTrue(0.5 <= sleeps[1] <= 1.0)
+
+    def test_transient_failure_after_retries_is_reported(self):
+        transport = FakeFCMTransport(transient_rate=1.0)
+        result = _sender(transport).send([build_message("token-a", "t", "b"), build_message("token-b", "t", "b")])
+
+        self.assertEqual(result.sent, 0)
+        self.assertEqual(result.failed, 2)
+        self.assertEqual(result.transient_tokens, {"token-a", "token-b"})
+        self.assertEqual(transport.calls, 3)
@@ -11,8 +11,9 @@ from posts.serializers import PostSerializer
 from rest_framework.permissions import IsAdminUser
 import json
 
-from posts.models import Post, VideoViewLog, UserTestResult, TreasurePost
-from missions.utils import update_mission_progress
+from posts.models import Post
+from posts.analytics import parse_date_range, shop_weekly_report, user_analytics
+from missions.events import record_login_event
 from django.utils import timezone
 from datetime import timedelta
 
@@ -123,7 +124,7 @@ def google_login_view(request):
         user.save()
 
         # 6. ミッション進捗
-        update_mission_progress(user, 'login')
+        record_login_event(user)
 
         return Response({
             "message": "ログイン成功",
@@ -175,7 +176,7 @@ def login_view(request):
     user.save()
 
     # ミッション進捗
-    update_mission_progress(user, 'login')
+    record_login_event(user)
 
     return Response({
         "message": "ログイン成功",
@@ -258,7 +259,7 @@ def mypage_view(request, user_id):
     user = request.user
 
     # --- 投稿取得 ---
-    posts = Post.objects.filter(user_uid=user.user_id).order_by("-created_at")
+    posts = Post.objects.filter(user_uid=user.user_id).select_related('author').order_by("-created_at")
     post_data = PostSerializer(posts, many=True).data
 
     # --- バッジ取得 ---
@@ -512,7 +513,7 @@ def public_profile_view(request, user_id):
     # 基本的に機密情報 (email) を除いた情報を返す。
 
     # --- 投稿取得 ---
-    posts = Post.objects.filter(user_uid=user.user_id).order_by("-created_at")
+    posts = Post.objects.filter(user_uid=user.user_id).select_related('author').order_by("-created_at")
     post_data = PostSerializer(posts, many=True).data
 
     # --- バッジ取得 ---
@@ -590,133 +591,37 @@ def unread_notification_count(request):
 def admin_user_analytics(request):
     """
     管理者用：ユーザー別統計（投稿数、視聴時間、テスト数、ノウハウ投稿数）
+    集計は posts/analytics.py（scheduled_analytics_sync と共通）
     """
     if not request.user.is_admin_or_secretary:
         return Response({"detail": "権限がありません"}, status=403)
 
-    users = User.objects.all().order_by('-date_joined')
-    data = []
-
-    for u in users:
-        # 1. 投稿数 (Post)
-        post_count = Post.objects.filter(user_uid=u.user_id).count()
-
-        # 2. 動画視聴 (VideoViewLog)
-        logs = VideoViewLog.objects.filter(user=u)
-        video_views = logs.count()
-        total_watch_time = sum(log.watch_time for log in logs)
-
-        # 3. テスト受講 (UserTestResult)
-        test_results = UserTestResult.objects.filter(user=u)
-        tests_taken = test_results.count()
-        tests_passed = test_results.filter(is_passed=True).count()
-
-        # 4. ノウハウ投稿 (TreasurePost)
-        know_how_count = TreasurePost.objects.filter(user_uid=u.user_id).count()
-
-        data.append({
-            "user_id": u.user_id,
-            "display_name": u.display_name,
-            "shop_name": u.shop_name,
-            "post_count": post_count,
-            "video_views": video_views,
-            "watch_time": total_watch_time,
-            "tests_taken": tests_taken,
-            "tests_passed": tests_passed,
-            "know_how_count": know_how_count,
-            "points": u.points,
-        })
+    # ?start_date=YYYY-MM-DD&end_date=YYYY-MM-DD で期間を絞れる
+    try:
+        start_date, end_date = parse_date_range(request.query_params)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
 
+    data = user_analytics(start_date, end_date, order_by=('-date_joined',))
     return Response(data)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def admin_shop_analytics(request):
     """
-    管理者用：店舗別・週報＆ノウハウ提出状況 (8週分)
+    管理者用：店舗別・週報＆ノウハウ提出状況（既定 8週分、?weeks= で変更可）
+    集計は posts/analytics.py。?refresh=true でキャッシュを使わずに作り直す
     """
     if not request.user.is_admin_or_secretary:
         return Response({"detail": "権限がありません"}, status=403)
 
-    from datetime import datetime, timedelta
-    from django.utils import timezone
-
-    shops = User.objects.values_list('shop_name', flat=True).distinct()
-    shops = [s for s in shops if s] # None/Empty除外
-
-    # 過去8週間（月曜始まり）
-    weeks = []
-    today = timezone.now().date()
-    # 直近の月曜日
-    start_of_week = today - timedelta(days=today.weekday())
-    
-    for i in range(8):
-        current_start = start_of_week - timedelta(weeks=i)
-        current_end = current_start + timedelta(days=6)
-        weeks.append((current_start, current_end))
-
-    data = []
-
-    for shop in shops:
-        shop_users = User.objects.filter(shop_name=shop)
-        shop_user_ids = shop_users.values_list('user_id', flat=True)
-        
-        shop_data = {
-            "shop_name": shop,
-            "weeks": []
-        }
-
-        for start_date, end_date in weeks:
-            # datetime型に変換してフィルタリング（Timezone aware）
-            start_dt = timezone.make_aware(datetime.combine(start_date, datetime.min.time()))
-            end_dt = timezone.make_aware(datetime.combine(end_date, datetime.max.time()))
-
-            # 1. 個人報告 (Post)
-            personal_reports = Post.objects.filter(
-                user_uid__in=shop_user_ids,
-                category='個人報告',
-                created_at__range=(start_dt, end_dt)
-            )
-            report_data = []
-            for p in personal_reports:
-                report_data.append({
-                    "id": str(p.id),
-                    "user_name": p.user_name or p.user_uid, # user_nameが保存されていれば使う
-                    "created_at": p.created_at
-                })
-
-            # 2. ノウハウ提出 (TreasurePost)
-            know_hows = TreasurePost.objects.filter(
-                user_uid__in=shop_user_ids,
-                created_at__range=(start_dt, end_dt)
-            )
-            know_how_data = []
-            for k in know_hows:
-                # user_uidから名前を引く必要がある（TreasurePostにuser_nameがない場合）
-                # 今回は軽量化のため user_uid を返すか、一時的に辞書で解決
-                u_name = "Unknown"
-                user_obj = shop_users.filter(user_id=k.user_uid).first()
-                if user_obj:
-                    u_name = user_obj.display_name
-                
-                know_how_data.append({
-                    "id": str(k.id),
-                    "user_name": u_name,
-                    "title": k.title
-                })
-
-            shop_data["weeks"].append({
-                "start_date": start_date,
-                "end_date": end_date,
-                "label": f"{start_date.month}/{start_date.day} 〜 {end_date.month}/{end_date.day}",
-                "personal_reports": report_data,
-                "know_hows": know_how_data,
-                "know_how_submitted": len(know_hows) > 0 # ノウハウ提出済みか
-            })
-
-        data.append(shop_data)
+    try:
+        weeks = int(request.query_params.get('weeks', 8))
+    except ValueError:
+        return Response({"error": "weeks must be an integer"}, status=400)
+    refresh = str(request.query_params.get('refresh', '')).lower() in ('1', 'true')
 
-    return Response(data)
+    return Response(shop_weekly_report(weeks, refresh=refresh))
 
 
 
@@ -15,9 +15,18 @@ export default function WatchMatrix() {
     setLoading(true);
     axiosClient.get("/analytics/watch_matrix/")
       .then(res => {
-        setUsers(res.data.users);
-        setVideos(res.data.videos);
-        setMatrix(res.data.matrix);
+        const { users, videos, cells } = res.data;
+        // 疎な形式（インデックスの配列）を "userId_videoId" → {time, views} に展開
+        const lookup = {};
+        cells.user.forEach((i, n) => {
+          lookup[`${users[i].id}_${videos[cells.video[n]].id}`] = {
+            time: cells.time[n],
+            views: cells.views[n],
+          };
+        });
+        setUsers(users);
+        setVideos(videos);
+        setMatrix(lookup);
       })
       .catch(err => console.error("Matrix読み込み失敗:", err))
       .finally(() => setLoading(false));
@@ -25,6 +25,8 @@ export default function VideoPlayer() {
   const [duration, setDuration] = useState(0);
   const [playbackRate, setPlaybackRate] = useState(1);
   const playerWrapperRef = useRef(null);
+  // 視聴ログのセッションID（save_log の開始時に返ってくる）
+  const sessionIdRef = useRef(null);
 
   const fetchVideo = async () => {
     try {
@@ -45,7 +47,7 @@ export default function VideoPlayer() {
     try {
       await axiosClient.post(
         `/videos/save_log/`,
-        { video_id: id, watch_time: sec }
+        { video_id: id, watch_time: sec, session_id: sessionIdRef.current }
       );
     } catch (err) {
       console.error("❌ 視聴ログ送信エラー:", err);
@@ -106,10 +108,11 @@ export default function VideoPlayer() {
       // 2. 視聴ログ開始 (Token必須)
       if (token) {
         try {
-          await axiosClient.post(
+          const res = await axiosClient.post(
             `/videos/save_log/`,
             { video_id: id, watch_time: 0 }
           );
+          sessionIdRef.current = res.data.session_id || null;
         } catch (err) {
           console.error("視聴ログ開始エラー:", err);
         }